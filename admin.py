@@ -16,24 +16,36 @@ from markupsafe import escape
 import html
 from latex_editor import latex_bp
 from markupsafe import Markup
-from drive_utils import safe_csv_save_with_retry
+from drive_utils import safe_csv_save_with_retry, safe_csv_update
+from id_allocator import allocate_ids, max_existing_id
 from sessions import require_valid_session, generate_session_token, save_session_record, invalidate_session, get_session_by_token
 from datetime import datetime
-from flask import abort, send_file
+from flask import abort, send_file, Response, stream_with_context
 import io
 
 
 
 from google_drive_service import (
-    create_drive_service,         
+    get_drive_service,            # pooled per-thread service-account client
     create_subject_folder,
     load_csv_from_drive,
     save_csv_to_drive,
     clear_cache,
     find_file_by_name,
+    find_files_by_names,
     get_drive_service_for_upload  # USER OAUTH (token.json) — for image uploads & folder ops
 )
 from sessions import require_valid_session
+from schemas import id_mask, id_in_mask, status_mask
+import responses_index
+import question_search
+import question_dedupe
+import question_import
+from shards import load_full_table, table_partitions
+import exports
+from coordination import current_version
+from render_cache import cached_page
+from question_html import HTML_COLUMNS, display_html, source_hash, with_html
 
 # ========== Blueprint ==========
 admin_bp = Blueprint("admin", __name__, url_prefix="/admin", template_folder="templates")
@@ -60,6 +72,10 @@ BLEACH_ALLOWED_ATTRIBUTES = {}  # no attributes allowed
 EXAM_ATTEMPTS_FILE_ID = os.environ.get("EXAM_ATTEMPTS_FILE_ID")
 
 # ========== Helpers ==========
+def file_versions(*file_ids):
+    """versions() for cached_page: bus versions of the Drive files a page reads"""
+    return lambda: tuple(current_version(fid) for fid in file_ids)
+
 def admin_required(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
@@ -110,22 +126,6 @@ def sanitize_for_display(text):
     return safe
 
 
-def sanitize_html(s):
-    """
-    Lightweight sanitizer used by admin listing.
-    - Normalizes newlines (CRLF -> LF)
-    - Escapes HTML special chars to prevent injection
-    - Returns a plain string (safe for template rendering without |safe)
-    """
-    if s is None:
-        return ""
-    s = str(s)
-    # normalize newlines
-    s = s.replace("\r\n", "\n").replace("\r", "\n")
-    # escape HTML special chars
-    return str(escape(s))
-
-
 @admin_bp.route("/login", methods=["GET", "POST"])
 def admin_login():
     if request.method == "POST":
@@ -228,7 +228,7 @@ def logout():
 @admin_bp.route("/dashboard")
 @admin_required
 def dashboard():
-    sa = create_drive_service()
+    sa = get_drive_service()
 
     exams_df = load_csv_from_drive(sa, EXAMS_FILE_ID)
     users_df = load_csv_from_drive(sa, USERS_FILE_ID)
@@ -258,7 +258,7 @@ def dashboard():
 @admin_bp.route("/subjects", methods=["GET", "POST"])
 @admin_required
 def subjects():
-    sa = create_drive_service()
+    sa = get_drive_service()
     subjects_df = load_csv_from_drive(sa, SUBJECTS_FILE_ID)
 
     if request.method == "POST":
@@ -298,7 +298,7 @@ def subjects():
 @admin_bp.route("/subjects/edit/<int:subject_id>", methods=["POST"])
 @admin_required
 def edit_subject(subject_id):
-    sa = create_drive_service()
+    sa = get_drive_service()
     subjects_df = load_csv_from_drive(sa, SUBJECTS_FILE_ID)
     if subjects_df.empty or subject_id not in subjects_df["id"].values:
         flash("Subject not found.", "danger")
@@ -328,7 +328,7 @@ def edit_subject(subject_id):
 @admin_bp.route("/subjects/delete/<int:subject_id>")
 @admin_required
 def delete_subject(subject_id):
-    service = create_drive_service()
+    service = get_drive_service()
     subjects_df = load_csv_from_drive(service, SUBJECTS_FILE_ID)
     if subjects_df is None or subjects_df.empty:
         flash("No subjects found.", "warning")
@@ -383,7 +383,7 @@ def delete_subject(subject_id):
 @admin_bp.route("/exams", methods=["GET", "POST"])
 @admin_required
 def exams():
-    service = create_drive_service()
+    service = get_drive_service()
     exams_df = load_csv_from_drive(service, EXAMS_FILE_ID)
     if exams_df is None:
         exams_df = pd.DataFrame()
@@ -428,7 +428,7 @@ def exams():
 @admin_bp.route("/exams/edit/<int:exam_id>", methods=["GET", "POST"])
 @admin_required
 def edit_exam(exam_id):
-    service = create_drive_service()
+    service = get_drive_service()
     exams_df = load_csv_from_drive(service, EXAMS_FILE_ID)
     if exams_df is None:
         exams_df = pd.DataFrame()
@@ -480,7 +480,7 @@ def edit_exam(exam_id):
 @admin_bp.route("/exams/delete/<int:exam_id>", methods=["GET"])
 @admin_required
 def delete_exam(exam_id):
-    service = create_drive_service()
+    service = get_drive_service()
     exams_df = load_csv_from_drive(service, EXAMS_FILE_ID)
     if exams_df is None or exams_df.empty:
         flash("Exam not found.", "danger")
@@ -505,7 +505,7 @@ def delete_exam(exam_id):
 QUESTIONS_COLUMNS = [
     "id", "exam_id", "question_text", "option_a", "option_b", "option_c", "option_d",
     "correct_answer", "question_type", "image_path", "positive_marks", "negative_marks", "tolerance"
-]
+] + HTML_COLUMNS  # pre-rendered display HTML, see question_html
 
 def _ensure_questions_df(df):
     """Return a DataFrame guaranteed to have QUESTIONS_COLUMNS in order and safe dtypes."""
@@ -524,8 +524,9 @@ def _ensure_questions_df(df):
 
 @admin_bp.route("/questions", methods=["GET"])
 @admin_required
+@cached_page(file_versions(EXAMS_FILE_ID, QUESTIONS_FILE_ID))
 def questions_index():
-    sa = create_drive_service()
+    sa = get_drive_service()
     exams_df = load_csv_from_drive(sa, EXAMS_FILE_ID)
     exams = []
     if not exams_df.empty:
@@ -543,22 +544,24 @@ def questions_index():
     questions_df = _ensure_questions_df(questions_df)
 
     if selected_exam_id:
-        filtered = questions_df[questions_df["exam_id"].astype(str) == str(selected_exam_id)]
+        filtered = questions_df[id_mask(questions_df, "exam_id", selected_exam_id)]
     else:
         filtered = questions_df.copy()
 
     questions = []
     for _, r in filtered.iterrows():
         # sanitize server-side and keep markup safe for templates
-        qtext = sanitize_html(r.get("question_text", ""))
+        # stored display HTML (rendered at write time), sanitised here only for old
+        # rows and rows whose text no longer matches it (edited on Drive)
+        current_hash = source_hash(r)
         questions.append({
             "id": int(r["id"]) if str(r["id"]).strip() else None,
             "exam_id": int(r["exam_id"]) if str(r["exam_id"]).strip() else None,
-            "question_text": qtext,
-            "option_a": sanitize_html(r.get("option_a", "")),
-            "option_b": sanitize_html(r.get("option_b", "")),
-            "option_c": sanitize_html(r.get("option_c", "")),
-            "option_d": sanitize_html(r.get("option_d", "")),
+            "question_text": display_html(r, "question_text", current_hash),
+            "option_a": display_html(r, "option_a", current_hash),
+            "option_b": display_html(r, "option_b", current_hash),
+            "option_c": display_html(r, "option_c", current_hash),
+            "option_d": display_html(r, "option_d", current_hash),
             "correct_answer": r.get("correct_answer", ""),
             "question_type": r.get("question_type", ""),
             "image_path": r.get("image_path", ""),
@@ -575,7 +578,7 @@ def questions_index():
 @admin_bp.route("/questions/add", methods=["GET", "POST"])
 @admin_required
 def add_question():
-    sa = create_drive_service()
+    sa = get_drive_service()
     exams_df = load_csv_from_drive(sa, EXAMS_FILE_ID)
     exams = []
     if not exams_df.empty:
@@ -584,17 +587,8 @@ def add_question():
                           "name": r.get("name") if "name" in exams_df.columns else f"Exam {r.get('id')}"})
 
     if request.method == "POST":
-        qdf = load_csv_from_drive(sa, QUESTIONS_FILE_ID)
-        qdf = _ensure_questions_df(qdf)
-
-        try:
-            next_id = int(qdf["id"].max()) + 1 if not qdf.empty and qdf["id"].astype(str).str.strip().any() else 1
-        except Exception:
-            next_id = 1
-
         data = request.form.to_dict()
         new_row = {
-            "id": next_id,
             "exam_id": int(data.get("exam_id") or 0),
             "question_text": data.get("question_text", "").strip(),
             "option_a": data.get("option_a", "").strip(),
@@ -608,10 +602,17 @@ def add_question():
             "negative_marks": data.get("negative_marks", "").strip() or "1",
             "tolerance": data.get("tolerance", "").strip() or ""
         }
+        with_html(new_row)
 
-        new_df = pd.concat([qdf, pd.DataFrame([new_row])], ignore_index=True)
-        ok = safe_csv_save_with_retry(new_df, 'questions')
+        def append_question(qdf):
+            qdf = _ensure_questions_df(qdf)
+            next_id = allocate_ids("questions", 1, floor=max_existing_id(qdf))
+            new_row["id"] = next_id
+            return pd.concat([qdf, pd.DataFrame([new_row])], ignore_index=True)
+
+        ok, _ = safe_csv_update('questions', append_question)
         if ok:
+            question_search.apply_rows([new_row])
             clear_cache()
             flash("Question added successfully.", "success")
             return redirect(url_for("admin.questions_index", exam_id=new_row["exam_id"]))
@@ -624,7 +625,7 @@ def add_question():
 @admin_bp.route("/questions/edit/<int:question_id>", methods=["GET", "POST"])
 @admin_required
 def edit_question(question_id):
-    sa = create_drive_service()
+    sa = get_drive_service()
     exams_df = load_csv_from_drive(sa, EXAMS_FILE_ID)
     exams = []
     if not exams_df.empty:
@@ -635,32 +636,49 @@ def edit_question(question_id):
     qdf = load_csv_from_drive(sa, QUESTIONS_FILE_ID)
     qdf = _ensure_questions_df(qdf)
 
-    hit = qdf[qdf["id"].astype(str) == str(question_id)]
+    hit = qdf[id_mask(qdf, "id", question_id)]
     if hit.empty:
         flash("Question not found.", "danger")
         return redirect(url_for("admin.questions_index"))
 
     if request.method == "POST":
         data = request.form.to_dict()
-        idx = hit.index[0]
-        qdf.at[idx, "exam_id"] = int(data.get("exam_id") or qdf.at[idx, "exam_id"])
-        qdf.at[idx, "question_text"] = data.get("question_text", "").strip()
-        qdf.at[idx, "option_a"] = data.get("option_a", "").strip()
-        qdf.at[idx, "option_b"] = data.get("option_b", "").strip()
-        qdf.at[idx, "option_c"] = data.get("option_c", "").strip()
-        qdf.at[idx, "option_d"] = data.get("option_d", "").strip()
-        qdf.at[idx, "correct_answer"] = data.get("correct_answer", "").strip()
-        qdf.at[idx, "question_type"] = data.get("question_type", "").strip()
-        qdf.at[idx, "image_path"] = data.get("image_path", "").strip()
-        qdf.at[idx, "positive_marks"] = data.get("positive_marks", "").strip() or "4"
-        qdf.at[idx, "negative_marks"] = data.get("negative_marks", "").strip() or "1"
-        qdf.at[idx, "tolerance"] = data.get("tolerance", "").strip() or ""
-
-        ok = save_csv_to_drive(sa, qdf, QUESTIONS_FILE_ID)
+        saved = {}
+
+        def apply_edit(qdf):
+            # Applied to the freshest copy so concurrent edits to other rows survive
+            qdf = _ensure_questions_df(qdf)
+            rows = qdf.index[id_mask(qdf, "id", question_id)]
+            if len(rows) == 0:
+                return None
+            idx = rows[0]
+            qdf.at[idx, "exam_id"] = int(data.get("exam_id") or qdf.at[idx, "exam_id"])
+            qdf.at[idx, "question_text"] = data.get("question_text", "").strip()
+            qdf.at[idx, "option_a"] = data.get("option_a", "").strip()
+            qdf.at[idx, "option_b"] = data.get("option_b", "").strip()
+            qdf.at[idx, "option_c"] = data.get("option_c", "").strip()
+            qdf.at[idx, "option_d"] = data.get("option_d", "").strip()
+            qdf.at[idx, "correct_answer"] = data.get("correct_answer", "").strip()
+            qdf.at[idx, "question_type"] = data.get("question_type", "").strip()
+            qdf.at[idx, "image_path"] = data.get("image_path", "").strip()
+            qdf.at[idx, "positive_marks"] = data.get("positive_marks", "").strip() or "4"
+            qdf.at[idx, "negative_marks"] = data.get("negative_marks", "").strip() or "1"
+            qdf.at[idx, "tolerance"] = data.get("tolerance", "").strip() or ""
+            for col, value in with_html(qdf.loc[idx].to_dict()).items():
+                if col in HTML_COLUMNS:
+                    qdf.at[idx, col] = value
+            saved.update(qdf.loc[idx].to_dict())
+            return qdf
+
+        ok, _ = safe_csv_update('questions', apply_edit)
+        if ok and not saved:
+            flash("Question not found.", "danger")
+            return redirect(url_for("admin.questions_index"))
         if ok:
+            question_search.apply_rows([saved])
             clear_cache()
             flash("Question updated.", "success")
-            return redirect(url_for("admin.questions_index", exam_id=qdf.at[idx, "exam_id"]))
+            return redirect(url_for("admin.questions_index", exam_id=saved["exam_id"]))
         else:
             flash("Failed to save changes.", "danger")
             return redirect(url_for("admin.edit_question", question_id=question_id))
@@ -669,15 +687,53 @@ def edit_question(question_id):
     # Provide sanitized markup to the edit form (it will be shown inside textarea - we send raw string)
     return render_template("admin/edit_question.html", exams=exams, question=qrow, form_mode="edit")
 
+@admin_bp.route("/api/questions/search")
+@admin_required
+def api_questions_search():
+    """
+    Ranked full-text search over question text and options.
+    Query args: q, exam_id (optional), page, per_page.
+    """
+    query = (request.args.get("q") or "").strip()
+    if not query:
+        return jsonify({"success": False, "message": "q is required"}), 400
+    try:
+        found = question_search.search(
+            query,
+            exam_id=request.args.get("exam_id", type=int),
+            page=request.args.get("page", 1, type=int),
+            per_page=request.args.get("per_page", 20, type=int),
+        )
+        return jsonify({"success": True, **found})
+    except Exception as e:
+        print(f"❌ api_questions_search error: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@admin_bp.route("/api/questions/dedupe-report")
+@admin_required
+def api_questions_dedupe_report():
+    """Last near/exact duplicate report of the question bank (?refresh=1 rebuilds it now)."""
+    try:
+        report = None if request.args.get("refresh") == "1" else question_dedupe.load_report()
+        if report is None:
+            report = question_dedupe.run_dedupe_report()
+        if report is None:
+            return jsonify({"success": False, "message": "Question bank unavailable, try again shortly"}), 503
+        return jsonify({"success": True, "report": report})
+    except Exception as e:
+        print(f"❌ api_questions_dedupe_report error: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
 @admin_bp.route("/questions/delete/<int:question_id>", methods=["POST"])
 @admin_required
 def delete_question(question_id):
-    sa = create_drive_service()
-    qdf = load_csv_from_drive(sa, QUESTIONS_FILE_ID)
-    qdf = _ensure_questions_df(qdf)
-    new_df = qdf[qdf["id"].astype(str) != str(question_id)].copy()
-    ok = safe_csv_save_with_retry(new_df, 'questions')
+    def drop_question(qdf):
+        qdf = _ensure_questions_df(qdf)
+        return qdf[qdf["id"].astype(str) != str(question_id)].copy()
+
+    ok, _ = safe_csv_update('questions', drop_question)
     if ok:
+        question_search.remove_ids([question_id])
         clear_cache()
         flash("Question deleted.", "info")
     else:
@@ -698,21 +754,21 @@ def delete_multiple_questions():
 
         ids_str = set([str(int(i)) for i in ids if str(i).strip()])
 
-        sa = create_drive_service()
-        qdf = load_csv_from_drive(sa, QUESTIONS_FILE_ID)
-        qdf = _ensure_questions_df(qdf)
+        counts = {}
 
-        before_count = len(qdf)
-        new_df = qdf[~qdf["id"].astype(str).isin(ids_str)].copy()
-        after_count = len(new_df)
-        deleted_count = before_count - after_count
+        def drop_questions(qdf):
+            qdf = _ensure_questions_df(qdf)
+            new_df = qdf[~id_in_mask(qdf, "id", ids_str)].copy()
+            counts["deleted"] = len(qdf) - len(new_df)
+            return new_df
 
-        ok = safe_csv_save_with_retry(new_df, 'questions')
+        ok, _ = safe_csv_update('questions', drop_questions)
         if not ok:
             return jsonify({"success": False, "message": "Failed to save updated questions CSV"}), 500
 
+        question_search.remove_ids(ids_str)
         clear_cache()
-        return jsonify({"success": True, "deleted": deleted_count})
+        return jsonify({"success": True, "deleted": counts.get("deleted", 0)})
 
     except Exception as e:
         print(f"❌ delete_multiple_questions error: {e}")
@@ -741,32 +797,33 @@ def questions_bulk_update():
         neg_str = None if neg is None else str(neg).strip()
         tol_str = None if tol is None else str(tol)
 
-        sa = create_drive_service()
-        qdf = load_csv_from_drive(sa, QUESTIONS_FILE_ID)
-        qdf = _ensure_questions_df(qdf)
-
-        mask_exam = qdf["exam_id"].astype(str) == str(exam_id)
-        mask_type = qdf["question_type"].astype(str).str.strip().str.upper() == qtype.upper()
-        mask = mask_exam & mask_type
-
-        if not mask.any():
-            return jsonify({"success": True, "updated": 0, "message": "No matching questions found"}), 200
-
-        idxs = qdf[mask].index.tolist()
-        for idx in idxs:
-            if pos_str is not None and pos_str != "":
-                qdf.at[idx, "positive_marks"] = pos_str
-            if neg_str is not None and neg_str != "":
-                qdf.at[idx, "negative_marks"] = neg_str
-            if tol is not None:
-                qdf.at[idx, "tolerance"] = tol_str
-
-        ok = save_csv_to_drive(sa, qdf, QUESTIONS_FILE_ID)
+        counts = {}
+
+        def apply_marks(qdf):
+            qdf = _ensure_questions_df(qdf)
+            mask_exam = id_mask(qdf, "exam_id", exam_id)
+            mask_type = qdf["question_type"].astype(str).str.strip().str.upper() == qtype.upper()
+            idxs = qdf[mask_exam & mask_type].index.tolist()
+            counts["updated"] = len(idxs)
+            if not idxs:
+                return None
+            for idx in idxs:
+                if pos_str is not None and pos_str != "":
+                    qdf.at[idx, "positive_marks"] = pos_str
+                if neg_str is not None and neg_str != "":
+                    qdf.at[idx, "negative_marks"] = neg_str
+                if tol is not None:
+                    qdf.at[idx, "tolerance"] = tol_str
+            return qdf
+
+        ok, _ = safe_csv_update('questions', apply_marks)
         if not ok:
             return jsonify({"success": False, "message": "Failed to save CSV"}), 500
+        if not counts.get("updated"):
+            return jsonify({"success": True, "updated": 0, "message": "No matching questions found"}), 200
 
         clear_cache()
-        return jsonify({"success": True, "updated": len(idxs)}), 200
+        return jsonify({"success": True, "updated": counts["updated"]}), 200
 
     except Exception as e:
         print(f"❌ questions_bulk_update error: {e}")
@@ -797,6 +854,10 @@ def upload_images_page():
             uploaded = 0
             failed = []
 
+            # Look up every existing name in one batched round-trip instead of per file
+            names = [secure_filename(f.filename) for f in files if f and f.filename]
+            existing_ids = find_files_by_names(drive_upload, names, folder_id)
+
             for f in files:
                 if not f or not f.filename:
                     continue
@@ -818,7 +879,7 @@ def upload_images_page():
 
                 fh = None
                 try:
-                    existing_id = find_file_by_name(drive_upload, safe_name, folder_id)
+                    existing_id = existing_ids.get(safe_name)
                     mime, _ = mimetypes.guess_type(safe_name)
                     fh = open(temp_path, "rb")
                     media = MediaIoBaseUpload(fh, mimetype=mime or "application/octet-stream", resumable=True)
@@ -826,11 +887,13 @@ def upload_images_page():
                     if existing_id:
                         drive_upload.files().update(fileId=existing_id, media_body=media).execute()
                     else:
-                        drive_upload.files().create(
+                        created = drive_upload.files().create(
                             body={"name": safe_name, "parents": [folder_id]},
                             media_body=media,
                             fields="id"
                         ).execute()
+                        # Same name twice in one upload -> second one updates
+                        existing_ids[safe_name] = (created or {}).get("id")
                     uploaded += 1
                 except HttpError as e:
                     failed.append({"filename": safe_name, "error": str(e)})
@@ -853,7 +916,7 @@ def upload_images_page():
         except Exception as e:
             return jsonify({"success": False, "message": f"Unexpected error: {str(e)}"}), 500
 
-    sa = create_drive_service()
+    sa = get_drive_service()
     subjects = _get_subject_folders(sa)
     load_error = None if subjects else "No subjects found (or subjects.csv missing)."
     return render_template(
@@ -875,23 +938,13 @@ def questions_batch_add():
         if not items:
             return jsonify({"success": False, "message": "No questions provided"}), 400
 
-        sa = create_drive_service()
-        qdf = load_csv_from_drive(sa, QUESTIONS_FILE_ID)
-        qdf = _ensure_questions_df(qdf)
-
-        try:
-            next_id = int(qdf["id"].max()) + 1 if not qdf.empty and qdf["id"].astype(str).str.strip().any() else 1
-        except Exception:
-            next_id = 1
-
         new_rows = []
-        added_count = 0
-        for it in items:
+        payload_index = []   # position in payload["questions"] of each row kept
+        for index, it in enumerate(items):
             qt = (it.get("question_text") or "").strip()
             if not qt:
                 continue
             row = {
-                "id": next_id,
                 "exam_id": exam_id,
                 "question_text": qt,
                 "option_a": (it.get("option_a") or "").strip(),
@@ -905,25 +958,97 @@ def questions_batch_add():
                 "negative_marks": str(it.get("negative_marks") or "1"),
                 "tolerance": str(it.get("tolerance") or "")
             }
-            new_rows.append(row)
-            next_id += 1
-            added_count += 1
+            new_rows.append(with_html(row))
+            payload_index.append(index)
 
         if not new_rows:
             return jsonify({"success": False, "message": "No valid rows to add"}), 400
 
-        appended = pd.concat([qdf, pd.DataFrame(new_rows)], ignore_index=True)
-        ok = safe_csv_save_with_retry(appended, 'questions')
+        # Flag exact / near duplicates (of the bank and within the batch); skip them on request
+        duplicates = question_dedupe.check_items(new_rows)
+        flagged = {d["index"] for d in duplicates}
+        for d in duplicates:
+            # report positions in the client's payload, not in the blank-filtered rows
+            d["index"] = payload_index[d["index"]]
+            if d["duplicate_of_item"] is not None:
+                d["duplicate_of_item"] = payload_index[d["duplicate_of_item"]]
+        skipped = 0
+        if payload.get("skip_duplicates") and flagged:
+            skipped = len(flagged)
+            new_rows = [row for i, row in enumerate(new_rows) if i not in flagged]
+            if not new_rows:
+                return jsonify({"success": True, "added": 0, "skipped": skipped, "duplicates": duplicates})
+
+        def append_questions(qdf):
+            # Re-applied to the fresh copy if someone else saved in between;
+            # the whole id block is reserved in one allocation
+            qdf = _ensure_questions_df(qdf)
+            next_id = allocate_ids("questions", len(new_rows), floor=max_existing_id(qdf))
+            for offset, row in enumerate(new_rows):
+                row["id"] = next_id + offset
+            return pd.concat([qdf, pd.DataFrame(new_rows)], ignore_index=True)
+
+        ok, _ = safe_csv_update('questions', append_questions)
         if not ok:
             return jsonify({"success": False, "message": "Failed to save to Drive"}), 500
 
+        question_search.apply_rows(new_rows)
+        question_dedupe.apply_rows(new_rows)
         clear_cache()
-        return jsonify({"success": True, "added": added_count})
+        return jsonify({"success": True, "added": len(new_rows), "skipped": skipped, "duplicates": duplicates})
 
     except Exception as e:
         print(f"❌ questions_batch_add error: {e}")
         return jsonify({"success": False, "message": str(e)}), 500
 
+@admin_bp.route("/questions/import", methods=["POST"])
+@admin_required
+def questions_import():
+    """Start a streamed CSV / XLSX question import; poll api_questions_import_progress for the result."""
+    try:
+        upload = request.files.get("file")
+        if not upload or not upload.filename:
+            return jsonify({"success": False, "message": "No file uploaded"}), 400
+        filename = secure_filename(upload.filename)
+        if not question_import.supported_kind(filename):
+            allowed = ".csv, .xlsx" if question_import.load_workbook is not None else ".csv (install openpyxl for .xlsx)"
+            return jsonify({"success": False, "message": f"Unsupported file type; use {allowed}"}), 400
+
+        default_exam_id = (request.form.get("exam_id") or "").strip() or None
+        sa = get_drive_service()
+        exams_df = load_csv_from_drive(sa, EXAMS_FILE_ID)
+        exam_ids = None
+        if exams_df is not None and not exams_df.empty and "id" in exams_df.columns:
+            exam_ids = set(pd.to_numeric(exams_df["id"], errors="coerce").dropna().astype(int))
+
+        question_import.purge_old_jobs(UPLOAD_TMP_DIR)
+        temp_path = os.path.join(UPLOAD_TMP_DIR, f"import_{datetime.now().strftime('%Y%m%d%H%M%S%f')}_{filename}")
+        upload.save(temp_path)
+
+        job_id = question_import.start_import(
+            temp_path, filename,
+            default_exam_id=default_exam_id,
+            exam_ids=exam_ids,
+            skip_duplicates=request.form.get("skip_duplicates") in ("1", "true", "on"),
+            prepare_df=_ensure_questions_df,
+        )
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "progress_url": url_for("admin.api_questions_import_progress", job_id=job_id),
+        }), 202
+    except Exception as e:
+        print(f"❌ questions_import error: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
+
+@admin_bp.route("/api/questions/import/<job_id>")
+@admin_required
+def api_questions_import_progress(job_id):
+    progress = question_import.get_progress(job_id)
+    if progress is None:
+        return jsonify({"success": False, "message": "Unknown import"}), 404
+    return jsonify({"success": True, "import": progress})
+
 # ========== Publish ==========
 @admin_bp.route("/publish", methods=["GET", "POST"])
 @admin_required
@@ -1046,8 +1171,9 @@ def admin_oauth_callback():
 
 @admin_bp.route("/attempts")
 @admin_required
+@cached_page(file_versions(USERS_FILE_ID, EXAMS_FILE_ID, EXAM_ATTEMPTS_FILE_ID))
 def attempts():
-    sa = create_drive_service()
+    sa = get_drive_service()
     users_df = load_csv_from_drive(sa, USERS_FILE_ID)
     exams_df = load_csv_from_drive(sa, EXAMS_FILE_ID)
     attempts_df = load_csv_from_drive(sa, EXAM_ATTEMPTS_FILE_ID)
@@ -1060,8 +1186,8 @@ def attempts():
     for _, u in users_df.iterrows():
         for _, e in exams_df.iterrows():
             student_id, exam_id = str(u["id"]), str(e["id"])
-            user_attempts = attempts_df[(attempts_df["student_id"].astype(str)==student_id) &
-                                        (attempts_df["exam_id"].astype(str)==exam_id)]
+            user_attempts = attempts_df[id_mask(attempts_df, "student_id", student_id) &
+                                        id_mask(attempts_df, "exam_id", exam_id)]
             used = len(user_attempts)
             
             # More robust max_attempts handling
@@ -1102,41 +1228,41 @@ def attempts():
 @admin_bp.route("/attempts/modify", methods=["POST"])
 @admin_required
 def attempts_modify():
-    sa = create_drive_service()
     payload = request.get_json(force=True)
     student_id = str(payload.get("student_id"))
     exam_id = str(payload.get("exam_id"))
     action = payload.get("action")
     amount = int(payload.get("amount") or 0)
 
-    attempts_df = load_csv_from_drive(sa, EXAM_ATTEMPTS_FILE_ID)
-    if attempts_df is None: 
-        attempts_df = pd.DataFrame(columns=["id","student_id","exam_id","attempt_number","status","start_time","end_time"])
-
-    mask = (attempts_df["student_id"].astype(str)==student_id) & (attempts_df["exam_id"].astype(str)==exam_id)
-    current = attempts_df[mask]
-    used = len(current)
-
-    if action == "reset":
-        attempts_df = attempts_df[~mask]
-    elif action == "decrease":
-        drop_ids = current.tail(amount)["id"].tolist()
-        attempts_df = attempts_df[~attempts_df["id"].isin(drop_ids)]
-    elif action == "increase":
-        start_id = (attempts_df["id"].astype(int).max() + 1) if not attempts_df.empty else 1
-        for i in range(amount):
-            attempts_df = pd.concat([attempts_df, pd.DataFrame([{
-                "id": start_id+i,
-                "student_id": student_id,
-                "exam_id": exam_id,
-                "attempt_number": used+i+1,
-                "status": "manual_add",
-                "start_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                "end_time": ""
-            }])], ignore_index=True)
-
-    # Use save_csv_to_drive directly instead of safe_csv_save_with_retry
-    ok = save_csv_to_drive(sa, attempts_df, EXAM_ATTEMPTS_FILE_ID)
+    def modify(attempts_df):
+        # Re-applied to the fresh copy if a student start/submit saved in between
+        if attempts_df is None or len(attempts_df.columns) == 0:
+            attempts_df = pd.DataFrame(columns=["id","student_id","exam_id","attempt_number","status","start_time","end_time"])
+
+        mask = id_mask(attempts_df, "student_id", student_id) & id_mask(attempts_df, "exam_id", exam_id)
+        current = attempts_df[mask]
+        used = len(current)
+
+        if action == "reset":
+            attempts_df = attempts_df[~mask]
+        elif action == "decrease":
+            drop_ids = current.tail(amount)["id"].tolist()
+            attempts_df = attempts_df[~attempts_df["id"].isin(drop_ids)]
+        elif action == "increase" and amount > 0:
+            start_id = allocate_ids("exam_attempts", amount, floor=max_existing_id(attempts_df))
+            for i in range(amount):
+                attempts_df = pd.concat([attempts_df, pd.DataFrame([{
+                    "id": start_id+i,
+                    "student_id": student_id,
+                    "exam_id": exam_id,
+                    "attempt_number": used+i+1,
+                    "status": "manual_add",
+                    "start_time": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "end_time": ""
+                }])], ignore_index=True)
+        return attempts_df
+
+    ok, _ = safe_csv_update('exam_attempts', modify)
     if ok:
         clear_cache()
         return jsonify({"success": True})
@@ -1156,7 +1282,7 @@ def requests_dashboard():
 def new_requests():
     """View new (pending) access requests"""
     try:
-        service = create_drive_service()
+        service = get_drive_service()
         
         # Load requests data
         requests_df = load_csv_from_drive(service, REQUESTS_RAISED_FILE_ID)
@@ -1169,7 +1295,7 @@ def new_requests():
         # Filter pending requests
         if not requests_df.empty:
             pending_requests = requests_df[
-                requests_df['request_status'].astype(str).str.lower() == 'pending'
+                status_mask(requests_df, 'request_status', 'pending')
             ].sort_values('request_date', ascending=False)
         else:
             pending_requests = pd.DataFrame()
@@ -1199,7 +1325,7 @@ def new_requests():
 def requests_history():
     """View completed/denied requests history"""
     try:
-        service = create_drive_service()
+        service = get_drive_service()
         
         # Load requests data
         requests_df = load_csv_from_drive(service, REQUESTS_RAISED_FILE_ID)
@@ -1248,7 +1374,7 @@ def approve_request(request_id):
                 'message': 'Please select an access level to approve'
             }), 400
         
-        service = create_drive_service()
+        service = get_drive_service()
         
         # Load requests data
         requests_df = load_csv_from_drive(service, REQUESTS_RAISED_FILE_ID)
@@ -1261,7 +1387,7 @@ def approve_request(request_id):
         # Find the specific request
         request_row = requests_df[
             (requests_df['request_id'].astype(int) == request_id) &
-            (requests_df['request_status'].astype(str).str.lower() == 'pending')
+            status_mask(requests_df, 'request_status', 'pending')
         ]
         
         if request_row.empty:
@@ -1347,7 +1473,7 @@ def deny_request(request_id):
                 'message': 'Please provide a reason for denial'
             }), 400
         
-        service = create_drive_service()
+        service = get_drive_service()
         
         # Load requests data
         requests_df = load_csv_from_drive(service, REQUESTS_RAISED_FILE_ID)
@@ -1360,7 +1486,7 @@ def deny_request(request_id):
         # Find the specific request
         request_row = requests_df[
             (requests_df['request_id'].astype(int) == request_id) &
-            (requests_df['request_status'].astype(str).str.lower() == 'pending')
+            status_mask(requests_df, 'request_status', 'pending')
         ]
         
         if request_row.empty:
@@ -1405,7 +1531,7 @@ def deny_request(request_id):
 def api_requests_stats():
     """API endpoint for request statistics"""
     try:
-        service = create_drive_service()
+        service = get_drive_service()
         
         # Load requests data
         requests_df = load_csv_from_drive(service, REQUESTS_RAISED_FILE_ID)
@@ -1443,10 +1569,11 @@ def api_requests_stats():
 
 @admin_bp.route("/users/manage")
 @admin_required
+@cached_page(file_versions(USERS_FILE_ID))
 def users_manage():
     """View users management page"""
     try:
-        service = create_drive_service()
+        service = get_drive_service()
         
         # Load users data
         users_df = load_csv_from_drive(service, USERS_FILE_ID)
@@ -1502,7 +1629,7 @@ def update_user_role():
                 'message': 'Invalid role selected'
             }), 400
         
-        service = create_drive_service()
+        service = get_drive_service()
         
         # Load users data
         users_df = load_csv_from_drive(service, USERS_FILE_ID)
@@ -1513,7 +1640,7 @@ def update_user_role():
             }), 500
         
         # Find user
-        user_mask = users_df['id'].astype(str) == str(user_id)
+        user_mask = id_mask(users_df, 'id', user_id)
         if not user_mask.any():
             return jsonify({
                 'success': False,
@@ -1578,7 +1705,7 @@ def bulk_update_user_roles():
                 'message': 'No updates provided'
             }), 400
         
-        service = create_drive_service()
+        service = get_drive_service()
         users_df = load_csv_from_drive(service, USERS_FILE_ID)
         
         if users_df is None or users_df.empty:
@@ -1603,7 +1730,7 @@ def bulk_update_user_roles():
                 errors.append(f'Invalid role {new_role} for user {user_id}')
                 continue
             
-            user_mask = users_df['id'].astype(str) == str(user_id)
+            user_mask = id_mask(users_df, 'id', user_id)
             if not user_mask.any():
                 errors.append(f'User {user_id} not found')
                 continue
@@ -1651,7 +1778,7 @@ def bulk_update_user_roles():
 def api_users_stats():
     """API endpoint for user statistics"""
     try:
-        service = create_drive_service()
+        service = get_drive_service()
         users_df = load_csv_from_drive(service, USERS_FILE_ID)
         
         if users_df is None or users_df.empty:
@@ -1706,13 +1833,13 @@ def users_analytics():
 def api_users_analytics_stats():
     """API endpoint for users analytics overview stats"""
     try:
-        service = create_drive_service()
+        service = get_drive_service()
         
         # Load all required data
         users_df = load_csv_from_drive(service, USERS_FILE_ID)
         exams_df = load_csv_from_drive(service, EXAMS_FILE_ID)
-        results_df = load_csv_from_drive(service, RESULTS_FILE_ID)
-        responses_df = load_csv_from_drive(service, RESPONSES_FILE_ID)
+        results_df = load_full_table(service, "results")
+        responses_df = load_full_table(service, "responses")
         
         stats = {
             'total_users': len(users_df) if users_df is not None and not users_df.empty else 0,
@@ -1737,7 +1864,7 @@ def api_users_analytics_stats():
 def users_analytics_results():
     """Results tab content for users analytics"""
     try:
-        service = create_drive_service()
+        service = get_drive_service()
         
         # Get filter parameters
         user_filter = request.args.get('user', '')
@@ -1748,7 +1875,7 @@ def users_analytics_results():
         per_page = 20
         
         # Load data
-        results_df = load_csv_from_drive(service, RESULTS_FILE_ID)
+        results_df = load_full_table(service, "results")
         users_df = load_csv_from_drive(service, USERS_FILE_ID)
         exams_df = load_csv_from_drive(service, EXAMS_FILE_ID)
         
@@ -1779,10 +1906,10 @@ def users_analytics_results():
             filtered_df = results_df.copy()
             
             if user_filter:
-                filtered_df = filtered_df[filtered_df['student_id'].astype(str) == str(user_filter)]
+                filtered_df = filtered_df[id_mask(filtered_df, 'student_id', user_filter)]
             
             if exam_filter:
-                filtered_df = filtered_df[filtered_df['exam_id'].astype(str) == str(exam_filter)]
+                filtered_df = filtered_df[id_mask(filtered_df, 'exam_id', exam_filter)]
             
             # Use 'completed_at' for date filtering
             if date_from:
@@ -1878,11 +2005,52 @@ def users_analytics_results():
                              pagination=None)
 
 
-
-
-
-
-
+@admin_bp.route("/users-analytics/export/<table>")
+@admin_required
+def users_analytics_export(table):
+    """Stream results / responses / attempts as CSV or XLSX, with the results tab filters."""
+    if table not in exports.EXPORT_COLUMNS:
+        return jsonify({"success": False, "message": f"Unknown export '{table}'"}), 404
+    fmt = (request.args.get("format") or "csv").lower()
+    if fmt not in ("csv", "xlsx"):
+        return jsonify({"success": False, "message": "format must be csv or xlsx"}), 400
+    if fmt == "xlsx" and not exports.xlsx_available():
+        return jsonify({"success": False, "message": "XLSX export needs openpyxl; use format=csv"}), 501
+
+    filters = {
+        "user": request.args.get("user", ""),
+        "exam": request.args.get("exam", ""),
+        "date_from": request.args.get("dateFrom", ""),
+        "date_to": request.args.get("dateTo", ""),
+    }
+    try:
+        service = get_drive_service()
+        users_df = load_csv_from_drive(service, USERS_FILE_ID)
+        exams_df = load_csv_from_drive(service, EXAMS_FILE_ID)
+        results_partitions = table_partitions(service, "results")
+        if table == "results":
+            partitions = results_partitions
+        elif table == "responses":
+            partitions = table_partitions(service, "responses")
+        else:
+            partitions = (load_csv_from_drive(service, EXAM_ATTEMPTS_FILE_ID),)
+
+        rows = exports.export_rows(table, partitions, filters, users_df=users_df,
+                                   exams_df=exams_df, results_partitions=results_partitions)
+        columns = exports.EXPORT_COLUMNS[table]
+        filename = exports.export_filename(table, fmt)
+        headers = {"Content-Disposition": f"attachment; filename={filename}"}
+
+        if fmt == "xlsx":
+            path = exports.write_xlsx(rows, columns, table)
+            headers["Content-Length"] = str(os.path.getsize(path))
+            return Response(exports.iter_file(path), headers=headers,
+                            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        return Response(stream_with_context(exports.iter_csv(rows, columns)),
+                        headers=headers, mimetype="text/csv")
+    except Exception as e:
+        print(f"❌ users_analytics_export error: {e}")
+        return jsonify({"success": False, "message": str(e)}), 500
 
 
 @admin_bp.route("/users-analytics/view-result/<int:result_id>/<int:exam_id>")
@@ -1899,12 +2067,12 @@ def users_analytics_view_result(result_id, exam_id):
     Converts NaN/NA to safe defaults, coerces numeric types, and derives attempted_questions.
     """
     try:
-        service = create_drive_service()
+        service = get_drive_service()
 
-        results_df = load_csv_from_drive(service, RESULTS_FILE_ID)
+        results_df = load_full_table(service, "results")
         users_df = load_csv_from_drive(service, USERS_FILE_ID)
         exams_df = load_csv_from_drive(service, EXAMS_FILE_ID)
-        responses_df = load_csv_from_drive(service, RESPONSES_FILE_ID)
+        responses_df = responses_index.get_responses(result_id)  # this attempt's rows only
         questions_df = load_csv_from_drive(service, QUESTIONS_FILE_ID)
 
         # helpers
@@ -1943,7 +2111,7 @@ def users_analytics_view_result(result_id, exam_id):
         if results_df is None or results_df.empty:
             abort(404)
 
-        rrow = results_df[results_df['id'].astype(str) == str(result_id)]
+        rrow = results_df[id_mask(results_df, 'id', result_id)]
         if rrow.empty:
             abort(404)
         r = rrow.iloc[0].to_dict()
@@ -1983,7 +2151,7 @@ def users_analytics_view_result(result_id, exam_id):
             try:
                 # find exam row to compute max_score if possible
                 if exams_df is not None and not exams_df.empty:
-                    erow = exams_df[exams_df['id'].astype(str) == str(exam_id)]
+                    erow = exams_df[id_mask(exams_df, 'id', exam_id)]
                     if not erow.empty:
                         e0 = erow.iloc[0].to_dict()
                         positive_marks = to_float(e0.get('positive_marks', e0.get('pos_marks', 0.0)))
@@ -1996,7 +2164,7 @@ def users_analytics_view_result(result_id, exam_id):
         # find user
         user = {}
         if users_df is not None and not users_df.empty:
-            urow = users_df[users_df['id'].astype(str) == str(result.get('student_id', ''))]
+            urow = users_df[id_mask(users_df, 'id', result.get('student_id', ''))]
             if not urow.empty:
                 user = urow.iloc[0].to_dict()
             else:
@@ -2007,7 +2175,7 @@ def users_analytics_view_result(result_id, exam_id):
         # find exam and normalize important fields
         exam = {}
         if exams_df is not None and not exams_df.empty:
-            erow = exams_df[exams_df['id'].astype(str) == str(exam_id)]
+            erow = exams_df[id_mask(exams_df, 'id', exam_id)]
             if not erow.empty:
                 e = erow.iloc[0].to_dict()
                 exam['id'] = s(e.get('id', exam_id), str(exam_id))
@@ -2032,7 +2200,7 @@ def users_analytics_view_result(result_id, exam_id):
         # gather basic responses for this result (optional)
         responses = []
         if responses_df is not None and not responses_df.empty:
-            rows = responses_df[responses_df['result_id'].astype(str) == str(result_id)]
+            rows = responses_df
             for _, rr in rows.iterrows():
                 # keep raw dict here; responses normalization used in view-responses route
                 responses.append({k: ("" if (isinstance(v, float) and pd.isna(v)) else v) for k,v in rr.to_dict().items()})
@@ -2072,19 +2240,19 @@ def users_analytics_view_responses(result_id, exam_id):
       question_id, question_text, user_answer, correct_answer, status, explanation, marks_obtained
     """
     try:
-        service = create_drive_service()
+        service = get_drive_service()
 
-        results_df = load_csv_from_drive(service, RESULTS_FILE_ID)
+        results_df = load_full_table(service, "results")
         users_df = load_csv_from_drive(service, USERS_FILE_ID)
         exams_df = load_csv_from_drive(service, EXAMS_FILE_ID)
-        responses_df = load_csv_from_drive(service, RESPONSES_FILE_ID)
+        responses_df = responses_index.get_responses(result_id)  # this attempt's rows only
         questions_df = load_csv_from_drive(service, QUESTIONS_FILE_ID)
 
         if results_df is None or results_df.empty:
             abort(404)
 
         # find result
-        rrow = results_df[results_df['id'].astype(str) == str(result_id)]
+        rrow = results_df[id_mask(results_df, 'id', result_id)]
         if rrow.empty:
             abort(404)
         r = rrow.iloc[0].to_dict()
@@ -2092,7 +2260,7 @@ def users_analytics_view_responses(result_id, exam_id):
 
         # find user
         if users_df is not None and not users_df.empty:
-            urow = users_df[users_df['id'].astype(str) == str(result.get('student_id', ''))]
+            urow = users_df[id_mask(users_df, 'id', result.get('student_id', ''))]
             if not urow.empty:
                 user = urow.iloc[0].to_dict()
             else:
@@ -2102,7 +2270,7 @@ def users_analytics_view_responses(result_id, exam_id):
 
         # find exam
         if exams_df is not None and not exams_df.empty:
-            erow = exams_df[exams_df['id'].astype(str) == str(exam_id)]
+            erow = exams_df[id_mask(exams_df, 'id', exam_id)]
             if not erow.empty:
                 exam = erow.iloc[0].to_dict()
             else:
@@ -2119,7 +2287,7 @@ def users_analytics_view_responses(result_id, exam_id):
         # build responses list
         responses = []
         if responses_df is not None and not responses_df.empty:
-            rows = responses_df[responses_df['result_id'].astype(str) == str(result_id)]
+            rows = responses_df
             for _, rr in rows.iterrows():
                 rd = rr.to_dict()
 
@@ -2157,7 +2325,7 @@ def users_analytics_view_responses(result_id, exam_id):
                     qtext = s(rd.get('question_text'))
                 else:
                     if qid and questions_df is not None and not questions_df.empty:
-                        qrow = questions_df[questions_df['id'].astype(str) == qid]
+                        qrow = questions_df[id_mask(questions_df, 'id', qid)]
                         if not qrow.empty:
                             # prefer 'question_text' or 'text' or 'question'
                             qtext = s(qrow.iloc[0].get('question_text') or qrow.iloc[0].get('text') or qrow.iloc[0].get('question') or '')
@@ -2201,16 +2369,16 @@ def users_analytics_download_result(result_id):
     and a paginated list of responses with status, student answer, correct answer, explanation.
     """
     try:
-        service = create_drive_service()
-        results_df = load_csv_from_drive(service, RESULTS_FILE_ID)
+        service = get_drive_service()
+        results_df = load_full_table(service, "results")
         users_df = load_csv_from_drive(service, USERS_FILE_ID)
         exams_df = load_csv_from_drive(service, EXAMS_FILE_ID)
-        responses_df = load_csv_from_drive(service, RESPONSES_FILE_ID)
+        responses_df = responses_index.get_responses(result_id)  # this attempt's rows only
         questions_df = load_csv_from_drive(service, QUESTIONS_FILE_ID)
 
         if results_df is None or results_df.empty:
             abort(404)
-        rrow = results_df[results_df['id'].astype(str) == str(result_id)]
+        rrow = results_df[id_mask(results_df, 'id', result_id)]
         if rrow.empty:
             abort(404)
         r = rrow.iloc[0].to_dict()
@@ -2219,26 +2387,26 @@ def users_analytics_download_result(result_id):
         # user
         user = {'username': 'Unknown', 'full_name': 'Unknown', 'email': ''}
         if users_df is not None and not users_df.empty:
-            urows = users_df[users_df['id'].astype(str) == str(result.get('student_id', ''))]
+            urows = users_df[id_mask(users_df, 'id', result.get('student_id', ''))]
             if not urows.empty:
                 user = urows.iloc[0].to_dict()
 
         # exam
         exam = {'name': 'Unknown Exam', 'description': ''}
         if exams_df is not None and not exams_df.empty:
-            erows = exams_df[exams_df['id'].astype(str) == str(result.get('exam_id', ''))]
+            erows = exams_df[id_mask(exams_df, 'id', result.get('exam_id', ''))]
             if not erows.empty:
                 exam = erows.iloc[0].to_dict()
 
         # responses list
         resp_list = []
         if responses_df is not None and not responses_df.empty:
-            rows = responses_df[responses_df['result_id'].astype(str) == str(result_id)]
+            rows = responses_df
             for _, rr in rows.iterrows():
                 rd = rr.to_dict()
                 qid = rd.get('question_id')
                 if qid and questions_df is not None and not questions_df.empty:
-                    qrow = questions_df[questions_df['id'].astype(str) == str(qid)]
+                    qrow = questions_df[id_mask(questions_df, 'id', qid)]
                     if not qrow.empty:
                         rd['question_text'] = qrow.iloc[0].get('question_text', rd.get('question_text', ''))
                 resp_list.append(rd)
@@ -2367,7 +2535,7 @@ def users_analytics_analytics():
     Render analytics page. Provide list of exams (exams.csv) for the filter.
     """
     try:
-        service = create_drive_service()
+        service = get_drive_service()
         exams_df = load_csv_from_drive(service, EXAMS_FILE_ID)
 
         exams_list = []
@@ -2400,8 +2568,8 @@ def users_analytics_data_api():
       - startDate, endDate (for custom)
     """
     try:
-        service = create_drive_service()
-        results_df = load_csv_from_drive(service, RESULTS_FILE_ID)
+        service = get_drive_service()
+        results_df = load_full_table(service, "results")
         users_df = load_csv_from_drive(service, USERS_FILE_ID)
         exams_df = load_csv_from_drive(service, EXAMS_FILE_ID)
 
@@ -2465,7 +2633,7 @@ def users_analytics_data_api():
         # exam filter (exact match to results.exam_id)
         if exam_filter:
             # accept numeric or string exam ids
-            mask = mask & (rd['exam_id'].astype(str) == str(exam_filter))
+            mask = mask & id_mask(rd, 'exam_id', exam_filter)
 
         filtered = rd[mask].copy()
 
@@ -2554,7 +2722,7 @@ def users_analytics_data_api():
                 sid = str(row['student_id']); attempts = int(row['attempts']); avgScoreVal = round(float(row['avgPct']),2)
                 username = sid; full_name = ''
                 if users_df is not None and not users_df.empty:
-                    urow = users_df[users_df['id'].astype(str) == sid]
+                    urow = users_df[id_mask(users_df, 'id', sid)]
                     if not urow.empty:
                         username = str(urow.iloc[0].get('username') or urow.iloc[0].get('email') or sid)
                         full_name = str(urow.iloc[0].get('full_name') or '')
@@ -2578,7 +2746,7 @@ def users_analytics_data_api():
             for _, r in tmp.iterrows():
                 sid = str(r.get('student_id','')); username = sid; full_name = ''
                 if users_df is not None and not users_df.empty:
-                    urow = users_df[users_df['id'].astype(str) == sid]
+                    urow = users_df[id_mask(users_df, 'id', sid)]
                     if not urow.empty:
                         username = str(urow.iloc[0].get('username') or urow.iloc[0].get('email') or sid)
                         full_name = str(urow.iloc[0].get('full_name') or '')
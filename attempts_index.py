@@ -0,0 +1,176 @@
+# attempts_index.py - In-memory index over exam_attempts keyed by (student_id, exam_id)
+#
+# Routes used to download exam_attempts.csv, fillna/astype(str) it and mask the
+# whole table to answer "how many completed attempts / is one in progress" for a
+# single student. The index is built once per data version (coordination bus)
+# and patched in place after this worker's own attempt transitions, so those
+# questions become dictionary lookups.
+
+import threading
+
+import pandas as pd
+
+_lock = threading.RLock()
+_entries = {}            # (student_id, exam_id) -> {attempt_key: row}
+_student_exams = {}      # student_id -> {exam_id, ...}
+_built_version = None    # bus version the index reflects (None = stale / never built)
+_loader = None           # () -> attempts DataFrame
+_version_fn = None       # () -> current bus version for exam_attempts
+
+
+def configure(loader, version_fn):
+    """Register how to load exam_attempts and read its invalidation-bus version."""
+    global _loader, _version_fn
+    _loader = loader
+    _version_fn = version_fn
+
+
+def _norm_id(value):
+    """'5', 5, 5.0 and ' 5 ' all index the same student / exam."""
+    try:
+        return str(int(float(str(value).strip())))
+    except (ValueError, TypeError):
+        return str(value).strip()
+
+
+def _is_missing(value):
+    try:
+        return value is None or bool(pd.isna(value))
+    except (TypeError, ValueError):
+        return False
+
+
+def _clean_row(row):
+    # NaN / NA -> '' like the old fillna('') normalisation
+    return {k: ('' if _is_missing(v) else v) for k, v in row.items()}
+
+
+def _attempt_key(row, fallback):
+    aid = _norm_id(row.get('id', ''))
+    return aid if aid else f"row_{fallback}"
+
+
+def _current_version():
+    try:
+        return _version_fn() if _version_fn else 0
+    except Exception:
+        return None
+
+
+def rebuild():
+    """Rebuild the whole index from the attempts table."""
+    global _entries, _student_exams, _built_version
+    with _lock:
+        version = _current_version()
+        try:
+            df = _loader() if _loader else None
+        except Exception as e:
+            print(f"⚠️ attempts_index: load failed: {e}")
+            df = None
+
+        # Drive down / not initialised yet comes back as an empty frame without columns:
+        # that is a failed load, not "no attempts", so the index stays stale
+        loaded = df is not None and 'student_id' in df.columns and 'exam_id' in df.columns
+        entries = {}
+        student_exams = {}
+        if loaded and not df.empty:
+            for pos, row in enumerate(df.to_dict('records')):
+                row = _clean_row(row)
+                key = (_norm_id(row.get('student_id')), _norm_id(row.get('exam_id')))
+                entries.setdefault(key, {})[_attempt_key(row, pos)] = row
+                student_exams.setdefault(key[0], set()).add(key[1])
+
+        _entries = entries
+        _student_exams = student_exams
+        _built_version = version if loaded else None
+        print(f"🔧 attempts_index rebuilt: {len(entries)} student/exam pairs (version {version})")
+
+
+def _ensure_fresh():
+    if _built_version is None or _built_version != _current_version():
+        rebuild()
+
+
+def _summarize(rows):
+    completed = 0
+    in_progress = 0
+    active = None
+    latest = None
+    max_attempt_number = 0
+    for row in rows.values():
+        status = str(row.get('status', '')).strip().lower()
+        start = str(row.get('start_time', ''))
+        if status == 'completed':
+            completed += 1
+        elif status == 'in_progress':
+            in_progress += 1
+            if active is None or start > str(active.get('start_time', '')):
+                active = row
+        if latest is None or start >= str(latest.get('start_time', '')):
+            latest = row
+        try:
+            max_attempt_number = max(max_attempt_number, int(float(row.get('attempt_number') or 0)))
+        except (ValueError, TypeError):
+            pass
+    return {
+        'total': len(rows),
+        'completed': completed,
+        'in_progress': in_progress,
+        'active_attempt': dict(active) if active else None,
+        'latest_status': str(latest.get('status', '')).strip().lower() if latest else None,
+        'max_attempt_number': max_attempt_number
+    }
+
+
+def get_summary(student_id, exam_id):
+    """Counts, active attempt and latest status for one (student, exam) pair."""
+    with _lock:
+        _ensure_fresh()
+        rows = _entries.get((_norm_id(student_id), _norm_id(exam_id)), {})
+        return _summarize(rows)
+
+
+def get_active_attempt(student_id, exam_id):
+    return get_summary(student_id, exam_id)['active_attempt']
+
+
+def get_student_attempts(student_id):
+    """All attempts of one student grouped by exam_id."""
+    sid = _norm_id(student_id)
+    with _lock:
+        _ensure_fresh()
+        return {eid: [dict(r) for r in _entries.get((sid, eid), {}).values()]
+                for eid in _student_exams.get(sid, ())}
+
+
+def apply_rows(rows):
+    """
+    Patch the index after THIS worker saved attempt rows (new or changed).
+    If anything else was written since the index was built, mark it stale instead.
+    """
+    global _built_version
+    with _lock:
+        if _built_version is None:
+            return
+        current = _current_version()
+        if current is None or current != _built_version + 1:
+            _built_version = None
+            return
+        for pos, row in enumerate(rows):
+            row = _clean_row(dict(row))
+            key = (_norm_id(row.get('student_id')), _norm_id(row.get('exam_id')))
+            _entries.setdefault(key, {})[_attempt_key(row, f"new_{pos}")] = row
+            _student_exams.setdefault(key[0], set()).add(key[1])
+        _built_version = current
+
+
+def warm():
+    """Build the index now (if stale) so the first lookup doesn't pay for it."""
+    with _lock:
+        _ensure_fresh()
+
+
+def invalidate():
+    global _built_version
+    with _lock:
+        _built_version = None
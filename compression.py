@@ -0,0 +1,122 @@
+# compression.py - gzip / brotli for dynamic responses
+#
+# HTML pages (questions.html carries every question's full text) and the
+# analytics JSON went out uncompressed, which dominated page weight on
+# candidates' mobile connections. An after_request hook compresses textual
+# responses above COMPRESS_MIN_BYTES with brotli when the client accepts it
+# and the module is installed, gzip otherwise. Streamed and file responses are
+# left alone. Bodies that carry an ETag (render_cache pages) are compressed
+# once per ETag and encoding and reused from a small LRU; their ETag is
+# marked weak since the bytes on the wire differ per encoding.
+
+import gzip
+import threading
+from collections import OrderedDict
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024
+COMPRESS_GZIP_LEVEL = 6
+COMPRESS_BROTLI_QUALITY = 5         # good ratio at gzip-like CPU cost
+COMPRESS_MEMO_ENTRIES = 256
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/plain", "text/css", "text/csv", "text/javascript",
+    "application/javascript", "application/json", "image/svg+xml", "application/xml",
+}
+
+_lock = threading.Lock()
+_memo = OrderedDict()               # (etag, encoding) -> compressed body
+_stats = {"compressed": 0, "memo_hits": 0, "bytes_in": 0, "bytes_out": 0}
+
+
+def _choose_encoding(request):
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def _compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=COMPRESS_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL)
+
+
+def _memo_get(key):
+    with _lock:
+        body = _memo.get(key)
+        if body is not None:
+            _memo.move_to_end(key)
+            _stats["memo_hits"] += 1
+        return body
+
+
+def _memo_put(key, body):
+    with _lock:
+        _memo[key] = body
+        while len(_memo) > COMPRESS_MEMO_ENTRIES:
+            _memo.popitem(last=False)
+
+
+def compress_response(response, request):
+    """Compress response in place when it is worth it; returns it either way."""
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = _choose_encoding(request)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    etag, _ = response.get_etag()
+    body = _memo_get((etag, encoding)) if etag else None
+    if body is None:
+        body = _compress(data, encoding)
+        if etag:
+            _memo_put((etag, encoding), body)
+    if len(body) >= len(data):
+        return response
+
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    if etag:
+        response.set_etag(etag, weak=True)
+    with _lock:
+        _stats["compressed"] += 1
+        _stats["bytes_in"] += len(data)
+        _stats["bytes_out"] += len(body)
+    return response
+
+
+def init_compression(app):
+    """Register the after_request hook on app."""
+    from flask import request
+
+    @app.after_request
+    def _compress_after_request(response):
+        try:
+            return compress_response(response, request)
+        except Exception as e:
+            print(f"⚠️ Response compression skipped: {e}")
+            return response
+
+
+def get_compression_stats():
+    """Snapshot for debug endpoints"""
+    with _lock:
+        stats = dict(_stats)
+    stats["ratio"] = round(stats["bytes_out"] / stats["bytes_in"], 3) if stats["bytes_in"] else None
+    stats["brotli"] = brotli is not None
+    return stats
@@ -0,0 +1,210 @@
+# coordination.py - Cross-process locks + cache invalidation bus for multi-worker gunicorn
+#
+# threading locks only protect one worker. Everything here is backed by small
+# files in a local state directory so every worker process on the host sees
+# the same locks and the same per-table data versions:
+#   * get_process_lock(name) -> re-entrant lock held across threads AND processes (fcntl.flock)
+#   * bump_version(name)     -> called after a successful save of a table
+#   * current_version(name)  -> cheap (one stat) check before serving cached data
+#
+# PORTAL_STATE_DIR must point at a persistent directory shared by every host
+# that writes to Drive: id sequences live here too, and the /tmp default is
+# only safe for a single host whose state survives restarts. The directory is
+# created 0700 and refused if another user owns it or can write to it, since
+# locks, id sequences and table snapshots are all trusted as-is.
+
+import os
+import re
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows dev machines: fall back to in-process locking only
+    fcntl = None
+
+STATE_DIR = os.environ.get("PORTAL_STATE_DIR") or os.path.join(tempfile.gettempdir(), "exam_portal_state")
+LOCK_DIR = os.path.join(STATE_DIR, "locks")
+VERSION_DIR = os.path.join(STATE_DIR, "versions")
+
+
+
+def _check_state_dir(path):
+    """Create path (0700) and refuse it if another user owns it or others can write to it."""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    if not hasattr(os, "getuid"):  # Windows dev machines: no POSIX ownership
+        return
+    st = os.stat(path)
+    if st.st_uid != os.getuid():
+        raise RuntimeError(f"State dir {path} is owned by uid {st.st_uid}, not {os.getuid()}; "
+                           "set PORTAL_STATE_DIR to a private directory")
+    if st.st_mode & 0o022:
+        raise RuntimeError(f"State dir {path} is writable by group/others (mode {oct(st.st_mode & 0o777)}); "
+                           "chmod it 0700 or set PORTAL_STATE_DIR")
+
+
+_check_state_dir(STATE_DIR)
+for _d in (LOCK_DIR, VERSION_DIR):
+    try:
+        os.makedirs(_d, mode=0o700, exist_ok=True)
+    except Exception as e:
+        print(f"⚠️ Could not create state dir {_d}: {e}")
+
+if fcntl is None:
+    print("⚠️ fcntl unavailable - cross-process locks degrade to in-process locks")
+
+
+def _safe_name(name):
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", str(name))
+
+
+# -------------------------------------------------------------------
+# Cross-process locks
+# -------------------------------------------------------------------
+class InterProcessLock:
+    """
+    Re-entrant lock that serialises threads in this worker (RLock) and
+    other workers on the host (flock on a lock file). The lock file is opened
+    per acquisition so the descriptor is never shared across a fork.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.path = os.path.join(LOCK_DIR, f"{_safe_name(name)}.lock")
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+        self._fd = None
+
+    def acquire(self, blocking=True, timeout=-1):
+        if not self._thread_lock.acquire(blocking, timeout):
+            return False
+        if self._depth == 0:
+            try:
+                if not self._lock_file(blocking, timeout):
+                    self._thread_lock.release()
+                    return False
+            except Exception:
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return True
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            self._unlock_file()
+        self._thread_lock.release()
+
+    def _lock_file(self, blocking, timeout):
+        if fcntl is None:
+            return True
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        deadline = None if (not blocking or timeout is None or timeout < 0) else time.time() + timeout
+        while True:
+            try:
+                if blocking and deadline is None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._fd = fd
+                return True
+            except BlockingIOError:
+                if not blocking or time.time() >= deadline:
+                    os.close(fd)
+                    return False
+                time.sleep(0.01)
+
+    def _unlock_file(self):
+        fd, self._fd = self._fd, None
+        if fd is None:
+            return
+        try:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+_process_locks = {}
+_process_locks_registry = threading.Lock()
+
+
+def get_process_lock(name):
+    """Get or create the cross-process lock for `name` (one object per worker)."""
+    with _process_locks_registry:
+        lock = _process_locks.get(name)
+        if lock is None:
+            lock = InterProcessLock(name)
+            _process_locks[name] = lock
+        return lock
+
+
+# -------------------------------------------------------------------
+# Invalidation bus (per-key version counters)
+# -------------------------------------------------------------------
+_version_cache = {}  # name -> (stat signature, version)
+
+
+def _version_path(name):
+    return os.path.join(VERSION_DIR, f"{_safe_name(name)}.ver")
+
+
+def _read_version_file(path):
+    try:
+        with open(path, "r") as f:
+            return int((f.read() or "0").strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def current_version(name):
+    """
+    Current data version for `name`. Costs a single stat() unless another
+    worker bumped it since the last call.
+    """
+    if not name:
+        return 0
+    path = _version_path(name)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return 0
+    except Exception:
+        return _version_cache.get(name, (None, 0))[1]
+
+    sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+    cached = _version_cache.get(name)
+    if cached and cached[0] == sig:
+        return cached[1]
+    try:
+        version = _read_version_file(path)
+    except Exception:
+        return cached[1] if cached else 0
+    _version_cache[name] = (sig, version)
+    return version
+
+
+def bump_version(name):
+    """Mark `name` as changed for every worker; returns the new version."""
+    if not name:
+        return 0
+    path = _version_path(name)
+    try:
+        with get_process_lock(f"version_{name}"):
+            version = _read_version_file(path) + 1
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                f.write(str(version))
+            os.replace(tmp_path, path)
+        return version
+    except Exception as e:
+        print(f"⚠️ bump_version({name}) failed: {e}")
+        return 0
@@ -0,0 +1,329 @@
+# drive_gateway.py - One choke point for every Google Drive API call
+#
+# Each Drive helper used to run its own retry loop with time.sleep() in the
+# request thread, so during an outage or quota throttling every request
+# stalled for seconds and they piled up. Calls now go through here:
+#   * a token bucket shared by all threads of the worker keeps us under the
+#     Drive quota; it halves its rate on 429 / 403 rateLimitExceeded and
+#     creeps back up on success (Retry-After pauses the whole bucket)
+#   * a circuit breaker opens after consecutive transport / 5xx / throttling
+#     failures and makes callers fail fast with DriveUnavailable (the data
+#     layer then serves local snapshots); after a cooldown one probe call is
+#     let through. An open breaker is published in the shared state dir so
+#     the other workers on the host stop hammering Drive as well
+#   * drive_backoff() gives the remaining retry loops jittered exponential
+#     delays that honour Retry-After, and tells them to stop when the
+#     breaker is open
+
+import json
+import os
+import random
+import threading
+import time
+
+from googleapiclient.errors import HttpError
+
+from coordination import STATE_DIR
+
+DRIVE_RATE_LIMIT = float(os.environ.get("DRIVE_RATE_LIMIT", "8"))         # calls/second per worker
+DRIVE_RATE_BURST = float(os.environ.get("DRIVE_RATE_BURST", "20"))
+DRIVE_RATE_MIN = 0.5                                                       # floor while throttled
+DRIVE_MAX_QUEUE_WAIT = float(os.environ.get("DRIVE_MAX_QUEUE_WAIT", "5"))  # longest wait for a token
+DRIVE_BREAKER_THRESHOLD = int(os.environ.get("DRIVE_BREAKER_THRESHOLD", "5"))
+DRIVE_BREAKER_COOLDOWN = float(os.environ.get("DRIVE_BREAKER_COOLDOWN", "30"))
+DRIVE_BREAKER_MAX_COOLDOWN = 300
+DRIVE_BACKOFF_BASE = 0.5
+DRIVE_BACKOFF_CAP = 8.0
+BREAKER_STATE_PATH = os.path.join(STATE_DIR, "drive_breaker.json")
+
+_RATE_LIMIT_REASONS = ("rateLimitExceeded", "userRateLimitExceeded", "quotaExceeded")
+
+
+class DriveUnavailable(RuntimeError):
+    """Raised instead of calling Drive while the breaker is open or the rate limiter is saturated."""
+
+
+# -------------------------------------------------------------------
+# Error classification
+# -------------------------------------------------------------------
+def _status(exc):
+    return getattr(getattr(exc, "resp", None), "status", None) if isinstance(exc, HttpError) else None
+
+
+def is_rate_limited(exc) -> bool:
+    """429, or the 403 Drive uses for per-user / per-project rate limits."""
+    status = _status(exc)
+    if status == 429:
+        return True
+    if status != 403:
+        return False
+    content = getattr(exc, "content", b"") or b""
+    text = f"{exc} {content.decode('utf-8', 'replace') if isinstance(content, bytes) else content}"
+    return any(reason in text for reason in _RATE_LIMIT_REASONS)
+
+
+def is_transient(exc) -> bool:
+    """Worth retrying: throttling, 5xx/408 and transport errors (SSL, timeouts, resets)."""
+    if isinstance(exc, DriveUnavailable):
+        return False
+    if not isinstance(exc, HttpError):
+        return True
+    status = _status(exc)
+    return status in (408, 500, 502, 503, 504) or is_rate_limited(exc)
+
+
+def retry_after(exc) -> float | None:
+    """Seconds from a Retry-After header, if Drive sent one."""
+    resp = getattr(exc, "resp", None)
+    try:
+        value = resp.get("retry-after") if resp is not None else None
+        return max(0.0, float(value)) if value is not None else None
+    except (TypeError, ValueError, AttributeError):
+        return None
+
+
+# -------------------------------------------------------------------
+# Adaptive token bucket
+# -------------------------------------------------------------------
+class _TokenBucket:
+    def __init__(self, rate, burst):
+        self.max_rate = rate
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.throttled = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, cost=1.0, max_wait=DRIVE_MAX_QUEUE_WAIT):
+        """Take cost tokens, sleeping up to max_wait for them; False if that is not enough."""
+        cost = min(float(cost), self.burst)
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self.paused_until - now)
+            shortfall = cost - (self.tokens + wait * self.rate)
+            if shortfall > 0:
+                wait += shortfall / self.rate
+            if wait > max_wait:
+                return False
+            # Reserve now (tokens may go negative) so concurrent callers queue behind us
+            self.tokens -= cost
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+    def throttle(self, pause=None):
+        """Drive said slow down: halve the rate and honour Retry-After."""
+        with self._lock:
+            self.rate = max(DRIVE_RATE_MIN, self.rate / 2)
+            self.throttled += 1
+            if pause:
+                self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+    def relax(self):
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+
+# -------------------------------------------------------------------
+# Circuit breaker (per worker, open state shared through the state dir)
+# -------------------------------------------------------------------
+class _CircuitBreaker:
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.base_cooldown = cooldown
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.trips = 0
+        self.rejected = 0
+        self.last_error = None
+        self._shared = (None, 0.0)  # (stat signature, open_until)
+        self._lock = threading.Lock()
+
+    def _shared_open_until(self):
+        try:
+            st = os.stat(BREAKER_STATE_PATH)
+        except OSError:
+            return 0.0
+        sig = (st.st_ino, st.st_mtime_ns, st.st_size)
+        if self._shared[0] != sig:
+            try:
+                with open(BREAKER_STATE_PATH, "r") as f:
+                    self._shared = (sig, float(json.load(f).get("open_until", 0)))
+            except Exception:
+                return 0.0
+        return self._shared[1]
+
+    def _publish(self, open_until):
+        tmp_path = f"{BREAKER_STATE_PATH}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"open_until": open_until, "pid": os.getpid()}, f)
+            os.replace(tmp_path, BREAKER_STATE_PATH)
+        except Exception as e:
+            print(f"⚠️ Could not publish Drive breaker state: {e}")
+
+    def allow(self):
+        """True if a call may go out now (claims the probe slot when half-open)."""
+        with self._lock:
+            now = time.time()
+            if self.state == "closed":
+                if self._shared_open_until() > now:
+                    self.rejected += 1
+                    return False
+                return True
+            if now - self.opened_at < self.cooldown or self.probing:
+                self.rejected += 1
+                return False
+            self.state = "half_open"
+            self.probing = True
+            return True
+
+    def available(self):
+        with self._lock:
+            now = time.time()
+            if self.state == "closed":
+                return self._shared_open_until() <= now
+            return not self.probing and now - self.opened_at >= self.cooldown
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != "closed":
+                print("✅ Drive circuit closed - Drive is answering again")
+                self.state = "closed"
+                self.cooldown = self.base_cooldown
+                self.probing = False
+                self._publish(0)
+
+    def failure(self, exc):
+        with self._lock:
+            self.failures += 1
+            self.last_error = f"{type(exc).__name__}: {exc}"[:300]
+            if self.state == "half_open":
+                self.cooldown = min(DRIVE_BREAKER_MAX_COOLDOWN, self.cooldown * 2)
+            elif self.failures < self.threshold:
+                return
+            self.state = "open"
+            self.opened_at = time.time()
+            self.probing = False
+            self.trips += 1
+            self._publish(self.opened_at + self.cooldown)
+            print(f"🚫 Drive circuit OPEN for {int(self.cooldown)}s after {self.failures} failures: {self.last_error}")
+
+    def release_probe(self):
+        """Probe ended without telling us anything about Drive's health."""
+        with self._lock:
+            self.probing = False
+
+
+_bucket = _TokenBucket(DRIVE_RATE_LIMIT, DRIVE_RATE_BURST)
+_breaker = _CircuitBreaker(DRIVE_BREAKER_THRESHOLD, DRIVE_BREAKER_COOLDOWN)
+_stats = {"calls": 0, "failures": 0, "rate_limited": 0, "rejected_rate": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+# -------------------------------------------------------------------
+# Public API
+# -------------------------------------------------------------------
+def drive_call(fn, *args, cost=1, **kwargs):
+    """
+    Run fn(*args, **kwargs) - something that talks to Drive - under the rate
+    limiter and circuit breaker. Raises DriveUnavailable without calling fn
+    when Drive is known to be down or the limiter can't serve us in time.
+    """
+    if not _breaker.allow():
+        raise DriveUnavailable(f"Drive circuit open ({_breaker.last_error})")
+    if not _bucket.acquire(cost):
+        _breaker.release_probe()
+        _count("rejected_rate")
+        raise DriveUnavailable("Drive rate limit queue is full")
+
+    _count("calls")
+    try:
+        result = fn(*args, **kwargs)
+    except Exception as e:
+        if is_rate_limited(e):
+            drive_throttled(e)
+        if is_transient(e):
+            _count("failures")
+            _breaker.failure(e)
+        else:
+            # 404/400/permission errors: Drive is healthy, the request isn't
+            _breaker.success()
+        raise
+    _breaker.success()
+    _bucket.relax()
+    return result
+
+
+def drive_execute(request, cost=1):
+    """request.execute() through the gateway."""
+    return drive_call(request.execute, cost=cost)
+
+
+def drive_throttled(error=None):
+    """Report throttling seen outside drive_call (e.g. one call inside a batch)."""
+    _count("rate_limited")
+    _bucket.throttle(retry_after(error) if error is not None else None)
+
+
+def drive_available() -> bool:
+    """False while the breaker is open (callers should go straight to local data)."""
+    return _breaker.available()
+
+
+def backoff_delay(attempt, error=None) -> float:
+    """Full-jitter exponential delay for retry number `attempt` (1-based), >= Retry-After."""
+    delay = random.uniform(0, min(DRIVE_BACKOFF_CAP, DRIVE_BACKOFF_BASE * (2 ** max(0, attempt))))
+    hinted = retry_after(error) if error is not None else None
+    if hinted is not None:
+        delay = max(delay, min(hinted, DRIVE_BACKOFF_CAP))
+    return delay
+
+
+def drive_backoff(attempt, error=None) -> bool:
+    """
+    Sleep before retrying a failed Drive call. Returns False (without
+    sleeping) when a retry is pointless: the breaker is open or the error
+    is not transient.
+    """
+    if error is not None and not is_transient(error):
+        return False
+    if not drive_available():
+        return False
+    time.sleep(backoff_delay(attempt, error))
+    return True
+
+
+def get_gateway_stats():
+    """Snapshot for debug endpoints"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats.update({
+        "breaker_state": _breaker.state,
+        "breaker_failures": _breaker.failures,
+        "breaker_trips": _breaker.trips,
+        "breaker_rejected": _breaker.rejected,
+        "breaker_cooldown": _breaker.cooldown,
+        "last_error": _breaker.last_error,
+        "rate": round(_bucket.rate, 2),
+        "max_rate": _bucket.max_rate,
+        "throttled": _bucket.throttled,
+    })
+    return stats
@@ -1,7 +1,8 @@
 # drive_utils.py
-import os, time
-from threading import RLock
-from google_drive_service import create_drive_service, save_csv_to_drive
+import os
+from google_drive_service import get_drive_service, save_csv_to_drive, update_csv_on_drive
+from coordination import get_process_lock
+from drive_gateway import drive_available, drive_backoff
 
 CSV_ENV_MAP = {
     'users': 'USERS_FILE_ID',
@@ -14,14 +15,9 @@ CSV_ENV_MAP = {
     'sessions': 'SESSIONS_FILE_ID'
 }
 
-_lock = RLock()
-_drive_service = None
-
 def _get_drive_service():
-    global _drive_service
-    if _drive_service is None:
-        _drive_service = create_drive_service()
-    return _drive_service
+    # Pooled per-thread client (a single shared googleapiclient object is not thread-safe)
+    return get_drive_service()
 
 def safe_csv_save_with_retry(df, csv_type, max_retries=5):
     file_env = CSV_ENV_MAP.get(csv_type)
@@ -31,19 +27,42 @@ def safe_csv_save_with_retry(df, csv_type, max_retries=5):
         return False
     service = _get_drive_service()
     for attempt in range(max_retries):
+        if not drive_available():
+            print(f"[drive_utils] Drive circuit open - not saving {csv_type}")
+            return False
         try:
             ok = save_csv_to_drive(service, df, file_id)
             if ok:
                 return True
         except Exception as e:
             print(f"[drive_utils] attempt {attempt+1} error saving {csv_type}: {e}")
-        if attempt < max_retries - 1:
-            time.sleep((2 ** attempt) * 0.5)
+        if attempt < max_retries - 1 and not drive_backoff(attempt + 1):
+            break
     print(f"[drive_utils] FAILED to save {csv_type} after {max_retries} attempts")
     return False
 
+def safe_csv_update(csv_type, mutate):
+    """
+    Compare-and-swap read-modify-write: mutate(df) -> new df (None = no change) is
+    re-applied to a fresh copy if another writer saved in between. Returns (ok, info).
+    """
+    file_env = CSV_ENV_MAP.get(csv_type)
+    file_id = os.environ.get(file_env) if file_env else None
+    if not file_id:
+        print(f"[drive_utils] No file id configured for '{csv_type}' (env {file_env})")
+        return False, "no_file_id"
+    service = _get_drive_service()
+    if not service:
+        return False, "no_drive"
+    try:
+        return update_csv_on_drive(service, file_id, mutate)
+    except Exception as e:
+        print(f"[drive_utils] CAS update of {csv_type} failed: {e}")
+        return False, str(e)
+
 def safe_dual_file_save(results_df, responses_df, results_type='results', responses_type='responses', max_retries=5):
-    with _lock:
+    # Same per-csv_type locks main.get_file_lock() hands out, shared across workers
+    with get_process_lock(f"csv_{results_type}"), get_process_lock(f"csv_{responses_type}"):
         ok1 = safe_csv_save_with_retry(results_df, results_type, max_retries)
         if not ok1:
             return False, "Failed to save results"
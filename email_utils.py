@@ -7,7 +7,6 @@ import os
 import string
 import secrets
 from datetime import datetime
-from mailjet_rest import Client
 from dotenv import load_dotenv
 
 # Ensure environment variables are loaded
@@ -77,7 +76,8 @@ def send_credentials_email(email, full_name, username, password):
         # Get reset password URL from environment variable
         reset_url = EMAIL_CONFIG['RESET_PASSWORD_URL']
             
-        # Use Mailjet API
+        # Use Mailjet API (imported on first send - it pulls in requests)
+        from mailjet_rest import Client
         mailjet = Client(auth=(EMAIL_CONFIG['API_KEY'], EMAIL_CONFIG['API_SECRET']), version='v3.1')
         
         # Create HTML content
@@ -0,0 +1,193 @@
+# exam_admission.py - Admission control for exam start / preload bursts
+#
+# When an exam goes live every candidate hits /preload-exam and /start-exam at
+# the same moment. This module bounds how many of those heavy requests run at
+# once (the rest get a queue position to poll with) and coalesces the new
+# attempt rows produced by start_exam into a single exam_attempts write per
+# flush window instead of one full-file upload per candidate.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MAX_CONCURRENT_STARTS = max(1, int(os.environ.get("EXAM_START_MAX_CONCURRENT", "8")))
+QUEUE_ENTRY_TTL = int(os.environ.get("EXAM_START_QUEUE_TTL", "30"))        # seconds a waiter may go without polling
+ADMISSION_PASS_TTL = int(os.environ.get("EXAM_ADMISSION_PASS_TTL", "120"))  # preload admission carries over to start
+SLOT_MAX_HOLD = 120                                                         # reclaim slots from crashed requests
+ATTEMPT_FLUSH_INTERVAL_MS = int(os.environ.get("ATTEMPT_FLUSH_INTERVAL_MS", "250"))
+ATTEMPT_WRITE_TIMEOUT = 45
+
+_admission_lock = threading.RLock()
+_active_slots = {}           # key -> admitted_at
+_waiting = OrderedDict()     # key -> last_poll (FIFO order)
+_passes = {}                 # key -> granted_at
+_avg_hold_seconds = 2.0
+
+
+# -------------------------------------------------------------------
+# Admission slots
+# -------------------------------------------------------------------
+def _expire_stale_entries(now):
+    for key, last_poll in list(_waiting.items()):
+        if now - last_poll > QUEUE_ENTRY_TTL:
+            _waiting.pop(key, None)
+    for key, admitted_at in list(_active_slots.items()):
+        if now - admitted_at > SLOT_MAX_HOLD:
+            print(f"⚠️ Reclaiming stale admission slot {key}")
+            _active_slots.pop(key, None)
+    for key, granted_at in list(_passes.items()):
+        if now - granted_at > ADMISSION_PASS_TTL:
+            _passes.pop(key, None)
+
+
+def acquire_slot(key, honour_pass=False):
+    """
+    Try to admit `key` (e.g. "user:exam"). Returns (admitted, queue_position).
+    Waiters keep their FIFO position as long as they poll within QUEUE_ENTRY_TTL.
+    """
+    now = time.time()
+    with _admission_lock:
+        _expire_stale_entries(now)
+
+        if key in _active_slots:
+            return True, 0
+
+        if honour_pass and key in _passes:
+            _passes.pop(key, None)
+            _waiting.pop(key, None)
+            _active_slots[key] = now
+            return True, 0
+
+        free = MAX_CONCURRENT_STARTS - len(_active_slots)
+        if free > 0:
+            waiting_keys = list(_waiting.keys())
+            ahead = waiting_keys.index(key) if key in _waiting else len(waiting_keys)
+            if ahead < free:
+                _waiting.pop(key, None)
+                _active_slots[key] = now
+                return True, 0
+
+        # Assigning to an existing key keeps its position in the OrderedDict
+        _waiting[key] = now
+        return False, list(_waiting.keys()).index(key) + 1
+
+
+def release_slot(key, grant_pass=False):
+    """Release an admission slot; optionally let the same key skip the queue once."""
+    global _avg_hold_seconds
+    now = time.time()
+    with _admission_lock:
+        admitted_at = _active_slots.pop(key, None)
+        if admitted_at is not None:
+            held = now - admitted_at
+            _avg_hold_seconds = (_avg_hold_seconds * 0.8) + (held * 0.2)
+        if grant_pass:
+            _passes[key] = now
+
+
+def queued_response_payload(position):
+    """JSON body for a request that has to wait for an admission slot."""
+    with _admission_lock:
+        rounds = (position + MAX_CONCURRENT_STARTS - 1) // MAX_CONCURRENT_STARTS
+        retry_after_ms = int(min(5000, max(500, _avg_hold_seconds * rounds * 1000)))
+    return {
+        "success": False,
+        "queued": True,
+        "queue_position": position,
+        "retry_after_ms": retry_after_ms,
+        "message": f"High demand right now - you are #{position} in the queue. Your exam will start automatically.",
+        "error_type": "queued"
+    }
+
+
+def get_admission_stats():
+    """Snapshot for debug endpoints"""
+    with _admission_lock:
+        return {
+            "max_concurrent": MAX_CONCURRENT_STARTS,
+            "active": len(_active_slots),
+            "waiting": len(_waiting),
+            "passes": len(_passes),
+            "avg_hold_seconds": round(_avg_hold_seconds, 3),
+            "pending_attempt_rows": len(_pending_attempts)
+        }
+
+
+# -------------------------------------------------------------------
+# Batched attempt writes
+# -------------------------------------------------------------------
+_pending_attempts = []
+_pending_cond = threading.Condition()
+_flusher_thread = None
+_attempt_batch_writer = None
+
+
+def configure_attempt_writer(writer):
+    """
+    Register the function that persists a batch of new attempt rows.
+    writer(rows) must return one (ok, info, row) tuple per input row, in order.
+    """
+    global _attempt_batch_writer
+    _attempt_batch_writer = writer
+
+
+def _ensure_flusher():
+    global _flusher_thread
+    if _flusher_thread is None or not _flusher_thread.is_alive():
+        _flusher_thread = threading.Thread(target=_flush_loop, name="attempt-batch-flusher", daemon=True)
+        _flusher_thread.start()
+
+
+def _flush_loop():
+    while True:
+        with _pending_cond:
+            while not _pending_attempts:
+                _pending_cond.wait()
+
+        # Let the rest of the burst arrive before writing
+        time.sleep(ATTEMPT_FLUSH_INTERVAL_MS / 1000.0)
+        flush_pending_attempts()
+
+
+def flush_pending_attempts():
+    """Write every queued attempt row with one writer call and wake the waiters."""
+    with _pending_cond:
+        batch = list(_pending_attempts)
+        _pending_attempts.clear()
+    if not batch:
+        return 0
+
+    rows = [ticket["row"] for ticket in batch]
+    try:
+        if _attempt_batch_writer is None:
+            raise RuntimeError("attempt writer not configured")
+        results = _attempt_batch_writer(rows)
+        if not results or len(results) != len(batch):
+            raise RuntimeError("attempt writer returned mismatched results")
+    except Exception as e:
+        print(f"❌ Attempt batch write failed ({len(batch)} rows): {e}")
+        results = [(False, str(e), row) for row in rows]
+
+    for ticket, result in zip(batch, results):
+        ticket["result"] = result
+        ticket["event"].set()
+
+    print(f"💾 Flushed {len(batch)} attempt row(s) in one write")
+    return len(batch)
+
+
+def submit_attempt(row, timeout=ATTEMPT_WRITE_TIMEOUT):
+    """
+    Queue a new attempt row for the next batched write and block until it is persisted.
+    Returns (ok, info, row) where row carries the final id / attempt_number.
+    """
+    ticket = {"row": dict(row), "event": threading.Event(), "result": None}
+    with _pending_cond:
+        _pending_attempts.append(ticket)
+        _ensure_flusher()
+        _pending_cond.notify()
+
+    if not ticket["event"].wait(timeout):
+        return False, "attempt write timed out", ticket["row"]
+    return ticket["result"]
@@ -0,0 +1,263 @@
+# exam_warmup.py - Compile exams ahead of their start window
+#
+# preload_exam_data_fixed used to do all the work for whichever candidate
+# opened an exam first: questions download, image URL resolution and answer
+# key parsing. The compiled exam now lives in a host-wide cache (memory + a
+# JSON file in the shared state dir) keyed by exam id and the data versions of
+# the tables it was built from, and a scheduled job compiles exams that
+# are about to go live - plus the tables every candidate touches at start
+# (users, exam_attempts) - so the first click is served from that cache.
+
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from coordination import STATE_DIR, get_process_lock
+
+WARMUP_LEAD_MINUTES = int(os.environ.get("EXAM_WARMUP_LEAD_MINUTES", "30"))   # compile this long before start
+WARMUP_GRACE_MINUTES = int(os.environ.get("EXAM_WARMUP_GRACE_MINUTES", "180"))  # ...and keep warm after start
+WARMUP_INTERVAL = int(os.environ.get("EXAM_WARMUP_INTERVAL", "60"))
+FAILED_IMAGE_RETRY = 300  # recompile packages with unresolved images after this many seconds
+COMPILED_DIR = os.path.join(STATE_DIR, "compiled_exams")
+LIVE_STATUSES = ("upcoming", "ongoing")
+
+try:
+    os.makedirs(COMPILED_DIR, exist_ok=True)
+except Exception as e:
+    print(f"⚠️ Could not create compiled exam dir {COMPILED_DIR}: {e}")
+
+_lock = threading.RLock()
+_compiled = {}            # exam_id -> package
+_compile_locks = {}       # exam_id -> Lock (one compile per exam at a time in this worker)
+_compiler = None          # exam_id -> (ok, package | message)
+_exams_loader = None      # () -> exams DataFrame
+_version_fn = None        # () -> tuple of data versions the package depends on
+_related_warmers = []     # callables warming shared tables
+_last_cycle = {}
+
+
+def configure(compiler, exams_loader, version_fn, related_warmers=()):
+    """Register how to compile one exam, list exams and read the source data versions."""
+    global _compiler, _exams_loader, _version_fn, _related_warmers
+    _compiler = compiler
+    _exams_loader = exams_loader
+    _version_fn = version_fn
+    _related_warmers = list(related_warmers)
+
+
+def _key(exam_id):
+    try:
+        return str(int(float(str(exam_id).strip())))
+    except (ValueError, TypeError):
+        return str(exam_id).strip()
+
+
+def _current_versions():
+    try:
+        return tuple(_version_fn()) if _version_fn else ()
+    except Exception:
+        return None
+
+
+def _disk_path(exam_id, ext=".json"):
+    return os.path.join(COMPILED_DIR, f"exam_{_key(exam_id)}{ext}")
+
+
+def _json_default(value):
+    if hasattr(value, "item"):        # numpy scalars from DataFrame rows
+        return value.item()
+    if hasattr(value, "isoformat"):   # Timestamps
+        return value.isoformat()
+    return str(value)
+
+
+# -------------------------------------------------------------------
+# Compiled exam cache
+# -------------------------------------------------------------------
+def _is_current(package, versions):
+    if not package or package.get("versions") != versions:
+        return False
+    # Images that failed to resolve (Drive hiccup) get another chance
+    if package.get("failed_images") and time.time() - package.get("compiled_at", 0) > FAILED_IMAGE_RETRY:
+        return False
+    return True
+
+
+def get_compiled_exam(exam_id):
+    """Compiled package for exam_id if one exists for the current data versions, else None."""
+    versions = _current_versions()
+    if versions is None:
+        return None
+    key = _key(exam_id)
+    with _lock:
+        package = _compiled.get(key)
+    if _is_current(package, versions):
+        return package
+
+    # Compiled by another worker (or before a restart)?
+    try:
+        with open(_disk_path(key), "r", encoding="utf-8") as f:
+            package = json.load(f)
+        package["versions"] = tuple(package.get("versions") or ())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Unreadable compiled exam {key}: {e}")
+        return None
+    if not _is_current(package, versions):
+        return None
+    with _lock:
+        _compiled[key] = package
+    return package
+
+
+def _store_compiled(exam_id, package):
+    key = _key(exam_id)
+    with _lock:
+        _compiled[key] = package
+    path = _disk_path(key)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(package, f, default=_json_default)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"⚠️ Could not persist compiled exam {key}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+def compile_exam(exam_id, force=False):
+    """
+    Return (ok, package | message), compiling at most once per data version.
+    Concurrent callers for the same exam wait for the first compile.
+    """
+    key = _key(exam_id)
+    if not force:
+        package = get_compiled_exam(key)
+        if package:
+            return True, package
+
+    with _lock:
+        compile_lock = _compile_locks.setdefault(key, threading.Lock())
+    with compile_lock:
+        if not force:
+            package = get_compiled_exam(key)
+            if package:
+                return True, package
+        if _compiler is None:
+            return False, "Exam compiler not configured"
+
+        versions = _current_versions()
+        started = time.time()
+        ok, result = _compiler(exam_id)
+        if not ok:
+            return False, result
+        result["versions"] = versions
+        result["compiled_at"] = time.time()
+        result["compile_seconds"] = round(time.time() - started, 3)
+        _store_compiled(key, result)
+        print(f"🔧 Compiled exam {key}: {len(result.get('questions', []))} questions in {result['compile_seconds']}s")
+        return True, result
+
+
+def invalidate(exam_id=None):
+    """Drop compiled exams (all of them when exam_id is None)."""
+    with _lock:
+        keys = list(_compiled) if exam_id is None else [_key(exam_id)]
+        for key in keys:
+            _compiled.pop(key, None)
+    if exam_id is None:
+        keys = [os.path.splitext(n)[0][5:] for n in os.listdir(COMPILED_DIR)
+                if n.startswith("exam_") and n.endswith((".json", ".pkl"))]
+    for key in keys:
+        for ext in (".json", ".pkl"):  # .pkl: left by older versions
+            try:
+                os.remove(_disk_path(key, ext))
+            except OSError:
+                pass
+
+
+# -------------------------------------------------------------------
+# Upcoming exam detection + warm-up loop
+# -------------------------------------------------------------------
+def upcoming_exam_ids(exams_df, now=None):
+    """Ids of live exams starting within the lead window (or started within the grace window)."""
+    if exams_df is None or exams_df.empty or "id" not in exams_df.columns:
+        return []
+    now = now or pd.Timestamp.now()
+    window_start = now - pd.Timedelta(minutes=WARMUP_GRACE_MINUTES)
+    window_end = now + pd.Timedelta(minutes=WARMUP_LEAD_MINUTES)
+
+    df = exams_df
+    if "status" in df.columns:
+        status = df["status"].astype(str).str.strip().str.lower()
+        df = df[status.isin(LIVE_STATUSES)]
+    if df.empty:
+        return []
+
+    dates = df["date"].astype(str).str.strip() if "date" in df.columns else pd.Series("", index=df.index)
+    times = df["start_time"].astype(str).str.strip() if "start_time" in df.columns else pd.Series("", index=df.index)
+    starts = pd.to_datetime(dates + " " + times, errors="coerce", format="mixed")
+    # No usable schedule: an 'ongoing' exam is live right now
+    ongoing = df["status"].astype(str).str.strip().str.lower().eq("ongoing") if "status" in df.columns else False
+    due = ((starts >= window_start) & (starts <= window_end)) | (starts.isna() & ongoing)
+    return [_key(v) for v in df.loc[due, "id"].tolist()]
+
+
+def run_warmup_cycle():
+    """
+    One warm-up pass. Only one worker on the host runs it at a time; the
+    compiled exams land on disk where the other workers pick them up.
+    """
+    lock = get_process_lock("exam_warmup")
+    if not lock.acquire(blocking=False):
+        return None
+    try:
+        started = time.time()
+        exams_df = _exams_loader() if _exams_loader else None
+        exam_ids = upcoming_exam_ids(exams_df)
+        compiled = 0
+        for exam_id in exam_ids:
+            try:
+                fresh = get_compiled_exam(exam_id) is None
+                ok, info = compile_exam(exam_id)
+                if ok and fresh:
+                    compiled += 1
+                elif not ok:
+                    print(f"⚠️ Warm-up could not compile exam {exam_id}: {info}")
+            except Exception as e:
+                print(f"⚠️ Warm-up error for exam {exam_id}: {e}")
+
+        if exam_ids:
+            for warmer in _related_warmers:
+                try:
+                    warmer()
+                except Exception as e:
+                    print(f"⚠️ Warm-up of related data failed ({getattr(warmer, '__name__', warmer)}): {e}")
+
+        _last_cycle.update({
+            "at": time.time(),
+            "upcoming": exam_ids,
+            "compiled": compiled,
+            "seconds": round(time.time() - started, 3)
+        })
+        if compiled:
+            print(f"🔥 Warmed {compiled} upcoming exam(s): {exam_ids}")
+        return exam_ids
+    finally:
+        lock.release()
+
+
+def get_warmup_stats():
+    """Snapshot for debug endpoints"""
+    with _lock:
+        compiled = {k: {"questions": len(v.get("questions", [])), "compiled_at": v.get("compiled_at")}
+                    for k, v in _compiled.items()}
+    return {"last_cycle": dict(_last_cycle), "compiled": compiled,
+            "lead_minutes": WARMUP_LEAD_MINUTES, "interval": WARMUP_INTERVAL}
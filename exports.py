@@ -0,0 +1,253 @@
+# exports.py - Streaming CSV / XLSX exports of results, responses and attempts
+#
+# The analytics pages had no bulk export, and building one on the page
+# helpers would merge users and exams into a full copy of each table (for
+# responses, hundreds of thousands of rows) before writing anything. Here the
+# filters (same ones as users_analytics_results) are applied as boolean masks,
+# rows are pulled EXPORT_CHUNK_ROWS at a time from the hot and cold partitions
+# in place, and usernames / exam names come from small id lookups. CSV goes
+# out through a generator as it is produced; XLSX is written row by row with
+# openpyxl's write-only workbook (rows spill to a temp file, not memory) and
+# the finished file is streamed in blocks and deleted.
+
+import csv
+import io
+import os
+import re
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+except ImportError:  # optional: CSV exports only
+    Workbook = None
+
+from coordination import STATE_DIR
+from schemas import id_in_mask, id_mask
+
+EXPORT_CHUNK_ROWS = 2000
+EXPORT_FILE_BLOCK = 64 * 1024
+XLSX_MAX_ROWS = 1048576          # Excel's sheet limit (header included); further rows continue on a new sheet
+EXPORT_TMP_DIR = os.path.join(STATE_DIR, "exports")
+
+EXPORT_COLUMNS = {
+    "results": [
+        "id", "student_id", "username", "full_name", "exam_id", "exam_name",
+        "score", "max_score", "percentage", "grade", "correct_answers",
+        "incorrect_answers", "unanswered_questions", "time_taken_minutes", "completed_at",
+    ],
+    "responses": [
+        "id", "result_id", "student_id", "username", "exam_id", "exam_name",
+        "question_id", "question_type", "given_answer", "correct_answer",
+        "is_correct", "is_attempted", "marks_obtained", "completed_at",
+    ],
+    "attempts": [
+        "id", "student_id", "username", "exam_id", "exam_name",
+        "attempt_number", "status", "start_time", "end_time",
+    ],
+}
+DATE_COLUMNS = {"results": "completed_at", "attempts": "start_time"}
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+_PLAIN_NUMBER_RE = re.compile(r"^[+-]?\d+(\.\d+)?$")
+
+os.makedirs(EXPORT_TMP_DIR, exist_ok=True)
+
+
+def xlsx_available():
+    return Workbook is not None
+
+
+def export_filename(table, fmt):
+    return f"{table}_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"
+
+
+def _norm_id(value):
+    try:
+        return str(int(float(str(value).strip())))
+    except (ValueError, TypeError):
+        return str(value).strip()
+
+
+def _cell(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _lookup(df, *columns):
+    """id -> {column: value} for the small tables (users, exams)."""
+    if df is None or df.empty or "id" not in df.columns:
+        return {}
+    present = [c for c in columns if c in df.columns]
+    return {
+        _norm_id(row["id"]): {c: _cell(row[c]) for c in present}
+        for row in df[["id"] + present].to_dict("records")
+    }
+
+
+# -------------------------------------------------------------------
+# Filtering
+# -------------------------------------------------------------------
+def _date_mask(df, column, date_from, date_to):
+    mask = pd.Series(True, index=df.index)
+    if column not in df.columns or not (date_from or date_to):
+        return mask
+    stamps = pd.to_datetime(df[column], errors="coerce")
+    try:
+        if date_from:
+            mask &= stamps >= pd.Timestamp(date_from)
+        if date_to:
+            mask &= stamps < pd.Timestamp(date_to) + pd.Timedelta(days=1)
+    except ValueError:
+        pass  # unparseable filter date: ignored, like the analytics page does
+    return mask
+
+
+def _mask(df, table, filters, allowed_results=None):
+    mask = pd.Series(True, index=df.index)
+    if filters.get("exam") and "exam_id" in df.columns:
+        mask &= id_mask(df, "exam_id", filters["exam"])
+    if table == "responses":
+        if allowed_results is not None:
+            mask &= id_in_mask(df, "result_id", allowed_results)
+        return mask
+    if filters.get("user") and "student_id" in df.columns:
+        mask &= id_mask(df, "student_id", filters["user"])
+    return mask & _date_mask(df, DATE_COLUMNS[table], filters.get("date_from"), filters.get("date_to"))
+
+
+def _live_partitions(partitions):
+    """(frame, superseded mask) per non-empty partition; rows of earlier partitions
+    whose id reappears in a later one are dropped (the hot copy wins)."""
+    frames = [df for df in partitions if df is not None and not df.empty]
+    out = []
+    for i, df in enumerate(frames):
+        keep = pd.Series(True, index=df.index)
+        if "id" in df.columns:
+            for later in frames[i + 1:]:
+                if "id" in later.columns:
+                    keep &= ~id_in_mask(df, "id", later["id"].dropna().unique())
+        out.append((df, keep))
+    return out
+
+
+def _iter_records(partitions, table, filters, allowed_results=None):
+    for df, keep in _live_partitions(partitions):
+        positions = np.flatnonzero((keep & _mask(df, table, filters, allowed_results)).to_numpy())
+        for start in range(0, len(positions), EXPORT_CHUNK_ROWS):
+            yield from df.iloc[positions[start:start + EXPORT_CHUNK_ROWS]].to_dict("records")
+
+
+# -------------------------------------------------------------------
+# Rows
+# -------------------------------------------------------------------
+def export_rows(table, partitions, filters, users_df=None, exams_df=None, results_partitions=()):
+    """
+    Rows (lists in EXPORT_COLUMNS[table] order) of the filtered table.
+    filters: {"user", "exam", "date_from", "date_to"}; responses are filtered by
+    user / date through their result, so they need results_partitions.
+    """
+    users = _lookup(users_df, "username", "full_name")
+    exams = _lookup(exams_df, "name")
+    columns = EXPORT_COLUMNS[table]
+
+    result_info, allowed_results = {}, None
+    if table == "responses":
+        # result id -> (student id, completed_at), and the results the user / date filters keep
+        narrowed = bool(filters.get("user") or filters.get("date_from") or filters.get("date_to"))
+        allowed_results = set() if narrowed else None
+        for record in _iter_records(results_partitions, "results", {**filters, "exam": None}):
+            rid = _norm_id(record.get("id"))
+            result_info[rid] = (_norm_id(record.get("student_id")), _cell(record.get("completed_at")))
+            if narrowed:
+                allowed_results.add(rid)
+        allowed_results = sorted(allowed_results) if narrowed else None
+
+    for record in _iter_records(partitions, table, filters, allowed_results):
+        if table == "responses":
+            student_id, completed_at = result_info.get(_norm_id(record.get("result_id")), ("", ""))
+            record["student_id"] = student_id
+            record["completed_at"] = completed_at
+        user = users.get(_norm_id(record.get("student_id")), {})
+        record["username"] = user.get("username", "")
+        record["full_name"] = user.get("full_name", "")
+        record["exam_name"] = exams.get(_norm_id(record.get("exam_id")), {}).get("name", "")
+        yield [_cell(record.get(c)) for c in columns]
+
+
+# -------------------------------------------------------------------
+# Writers
+# -------------------------------------------------------------------
+def _neutralise(value):
+    """
+    Text that a spreadsheet would run as a formula (usernames, names and
+    answers are typed by students) gets a leading ' so it stays text.
+    Plain numbers such as "-3.5" are left alone.
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES) and not _PLAIN_NUMBER_RE.match(value):
+        return "'" + value
+    return value
+
+
+def iter_csv(rows, columns):
+    """CSV text of columns + rows, yielded every EXPORT_CHUNK_ROWS rows."""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for n, row in enumerate(rows, 1):
+        writer.writerow([_neutralise(v) for v in row])
+        if n % EXPORT_CHUNK_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate(0)
+    yield buf.getvalue()
+
+
+def _xlsx_value(value):
+    return _neutralise(ILLEGAL_CHARACTERS_RE.sub("", value)) if isinstance(value, str) else value
+
+
+def write_xlsx(rows, columns, title):
+    """Write columns + rows to a temp .xlsx with a write-only workbook; returns its path."""
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=".xlsx", dir=EXPORT_TMP_DIR)
+    os.close(fd)
+    try:
+        workbook = Workbook(write_only=True)
+        sheet, sheet_rows, sheets = None, XLSX_MAX_ROWS, 0
+        for row in rows:
+            if sheet_rows >= XLSX_MAX_ROWS:
+                sheets += 1
+                sheet = workbook.create_sheet(title if sheets == 1 else f"{title} ({sheets})")
+                sheet.append(columns)
+                sheet_rows = 1
+            sheet.append([_xlsx_value(v) for v in row])
+            sheet_rows += 1
+        if sheet is None:
+            workbook.create_sheet(title).append(columns)
+        workbook.save(path)
+        return path
+    except Exception:
+        os.remove(path)
+        raise
+
+
+def iter_file(path):
+    """Stream a file in EXPORT_FILE_BLOCK blocks and delete it afterwards."""
+    try:
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(EXPORT_FILE_BLOCK)
+                if not block:
+                    break
+                yield block
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
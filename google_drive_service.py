@@ -2,8 +2,12 @@
 import os
 import json
 import time
+import random
+import threading
+from concurrent.futures import Future
 from io import StringIO, BytesIO
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+import numpy as np
 import pandas as pd
 
 from googleapiclient.discovery import build
@@ -12,7 +16,14 @@ from googleapiclient.http import MediaIoBaseDownload, MediaIoBaseUpload
 from google.oauth2.service_account import Credentials
 from dotenv import load_dotenv
 from google.oauth2.credentials import Credentials as UserCredentials
+from google.auth.transport.requests import Request as AuthRequest
 from google_auth_oauthlib.flow import InstalledAppFlow  # <-- added
+from coordination import bump_version, current_version, get_process_lock
+from drive_gateway import (
+    DriveUnavailable, drive_backoff, drive_call, drive_execute, drive_throttled, is_rate_limited
+)
+from schemas import normalize, parse_dtypes, table_for_file_id
+from snapshots import SNAPSHOT_MAX_AGE, read_snapshot, read_snapshot_meta, write_snapshot
 load_dotenv()
 
 # -------------------------------------------------------------------
@@ -22,6 +33,9 @@ _file_cache = {}
 _folder_cache = {}
 _image_cache = {}
 _cache_timestamps = {}
+_cache_versions = {}  # csv::<id> -> coordination version the cached copy was loaded at
+_file_revisions = {}  # file_id -> Drive revision token of the copy last loaded/saved
+_meta_cache = {}      # meta::<id> -> files().get metadata prefetched in a batch
 
 def _is_cache_valid(key: str, ttl_seconds: int) -> bool:
     ts = _cache_timestamps.get(key)
@@ -35,7 +49,9 @@ def clear_cache():
     _file_cache.clear()
     _folder_cache.clear()
     _image_cache.clear()
+    _meta_cache.clear()
     _cache_timestamps.clear()
+    _cache_versions.clear()
     print("✅ Cleared all caches")
 
 # -------------------------------------------------------------------
@@ -107,6 +123,112 @@ def create_drive_service():
         return None
 
 
+# -------------------------------------------------------------------
+# Pooled clients: one authorized service per worker thread
+# -------------------------------------------------------------------
+CREDENTIAL_REFRESH_MARGIN = timedelta(minutes=5)
+
+_credentials_lock = threading.Lock()
+_sa_credentials = None
+_user_credentials = None
+_thread_clients = threading.local()
+
+
+def _service_account_credentials():
+    global _sa_credentials
+    if _sa_credentials is None:
+        with _credentials_lock:
+            if _sa_credentials is None:
+                info = _load_service_account_info()
+                if not info:
+                    return None
+                if "private_key" in info and "\\n" in info["private_key"]:
+                    info["private_key"] = info["private_key"].replace("\\n", "\n")
+                _sa_credentials = Credentials.from_service_account_info(info, scopes=_scopes())
+    return _sa_credentials
+
+
+def _authorized_user_credentials():
+    """Credentials from an already-authorized token.json (the interactive flow stays in create_drive_service_user)."""
+    global _user_credentials
+    if _user_credentials is None:
+        with _credentials_lock:
+            if _user_credentials is None:
+                token_path = os.getenv("GOOGLE_SERVICE_TOKEN_JSON", "token.json")
+                if not token_path or not os.path.exists(token_path):
+                    return None
+                try:
+                    with open(token_path, "r", encoding="utf-8") as f:
+                        data = json.loads(f.read().strip())
+                except Exception as e:
+                    print(f"❌ Could not read token file {token_path}: {e}")
+                    return None
+                if not all(k in data for k in ("refresh_token", "token_uri", "client_id", "client_secret")):
+                    return None
+                _user_credentials = UserCredentials.from_authorized_user_info(data, scopes=_scopes())
+    return _user_credentials
+
+
+def _utcnow_naive():
+    # google-auth stores expiry as naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _refresh_ahead_of_expiry(creds):
+    """Refresh shared credentials before they expire instead of inside a request's first API call."""
+    expiry = getattr(creds, "expiry", None)
+    if creds.valid and expiry and expiry - _utcnow_naive() > CREDENTIAL_REFRESH_MARGIN:
+        return
+    with _credentials_lock:
+        expiry = getattr(creds, "expiry", None)
+        if not creds.valid or not expiry or expiry - _utcnow_naive() <= CREDENTIAL_REFRESH_MARGIN:
+            creds.refresh(AuthRequest())
+            print(f"🔐 Drive credentials refreshed (valid until {creds.expiry})")
+
+
+def _pooled_service(slot: str, creds):
+    # googleapiclient/httplib2 objects are not thread-safe and must not cross a fork
+    if getattr(_thread_clients, "pid", None) != os.getpid():
+        _thread_clients.__dict__.clear()
+        _thread_clients.pid = os.getpid()
+    service = getattr(_thread_clients, slot, None)
+    if service is None:
+        service = build("drive", "v3", credentials=creds, cache_discovery=False)
+        setattr(_thread_clients, slot, service)
+    return service
+
+
+def get_drive_service():
+    """
+    Service-account Drive client for the current thread. Credentials are built
+    once per process and refreshed ahead of expiry; the discovery object is
+    built once per thread instead of once per request.
+    """
+    try:
+        creds = _service_account_credentials()
+        if creds is None:
+            print("❌ get_drive_service: no service-account JSON found.")
+            return None
+        _refresh_ahead_of_expiry(creds)
+        return _pooled_service("sa", creds)
+    except Exception as e:
+        print(f"❌ get_drive_service error: {e}")
+        return None
+
+
+def get_user_drive_service():
+    """User-OAuth (token.json) client for the current thread, managed like get_drive_service()."""
+    try:
+        creds = _authorized_user_credentials()
+        if creds is None:
+            return None
+        _refresh_ahead_of_expiry(creds)
+        return _pooled_service("user", creds)
+    except Exception as e:
+        print(f"❌ get_user_drive_service error: {e}")
+        return None
+
+
 def clear_csv_cache(file_id: str | None = None):
     """
     Clear CSV cache for a specific file_id (or all if file_id is None).
@@ -125,30 +247,100 @@ def clear_csv_cache(file_id: str | None = None):
         print(f"⚠️ clear_csv_cache error: {e}")
 
 
+# -------------------------------------------------------------------
+# Typed CSV parsing (download buffer -> DataFrame without text copies)
+# -------------------------------------------------------------------
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    _PYARROW_AVAILABLE = True
+except ImportError:  # optional: falls back to pandas' C parser
+    pa = pa_csv = None
+    _PYARROW_AVAILABLE = False
+
+PYARROW_MIN_BYTES = 256 * 1024  # small files parse just as fast with the C parser
+
+def _read_csv_pyarrow(buf, dtype: dict):
+    """Multithreaded pyarrow parse; None when the result needs the C parser instead."""
+    column_types = {}
+    for col, kind in dtype.items():
+        if kind == "category":
+            column_types[col] = pa.dictionary(pa.int32(), pa.string())
+        else:
+            column_types[col] = pa.string()
+
+    buf.seek(0)
+    table = pa_csv.read_csv(
+        buf,
+        convert_options=pa_csv.ConvertOptions(column_types=column_types, strings_can_be_null=True)
+    )
+    # pyarrow infers dates/timestamps (and binary for bad utf-8); undeclared ones must stay text
+    for field in table.schema:
+        if pa.types.is_temporal(field.type) or pa.types.is_binary(field.type):
+            return None
+    df = table.to_pandas()
+    # null strings come back as None; match the C parser's NaN
+    text_cols = [c for c in df.columns if df[c].dtype == object]
+    if text_cols:
+        df[text_cols] = df[text_cols].fillna(np.nan)
+    return df
+
+
+def parse_csv_buffer(buf, table: str | None = None) -> pd.DataFrame:
+    """
+    Parse a downloaded CSV straight from its byte buffer (no decode/split copies),
+    with the pyarrow engine when installed and the table's declared dtypes.
+    """
+    dtype = parse_dtypes(table)
+
+    df = None
+    buf.seek(0, 2)
+    if _PYARROW_AVAILABLE and buf.tell() >= PYARROW_MIN_BYTES:
+        try:
+            df = _read_csv_pyarrow(buf, dtype)
+        except Exception as e:
+            print(f"⚠️ pyarrow CSV parse failed, using C parser: {e}")
+            df = None
+
+    if df is None:
+        buf.seek(0)
+        try:
+            df = pd.read_csv(buf, dtype=dtype or None, encoding="utf-8", encoding_errors="replace")
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+        except (ValueError, TypeError) as e:
+            print(f"⚠️ Declared dtypes rejected ({e}); parsing without them")
+            buf.seek(0)
+            df = pd.read_csv(buf, encoding="utf-8", encoding_errors="replace")
+
+    if df.empty:
+        # Header-only file: untyped object columns, like the plain parser produces
+        return normalize(df.astype(object), table) if len(df.columns) else df
+    return normalize(df, table)
+
+
 # -------------------------------------------------------------------
 # CSV helpers
 # -------------------------------------------------------------------
 # google_drive_service.py
 # Replace your existing load_csv_from_drive with this version
 
-def load_csv_from_drive(service, file_id: str, max_retries: int = 3, **kwargs) -> pd.DataFrame:
-    if not service:
-        print("❌ load_csv_from_drive: service is None")
-        return pd.DataFrame()
-
-    if not file_id or len(str(file_id)) < 8:
-        print(f"❌ load_csv_from_drive: invalid file_id '{file_id}'")
-        return pd.DataFrame()
-
-    cache_key = f"csv::{file_id}"
-    if _is_cache_valid(cache_key, 300):
-        print("💾 Using cached CSV")
-        return _file_cache[cache_key].copy()
+CSV_META_FIELDS = "id,name,size,mimeType,headRevisionId,md5Checksum"
 
+def _fetch_csv(service, file_id: str, max_retries: int, use_prefetch: bool):
+    """
+    One read of file_id straight from Drive: (df, revision, status). revision
+    comes from the same metadata response the content was downloaded with.
+    status is "ok", "missing" (folder / 403 / 404 / no content: don't fall
+    back to snapshots) or "failed" (Drive unreachable or retries exhausted).
+    """
     for attempt in range(1, max_retries + 1):
         try:
             print(f"📥 Loading CSV (try {attempt}/{max_retries}) id={file_id}")
-            meta = service.files().get(fileId=file_id, fields="id,name,size,mimeType").execute()
+            # A batch prefetch (prefetch_file_metadata) saves this round-trip once
+            meta = _take_prefetched_meta(file_id) if (use_prefetch and attempt == 1) else None
+            if meta is None:
+                meta = drive_execute(service.files().get(fileId=file_id, fields=CSV_META_FIELDS))
 
             if not isinstance(meta, dict):
                 print(f"⚠️ Unexpected meta type ({type(meta)}) for file_id={file_id}")
@@ -159,79 +351,143 @@ def load_csv_from_drive(service, file_id: str, max_retries: int = 3, **kwargs) -
 
             if 'folder' in mime:
                 print(f"❌ File id {file_id} is a FOLDER. Returning empty DataFrame.")
-                return pd.DataFrame()
+                return pd.DataFrame(), None, "missing"
+
+            revision = _revision_token(meta)
 
             size = meta.get("size")
             if size in [None, "0", 0]:
                 print(f"⚠️ File id {file_id} has size={size} (empty). Returning empty DataFrame.")
-                return pd.DataFrame()
+                return pd.DataFrame(), revision, "ok"
 
             # Download media
-            req = service.files().get_media(fileId=file_id)
-            buf = BytesIO()
-            downloader = MediaIoBaseDownload(buf, req)
-            done = False
-            while not done:
-                status, done = downloader.next_chunk()
-                if status:
-                    prog = int(status.progress() * 100)
-                    if prog % 25 == 0:
-                        print(f"📊 Download progress: {prog}%")
-            
-            buf.seek(0)
-            content = buf.read().decode("utf-8", errors="replace")
-            if not content.strip():
+            buf = drive_call(_download_media, service, file_id)
+            df = parse_csv_buffer(buf, table_for_file_id(file_id))
+            buf.close()
+            if df.empty and not len(df.columns):
                 print("⚠️ CSV empty (no textual content)")
-                return pd.DataFrame()
-
-            # 🔧 FIX: Handle header-only files properly
-            lines = content.strip().split('\n')
-            if len(lines) <= 1:
-                # Only headers, no data rows
-                df = pd.read_csv(StringIO(content))
+                return pd.DataFrame(), None, "missing"
+            if df.empty:
                 print(f"📋 Header-only CSV detected: {list(df.columns)}")
-                _set_cache(cache_key, df.copy(), _file_cache)
-                return df
-            
-            df = pd.read_csv(StringIO(content))
-            if df is None:
-                print("⚠️ Parsed DataFrame is None")
-                return pd.DataFrame()
-
-            _set_cache(cache_key, df.copy(), _file_cache)
-            print(f"✅ Loaded {len(df)} rows, {len(df.columns)} cols")
-            return df
+            return df, revision, "ok"
+
+        except DriveUnavailable as e:
+            print(f"⚡ Drive unavailable, not retrying id={file_id}: {e}")
+            break
 
         except HttpError as he:
             status_code = getattr(he.resp, "status", None)
             print(f"❌ HTTP {status_code} on load: {he}")
-            if status_code in (403, 404):
+            if status_code == 404 or (status_code == 403 and not is_rate_limited(he)):
                 print("⚠️ Received 403/404 from Drive; returning empty DataFrame")
-                return pd.DataFrame()
-            time.sleep(2 * attempt)
+                return pd.DataFrame(), None, "missing"
+            if attempt == max_retries or not drive_backoff(attempt, he):
+                break
 
         except Exception as e:
             import ssl
             es = str(e)
             if isinstance(e, ssl.SSLError) or 'WRONG_VERSION_NUMBER' in es or 'SSLError' in es or 'DECRYPTION_FAILED' in es:
                 print(f"❌ SSL error while loading CSV (try {attempt}): {e}")
-                if attempt < max_retries:
-                    time.sleep(3 * attempt)  # Longer delay for SSL issues
-                    continue
             else:
                 print(f"❌ load error (try {attempt}): {e}")
-            time.sleep(1 * attempt)
+            if attempt == max_retries or not drive_backoff(attempt, e):
+                break
+
+    return pd.DataFrame(), None, "failed"
+
+
+def _remember_load(file_id: str, df: pd.DataFrame, revision: str | None, data_version: int):
+    """Cache + snapshot a successful Drive read (taken at data_version)."""
+    _file_revisions[file_id] = revision
+    if not len(df.columns):
+        return
+    cache_key = f"csv::{file_id}"
+    _set_cache(cache_key, df.copy(), _file_cache)
+    _cache_versions[cache_key] = data_version
+    write_snapshot(file_id, df, revision, data_version, table_for_file_id(file_id))
+    print(f"✅ Loaded {len(df)} rows, {len(df.columns)} cols")
+
+
+def load_csv_with_revision(service, file_id: str, max_retries: int = 3):
+    """
+    Fresh read for writers: (df, revision) taken from the SAME Drive response,
+    never from shared state another thread may have moved on. revision is None
+    when the read failed; callers must not write anything based on that df.
+    """
+    if not service or not file_id or len(str(file_id)) < 8:
+        print(f"❌ load_csv_with_revision: no service or invalid file_id '{file_id}'")
+        return pd.DataFrame(), None
+    data_version = current_version(file_id)
+    df, revision, status = _fetch_csv(service, file_id, max_retries, use_prefetch=False)
+    if status != "ok":
+        return pd.DataFrame(), None
+    _remember_load(file_id, df, revision, data_version)
+    return df.copy(), revision
+
+
+def load_csv_from_drive(service, file_id: str, max_retries: int = 3, use_cache: bool = True, **kwargs) -> pd.DataFrame:
+    if not service:
+        print("❌ load_csv_from_drive: service is None")
+        return pd.DataFrame()
+
+    if not file_id or len(str(file_id)) < 8:
+        print(f"❌ load_csv_from_drive: invalid file_id '{file_id}'")
+        return pd.DataFrame()
+
+    cache_key = f"csv::{file_id}"
+    # Another worker's save bumps the version and invalidates our copy
+    data_version = current_version(file_id)
+    if use_cache and _is_cache_valid(cache_key, 300) and _cache_versions.get(cache_key) == data_version:
+        print("💾 Using cached CSV")
+        return _file_cache[cache_key].copy()
+    if use_cache:
+        warm = _serve_from_snapshot(file_id, cache_key, data_version)
+        if warm is not None:
+            return warm
+
+    df, revision, status = _fetch_csv(service, file_id, max_retries, use_prefetch=use_cache)
+    if status == "ok":
+        _remember_load(file_id, df, revision, data_version)
+        return df
+    if status == "missing":
+        return pd.DataFrame()
 
-    print(f"⚠️ All {max_retries} attempts failed for id={file_id}. Returning empty DataFrame.")
+    if use_cache:
+        # Last resort for readers: the newest local snapshot, whatever its age
+        # (writers pass use_cache=False and must never act on a stale copy)
+        df, meta = read_snapshot(file_id, max_age=None)
+        if df is not None:
+            age_min = int((time.time() - float(meta.get("saved_at", 0))) / 60)
+            print(f"⚠️ Drive load failed for id={file_id}. Serving local snapshot ({age_min} min old).")
+            return normalize(df, meta.get("table") or table_for_file_id(file_id))
+
+    print(f"⚠️ Drive load failed for id={file_id}. Returning empty DataFrame.")
     return pd.DataFrame()
 
 
+def _download_media(service, file_id: str) -> BytesIO:
+    req = service.files().get_media(fileId=file_id)
+    buf = BytesIO()
+    downloader = MediaIoBaseDownload(buf, req)
+    done = False
+    while not done:
+        status, done = downloader.next_chunk()
+        if status:
+            prog = int(status.progress() * 100)
+            if prog % 25 == 0:
+                print(f"📊 Download progress: {prog}%")
+    return buf
+
+
 
 def save_csv_to_drive(service, df: pd.DataFrame, file_id: str, max_retries: int = 3) -> bool:
     if not service:
         print("❌ save_csv_to_drive: service is None")
         return False
-    if df is None or df.empty:
+    # Header-only frames are legitimate (e.g. every row archived); frames
+    # without columns come from failed loads and must never be written back
+    if df is None or (df.empty and not len(df.columns)):
         print("⚠️ save_csv_to_drive: empty DataFrame")
         return False
     if not file_id or len(str(file_id)) < 8:
@@ -251,55 +507,201 @@ def save_csv_to_drive(service, df: pd.DataFrame, file_id: str, max_retries: int
                 resumable=True,
             )
 
-            service.files().update(
+            updated = drive_execute(service.files().update(
                 fileId=file_id,
                 media_body=media,
-                fields="id,name,size"
-            ).execute()
+                fields="id,name,size,headRevisionId,md5Checksum"
+            ))
+            _file_revisions[file_id] = _revision_token(updated)
 
             # bust CSV cache
             ckey = f"csv::{file_id}"
             _file_cache.pop(ckey, None)
             _cache_timestamps.pop(ckey, None)
+            # ...and in every other worker
+            version = bump_version(file_id)
+            write_snapshot(file_id, df, _file_revisions[file_id], version, table_for_file_id(file_id))
             print("✅ CSV saved & cache cleared")
             return True
-        except HttpError as he:
-            status_code = getattr(he.resp, "status", None)
-            print(f"❌ HTTP {status_code} on save: {he}")
-            if status_code in (403, 404):
-                break
-            time.sleep(2 * attempt)
+        except DriveUnavailable as e:
+            print(f"⚡ Drive unavailable, save of {file_id} not attempted: {e}")
+            break
         except Exception as e:
             print(f"❌ save error (try {attempt}): {e}")
-            time.sleep(1 * attempt)
+            if attempt == max_retries or not drive_backoff(attempt, e):
+                break
     return False
 
+# -------------------------------------------------------------------
+# Warm starts from local snapshots
+# -------------------------------------------------------------------
+_reconcile_lock = threading.Lock()
+_reconciling = set()
+
+
+def _serve_from_snapshot(file_id: str, cache_key: str, data_version: int):
+    """
+    Cold or expired cache: serve the local snapshot if it was taken at the
+    current data version, and check Drive for outside edits in the background.
+    """
+    meta = read_snapshot_meta(file_id)
+    if not meta or meta.get("version") != data_version:
+        return None
+    if time.time() - float(meta.get("saved_at", 0)) > SNAPSHOT_MAX_AGE:
+        return None
+
+    if cache_key in _file_cache and _cache_versions.get(cache_key) == data_version \
+            and _file_revisions.get(file_id) == meta.get("revision"):
+        df = _file_cache[cache_key]  # same data as the snapshot, only past its TTL
+    else:
+        df, meta = read_snapshot(file_id)
+        if df is None or meta.get("version") != data_version:
+            return None
+        df = normalize(df, meta.get("table") or table_for_file_id(file_id))
+        print(f"⚡ Warm start from snapshot: {len(df)} rows for id={file_id}")
+
+    _set_cache(cache_key, df.copy(), _file_cache)
+    _cache_versions[cache_key] = data_version
+    _file_revisions[file_id] = meta.get("revision")
+    _reconcile_in_background(file_id, meta.get("revision"))
+    return df.copy()
+
+
+def _reconcile_in_background(file_id: str, revision: str | None):
+    """Reload file_id if Drive moved past the snapshot revision (one check per file at a time)."""
+    with _reconcile_lock:
+        if file_id in _reconciling:
+            return
+        _reconciling.add(file_id)
+
+    def _run():
+        try:
+            service = get_drive_service()
+            if service is None:
+                return
+            current = get_current_revision(service, file_id)
+            if current and current == revision:
+                return
+            print(f"🔁 Snapshot of {file_id} is behind Drive ({revision} -> {current}); reloading")
+            # Invalidate every worker first so the reload is cached/snapshotted at the new version
+            bump_version(file_id)
+            load_csv_from_drive(service, file_id, use_cache=False)
+        except Exception as e:
+            print(f"⚠️ Snapshot reconcile failed for {file_id}: {e}")
+        finally:
+            with _reconcile_lock:
+                _reconciling.discard(file_id)
+
+    threading.Thread(target=_run, name=f"snapshot-reconcile-{file_id[:8]}", daemon=True).start()
+
+# -------------------------------------------------------------------
+# Optimistic concurrency (compare-and-swap saves)
+# -------------------------------------------------------------------
+def _revision_token(meta) -> str | None:
+    """headRevisionId for binary files, md5Checksum as a fallback"""
+    if not isinstance(meta, dict):
+        return None
+    return meta.get("headRevisionId") or meta.get("md5Checksum")
+
+
+def get_current_revision(service, file_id: str) -> str | None:
+    meta = drive_execute(service.files().get(fileId=file_id, fields="headRevisionId,md5Checksum"))
+    return _revision_token(meta)
+
+
+def save_csv_to_drive_if_unchanged(service, df: pd.DataFrame, file_id: str,
+                                   expected_revision: str | None, max_retries: int = 3):
+    """
+    Upload df only if the Drive file is still at expected_revision.
+    Returns (ok, info) with info "saved", "conflict" or "save_failed".
+    Drive has no conditional media update, so the check+upload pair is also
+    serialised per file across local workers to close the window on this host.
+    """
+    with get_process_lock(f"drive_{file_id}"):
+        try:
+            current = get_current_revision(service, file_id)
+        except Exception as e:
+            print(f"⚠️ Revision check failed for {file_id}: {e}")
+            return False, "save_failed"
+
+        if expected_revision and current and current != expected_revision:
+            print(f"⚠️ Revision conflict on {file_id}: expected {expected_revision}, found {current}")
+            return False, "conflict"
+
+        if save_csv_to_drive(service, df, file_id, max_retries=max_retries):
+            return True, "saved"
+        return False, "save_failed"
+
+
+def update_csv_on_drive(service, file_id: str, mutate, max_conflicts: int = 5):
+    """
+    Read-modify-write with compare-and-swap: mutate(df) -> new df (or None for
+    "nothing to do") is applied to the freshest copy; on a revision conflict the
+    file is re-read and the same row-level change is re-applied.
+    Returns (ok, info).
+    """
+    for attempt in range(1, max_conflicts + 1):
+        # df and expected come from one Drive response; a failed read (no revision)
+        # must never be mutated and written back over the whole table
+        df, expected = load_csv_with_revision(service, file_id)
+        if expected is None:
+            print(f"❌ update_csv_on_drive: could not load {file_id}")
+            return False, "load_failed"
+
+        new_df = mutate(df.copy())
+        if new_df is None:
+            return True, "unchanged"
+
+        ok, info = save_csv_to_drive_if_unchanged(service, new_df, file_id, expected)
+        if ok:
+            return True, "saved"
+        if info != "conflict":
+            return False, info
+
+        print(f"🔁 Re-applying change to fresh copy of {file_id} (conflict {attempt}/{max_conflicts})")
+        time.sleep(random.uniform(0.05, 0.25) * attempt)
+
+    return False, "conflict"
+
 # -------------------------------------------------------------------
 # Drive search helpers
 # -------------------------------------------------------------------
-def find_file_by_name(service, filename: str, parent_folder_id: str | None = None, max_retries: int = 2):
+def _file_lookup_key(filename: str, parent_folder_id: str | None) -> str:
+    return f"file::{parent_folder_id or 'root'}::{filename}"
+
+def _file_name_query(filename: str, parent_folder_id: str | None) -> str:
+    name = str(filename).replace("\\", "\\\\").replace("'", "\\'")
+    query = f"name = '{name}' and trashed = false"
+    if parent_folder_id:
+        query += f" and '{parent_folder_id}' in parents"
+    return query
+
+def find_file_by_name(service, filename: str, parent_folder_id: str | None = None, max_retries: int = 2,
+                      raise_errors: bool = False):
+    """
+    File id of filename (None when there is no such file). With raise_errors
+    a failed lookup raises instead of also returning None.
+    """
     if not service:
         print("❌ find_file_by_name: service is None")
         return None
     if not filename:
         return None
 
-    cache_key = f"file::{parent_folder_id or 'root'}::{filename}"
+    cache_key = _file_lookup_key(filename, parent_folder_id)
     if _is_cache_valid(cache_key, 600):
         return _file_cache.get(cache_key)
 
-    query = f"name = '{filename}' and trashed = false"
-    if parent_folder_id:
-        query += f" and '{parent_folder_id}' in parents"
+    query = _file_name_query(filename, parent_folder_id)
 
     for attempt in range(1, max_retries + 1):
         try:
-            res = service.files().list(
+            res = drive_execute(service.files().list(
                 q=query,
                 spaces="drive",
                 fields="files(id,name)",
                 pageSize=5
-            ).execute()
+            ))
             files = res.get("files", [])
             if files:
                 fid = files[0]["id"]
@@ -309,7 +711,10 @@ def find_file_by_name(service, filename: str, parent_folder_id: str | None = Non
             return None
         except Exception as e:
             print(f"❌ find_file_by_name (try {attempt}): {e}")
-            time.sleep(1)
+            if attempt == max_retries or not drive_backoff(attempt, e):
+                if raise_errors:
+                    raise
+                break
     return None
 
 def find_folder_by_name(service, folder_name: str, parent_folder_id: str | None = None, max_retries: int = 2):
@@ -332,12 +737,12 @@ def find_folder_by_name(service, folder_name: str, parent_folder_id: str | None
 
     for attempt in range(1, max_retries + 1):
         try:
-            res = service.files().list(
+            res = drive_execute(service.files().list(
                 q=query,
                 spaces="drive",
                 fields="files(id,name)",
                 pageSize=5
-            ).execute()
+            ))
             folders = res.get("files", [])
             if folders:
                 fid = folders[0]["id"]
@@ -347,7 +752,8 @@ def find_folder_by_name(service, folder_name: str, parent_folder_id: str | None
             return None
         except Exception as e:
             print(f"❌ find_folder_by_name (try {attempt}): {e}")
-            time.sleep(1)
+            if attempt == max_retries or not drive_backoff(attempt, e):
+                break
     return None
 
 def list_drive_files(service, folder_id: str | None = None, max_retries: int = 2):
@@ -361,16 +767,17 @@ def list_drive_files(service, folder_id: str | None = None, max_retries: int = 2
 
     for attempt in range(1, max_retries + 1):
         try:
-            res = service.files().list(
+            res = drive_execute(service.files().list(
                 q=query,
                 spaces="drive",
                 fields="files(id,name,mimeType)",
                 pageSize=200
-            ).execute()
+            ))
             return res.get("files", [])
         except Exception as e:
             print(f"❌ list_drive_files (try {attempt}): {e}")
-            time.sleep(1)
+            if attempt == max_retries or not drive_backoff(attempt, e):
+                break
     return []
 
 # -------------------------------------------------------------------
@@ -388,10 +795,10 @@ def get_public_url(service, file_id: str, max_retries: int = 2):
         try:
             if service:
                 try:
-                    service.permissions().create(
+                    drive_execute(service.permissions().create(
                         fileId=file_id,
                         body={"type": "anyone", "role": "reader"}
-                    ).execute()
+                    ))
                     print(f"🔓 Made file public: {file_id}")
                 except HttpError as he:
                     print(f"⚠️ permissions.create warn: {he}")
@@ -401,10 +808,247 @@ def get_public_url(service, file_id: str, max_retries: int = 2):
             return url
         except Exception as e:
             print(f"❌ get_public_url (try {attempt}): {e}")
-            time.sleep(1)
+            if attempt == max_retries or not drive_backoff(attempt, e):
+                break
 
     return f"https://drive.google.com/thumbnail?id={file_id}&sz=w1000"
 
+# -------------------------------------------------------------------
+# Batched API calls (one HTTP round-trip for up to 100 small requests)
+# -------------------------------------------------------------------
+DRIVE_BATCH_LIMIT = 100              # Drive rejects batches with more calls
+DRIVE_BATCH_RETRY_ROUNDS = 2         # re-send rate-limited calls this many times
+META_PREFETCH_TTL = 30               # seconds a prefetched metadata entry may replace a probe
+
+
+def _is_retryable_batch_error(exc) -> bool:
+    if not isinstance(exc, HttpError):
+        return False
+    return getattr(exc.resp, "status", None) in (500, 502, 503, 504) or is_rate_limited(exc)
+
+
+class DriveBatch:
+    """
+    Collects Drive API requests and sends them as BatchHttpRequests of at most
+    DRIVE_BATCH_LIMIT calls each. add() returns a Future that execute() resolves
+    with that call's response (or its HttpError).
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self._pending = []
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, request) -> Future:
+        future = Future()
+        self._pending.append((request, future))
+        return future
+
+    def execute(self) -> int:
+        """Send everything queued so far; returns the number of calls resolved."""
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), DRIVE_BATCH_LIMIT):
+            self._execute_chunk(pending[start:start + DRIVE_BATCH_LIMIT])
+        return len(pending)
+
+    def _execute_chunk(self, chunk):
+        for round_no in range(DRIVE_BATCH_RETRY_ROUNDS + 1):
+            retry = []
+            throttled = []
+            by_id = {str(i): item for i, item in enumerate(chunk)}
+
+            def _callback(request_id, response, exception):
+                request, future = by_id[request_id]
+                if exception is None:
+                    future.set_result(response)
+                elif round_no < DRIVE_BATCH_RETRY_ROUNDS and _is_retryable_batch_error(exception):
+                    retry.append((request, future))
+                    if is_rate_limited(exception):
+                        throttled.append(exception)
+                else:
+                    future.set_exception(exception)
+
+            try:
+                batch = self.service.new_batch_http_request(callback=_callback)
+                for request_id, (request, _) in by_id.items():
+                    batch.add(request, request_id=request_id)
+                # One HTTP request, but every call in it counts against the quota
+                drive_call(batch.execute, cost=len(by_id))
+            except Exception as e:
+                print(f"❌ Drive batch of {len(chunk)} failed: {e}")
+                for _, future in chunk:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            if throttled:
+                drive_throttled(throttled[0])
+            if not retry:
+                break
+            print(f"🔁 Re-sending {len(retry)} rate-limited call(s) from batch (round {round_no + 1})")
+            chunk = retry
+            if not drive_backoff(round_no + 1):
+                break
+
+        for _, future in chunk:
+            if not future.done():
+                future.set_exception(RuntimeError("No response for call in Drive batch"))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.execute()
+        return False
+
+
+def _future_value(future, default=None):
+    try:
+        return future.result()
+    except Exception:
+        return default
+
+
+def find_files_by_names(service, filenames, parent_folder_id: str | None = None) -> dict:
+    """
+    Batched find_file_by_name: {filename: file_id or None} for every name,
+    using the same 10-minute lookup cache.
+    """
+    found = {}
+    if not service:
+        print("❌ find_files_by_names: service is None")
+        return found
+
+    lookups = {}
+    with DriveBatch(service) as batch:
+        for filename in dict.fromkeys(n for n in filenames if n):
+            cache_key = _file_lookup_key(filename, parent_folder_id)
+            if _is_cache_valid(cache_key, 600):
+                found[filename] = _file_cache.get(cache_key)
+                continue
+            lookups[filename] = batch.add(service.files().list(
+                q=_file_name_query(filename, parent_folder_id),
+                spaces="drive",
+                fields="files(id,name)",
+                pageSize=5
+            ))
+
+    for filename, future in lookups.items():
+        res = _future_value(future)
+        files = (res or {}).get("files", [])
+        fid = files[0]["id"] if files else None
+        if fid:
+            _set_cache(_file_lookup_key(filename, parent_folder_id), fid, _file_cache)
+        found[filename] = fid
+    if lookups:
+        print(f"✅ Resolved {sum(1 for n in lookups if found.get(n))}/{len(lookups)} file name(s) in one batch")
+    return found
+
+
+def get_public_urls(service, file_ids) -> dict:
+    """Batched get_public_url: {file_id: thumbnail url}, sharing permissions in one round-trip."""
+    urls = {}
+    pending = []
+    with DriveBatch(service) as batch:
+        for file_id in dict.fromkeys(f for f in file_ids if f):
+            cache_key = f"url::{file_id}"
+            if _is_cache_valid(cache_key, 3600):
+                urls[file_id] = _image_cache[cache_key]
+                continue
+            if service:
+                pending.append((file_id, batch.add(service.permissions().create(
+                    fileId=file_id,
+                    body={"type": "anyone", "role": "reader"}
+                ))))
+            else:
+                pending.append((file_id, None))
+
+    for file_id, future in pending:
+        if future is not None:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"⚠️ permissions.create warn ({file_id}): {e}")
+        url = f"https://drive.google.com/thumbnail?id={file_id}&sz=w1000"
+        _set_cache(f"url::{file_id}", url, _image_cache)
+        urls[file_id] = url
+    if pending:
+        print(f"🔓 Made {len(pending)} file(s) public in one batch")
+    return urls
+
+
+def prefetch_file_metadata(service, file_ids, fields: str = CSV_META_FIELDS) -> dict:
+    """
+    Fetch metadata for many files in one batch ({file_id: meta or None}).
+    The next load_csv_from_drive of each file uses it instead of its own probe.
+    """
+    metas = {}
+    if not service:
+        return metas
+    futures = {}
+    with DriveBatch(service) as batch:
+        for file_id in dict.fromkeys(f for f in file_ids if f):
+            futures[file_id] = batch.add(service.files().get(fileId=file_id, fields=fields))
+
+    for file_id, future in futures.items():
+        try:
+            meta = future.result()
+        except Exception as e:
+            print(f"⚠️ Metadata prefetch failed for {file_id}: {e}")
+            meta = None
+        metas[file_id] = meta
+        if isinstance(meta, dict) and fields == CSV_META_FIELDS:
+            _set_cache(f"meta::{file_id}", meta, _meta_cache)
+    return metas
+
+
+def _take_prefetched_meta(file_id: str):
+    """Pop a fresh prefetched metadata entry (each prefetch replaces one probe)."""
+    cache_key = f"meta::{file_id}"
+    meta = _meta_cache.pop(cache_key, None)
+    if meta is not None and _is_cache_valid(cache_key, META_PREFETCH_TTL):
+        return meta
+    return None
+
+# -------------------------------------------------------------------
+# Binary files (archive shards, manifests)
+# -------------------------------------------------------------------
+def download_file_bytes(service, file_id: str) -> bytes | None:
+    """Raw content of a Drive file, or None on failure."""
+    try:
+        buf = drive_call(_download_media, service, file_id)
+        return buf.getvalue()
+    except Exception as e:
+        print(f"❌ download_file_bytes({file_id}) failed: {e}")
+        return None
+
+
+def upload_file_bytes(service, filename: str, data: bytes, mimetype: str,
+                      parent_folder_id: str | None = None, file_id: str | None = None):
+    """
+    Create (or overwrite file_id with) a file holding data.
+    Returns (file_id, revision) or (None, None) on failure.
+    """
+    try:
+        media = MediaIoBaseUpload(BytesIO(data), mimetype=mimetype, resumable=len(data) > 5 * 1024 * 1024)
+        fields = "id,headRevisionId,md5Checksum"
+        if file_id:
+            f = drive_execute(service.files().update(fileId=file_id, media_body=media, fields=fields))
+        else:
+            meta = {"name": filename}
+            if parent_folder_id:
+                meta["parents"] = [parent_folder_id]
+            f = drive_execute(service.files().create(body=meta, media_body=media, fields=fields))
+            _set_cache(_file_lookup_key(filename, parent_folder_id), f.get("id"), _file_cache)
+        print(f"✅ Uploaded '{filename}' ({len(data)} bytes) → {f.get('id')}")
+        return f.get("id"), _revision_token(f)
+    except Exception as e:
+        print(f"❌ upload_file_bytes('{filename}') failed: {e}")
+        return None, None
+
 # -------------------------------------------------------------------
 # File/CSV creation helper
 # -------------------------------------------------------------------
@@ -544,6 +1188,11 @@ def get_drive_service_for_upload():
     Prefer user OAuth client for uploads. If not available, raise a clear error
     (do NOT silently fall back to service account, which has 0 quota on My Drive).
     """
+    user_service = get_user_drive_service()
+    if user_service:
+        return user_service
+
+    # No authorized token yet (e.g. only client_secret.json) -> one-time OAuth flow
     user_service = create_drive_service_user()
     if user_service:
         return user_service
@@ -0,0 +1,21 @@
+# gunicorn.conf.py - picked up automatically by `gunicorn main:app`
+#
+# PORTAL_PRELOAD=1 preloads the app in the master so the read-mostly tables
+# and compiled exams are loaded once and shared copy-on-write by every worker
+# (see the preload section at the end of main.py). It is opt-in: preloading
+# initialises Drive synchronously in the master, so boot waits for Drive
+# instead of starting it in the background. Workers, threads and bind keep
+# coming from the command line / WEB_CONCURRENCY as before.
+
+import os
+
+preload_app = os.environ.get("PORTAL_PRELOAD", "0") == "1"
+
+if preload_app:
+    os.environ["PORTAL_PRELOAD"] = "1"
+
+
+def post_fork(server, worker):
+    if preload_app:
+        import main
+        main.after_fork()
@@ -0,0 +1,113 @@
+# id_allocator.py - Monotonic per-table ID sequences
+#
+# Replaces "max(id) + 1 over the whole CSV" on every insert. Each table has a
+# sequence row in a local SQLite file (shared by all gunicorn workers on the
+# host, BEGIN IMMEDIATE serialises allocations). A sequence is seeded once from
+# the existing data the first time it is used; after that allocation is O(1)
+# and batch inserts reserve a whole block of ids in one transaction.
+#
+# Callers that allocate inside a compare-and-swap mutate pass floor= (the max
+# id of the fresh copy being written), so a sequence that is behind the data -
+# state dir wiped, or seeded from a load that failed - is moved past it instead
+# of handing out ids that already exist. PORTAL_STATE_DIR must still be a
+# persistent directory shared by every host that writes (see coordination.py).
+
+import os
+import sqlite3
+import threading
+
+import pandas as pd
+
+from coordination import STATE_DIR
+
+DB_PATH = os.path.join(STATE_DIR, "id_sequences.sqlite3")
+
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def _ensure_db():
+    global _initialized
+    if _initialized:
+        return
+    with _init_lock:
+        if _initialized:
+            return
+        conn = _connect()
+        try:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sequences ("
+                "name TEXT PRIMARY KEY, next_id INTEGER NOT NULL)"
+            )
+        finally:
+            conn.close()
+        _initialized = True
+
+
+def max_existing_id(df, column="id"):
+    """Highest numeric id in df[column] (0 when empty/missing) - used to seed a sequence."""
+    try:
+        if df is None or df.empty or column not in df.columns:
+            return 0
+        ids = pd.to_numeric(df[column], errors="coerce").dropna()
+        return int(ids.max()) if not ids.empty else 0
+    except Exception as e:
+        print(f"⚠️ max_existing_id({column}) failed: {e}")
+        return 0
+
+
+def allocate_ids(table, count=1, seed=None, floor=None):
+    """
+    Reserve `count` consecutive ids for `table` and return the first one.
+    `seed` is a callable returning the current max id; it is only called when
+    the sequence does not exist yet (first use / fresh state dir). `floor` is
+    a max id already known to exist: ids always start above it and the
+    sequence is advanced to match.
+    """
+    count = max(1, int(count))
+    _ensure_db()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT next_id FROM sequences WHERE name = ?", (table,)).fetchone()
+        if row is None:
+            start = max(int(seed() if seed else 0), int(floor or 0)) + 1
+            print(f"🔧 Seeded id sequence '{table}' at {start}")
+            conn.execute("INSERT INTO sequences (name, next_id) VALUES (?, ?)", (table, start + count))
+        else:
+            start = int(row[0])
+            if floor is not None and start <= int(floor):
+                print(f"🔧 Id sequence '{table}' was behind the data ({start} <= {int(floor)}), advancing")
+                start = int(floor) + 1
+            conn.execute("UPDATE sequences SET next_id = ? WHERE name = ?", (start + count, table))
+        conn.execute("COMMIT")
+        return start
+    except Exception:
+        try:
+            conn.execute("ROLLBACK")
+        except Exception:
+            pass
+        raise
+    finally:
+        conn.close()
+
+
+def next_id(table, seed=None):
+    """Allocate a single id for `table`."""
+    return allocate_ids(table, 1, seed)
+
+
+def reset_sequence(table):
+    """Forget a sequence so it is re-seeded from data on next use (e.g. after a manual CSV restore)."""
+    _ensure_db()
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM sequences WHERE name = ?", (table,))
+    finally:
+        conn.close()
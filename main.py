@@ -1,4 +1,8 @@
 # main.py - FIXED VERSION with explicit Google Drive initialization
+from startup import (  # first import: boot timing starts here
+    checkpoint, startup_phase, run_init, start_background_init, finish_boot, wait_ready, is_ready,
+    startup_report
+)
 from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
 import pandas as pd
 import os
@@ -13,14 +17,9 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 import secrets
 import re
-from fpdf import FPDF
-from PIL import Image
-import requests
 from io import BytesIO
 import tempfile
-from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
-from reportlab.lib.utils import ImageReader
+# PDF / imaging libraries (reportlab) are imported inside the routes that render PDFs
 from dotenv import load_dotenv
 from admin import admin_bp
 import threading
@@ -33,17 +32,42 @@ from sessions import (
     require_valid_session, require_user_role, require_admin_role
 )
 from email_utils import send_credentials_email
+from exam_admission import (
+    acquire_slot, release_slot, queued_response_payload,
+    configure_attempt_writer, submit_attempt, get_admission_stats,
+    flush_pending_attempts
+)
+from coordination import get_process_lock, bump_version, current_version
+from drive_gateway import drive_available, drive_backoff, get_gateway_stats
+from id_allocator import allocate_ids, max_existing_id
+import attempts_index
+import results_index
+import responses_index
+import shards
+import question_search
+import question_dedupe
+from render_cache import cached_page, get_render_cache_stats
+from compression import init_compression, get_compression_stats
+from static_assets import init_static_assets
+from question_html import display_fields, with_html
+import exam_warmup
+from exam_warmup import compile_exam, get_warmup_stats
+from snapshots import read_snapshot, prune_snapshots
+from scheduler import register_job, start_scheduler, get_job_stats
+from schemas import (
+    normalize as normalize_table, table_for_filename, id_mask, status_mask
+)
 import threading
 cache_lock = threading.RLock()
 import gc
 gc.set_threshold(700, 10, 10) 
-from flask import Response
-from reportlab.lib.utils import simpleSplit 
+from flask import Response, has_request_context
 import math
 
 
 # CRITICAL: Load environment variables FIRST
 load_dotenv()
+checkpoint("imports")
 
 # CRITICAL: Check if running on Render or local
 IS_PRODUCTION = os.environ.get('RENDER') is not None  # Render sets this automatically
@@ -56,7 +80,8 @@ else:
 from google_drive_service import (
     create_drive_service, load_csv_from_drive, save_csv_to_drive,
     find_file_by_name, get_public_url, find_folder_by_name,
-    list_drive_files, create_file_if_not_exists
+    list_drive_files, create_file_if_not_exists, update_csv_on_drive,
+    find_files_by_names, get_public_urls, prefetch_file_metadata, get_drive_service
 )
 
 app = Flask(__name__)
@@ -116,6 +141,9 @@ print(f"✅ Server-side sessions enabled: type={app.config['SESSION_TYPE']}, dir
 
 # Register admin blueprint
 app.register_blueprint(admin_bp, url_prefix="/admin")
+init_compression(app)
+init_static_assets(app)
+checkpoint("flask_app")
 
 # Configuration
 USERS_CSV = 'users.csv'
@@ -189,6 +217,7 @@ app_cache = {
     'data': {},
     'images': {},
     'timestamps': {},
+    'versions': {},          # coordination version each cached table was loaded at
     'force_refresh': False   # Flag for forcing reload
 }
 
@@ -272,7 +301,7 @@ def clear_user_cache():
 # CONCURRENT SAFETY SYSTEM
 # =============================================
 
-# Global file locks
+# Global file locks (cross-process: shared by every gunicorn worker on the host)
 file_locks = {}
 lock_registry = threading.RLock()
 
@@ -280,9 +309,21 @@ def get_file_lock(file_key):
     """Get or create a lock for a specific file"""
     with lock_registry:
         if file_key not in file_locks:
-            file_locks[file_key] = threading.RLock()
+            file_locks[file_key] = get_process_lock(f"csv_{file_key}")
         return file_locks[file_key]
 
+def data_version_key(filename):
+    """Invalidation-bus key for a CSV: its Drive file id (same key google_drive_service bumps)"""
+    csv_type = filename.replace('.csv', '')
+    return DRIVE_FILE_IDS.get(csv_type) or csv_type
+
+def page_versions(*filenames, cold=False):
+    """versions() for cached_page: bus versions of the CSVs a page reads (+ archived shards)"""
+    def versions():
+        found = tuple(current_version(data_version_key(f)) for f in filenames)
+        return found + (shards.cold_version(),) if cold else found
+    return versions
+
 def generate_operation_id():
     """Generate unique operation ID"""
     return f"op_{int(time.time())}_{uuid.uuid4().hex[:8]}"
@@ -300,6 +341,9 @@ def safe_csv_save_with_retry(df, csv_type, operation_id=None, max_retries=5):
         return False
     
     for attempt in range(max_retries):
+        if not drive_available():
+            print(f"[{operation_id}] Drive circuit open - not saving {csv_type}")
+            return False
         try:
             print(f"[{operation_id}] Attempt {attempt + 1} saving {csv_type}")
             success = save_csv_to_drive(drive_service, df, file_id)
@@ -317,15 +361,41 @@ def safe_csv_save_with_retry(df, csv_type, operation_id=None, max_retries=5):
         except Exception as e:
             print(f"[{operation_id}] Exception on attempt {attempt + 1} for {csv_type}: {e}")
         
-        # Wait before retry (exponential backoff)
-        if attempt < max_retries - 1:
-            wait_time = (2 ** attempt) * 0.5  # 0.5, 1, 2, 4, 8 seconds
-            print(f"[{operation_id}] Waiting {wait_time}s before retry...")
-            time.sleep(wait_time)
+        # Jittered backoff; stops early once the Drive circuit opens
+        if attempt < max_retries - 1 and not drive_backoff(attempt + 1):
+            break
     
     print(f"[{operation_id}] FAILED to save {csv_type} after {max_retries} attempts")
     return False
 
+def safe_csv_update(csv_type, mutate, operation_id=None):
+    """
+    Compare-and-swap update: mutate(df) -> new df (None = nothing to write) is applied
+    to the freshest Drive copy and re-applied if someone else saved in between.
+    Returns (ok, info).
+    """
+    if not operation_id:
+        operation_id = generate_operation_id()
+
+    global drive_service
+    file_id = DRIVE_FILE_IDS.get(csv_type)
+    if not file_id or not drive_service:
+        print(f"[{operation_id}] No file ID or drive service for {csv_type}")
+        return False, "no_drive"
+
+    try:
+        ok, info = update_csv_on_drive(drive_service, file_id, mutate)
+    except Exception as e:
+        print(f"[{operation_id}] CAS update of {csv_type} failed: {e}")
+        return False, f"error:{e}"
+
+    if ok:
+        cache_key = f'csv_{csv_type}.csv'
+        app_cache['data'].pop(cache_key, None)
+        app_cache['timestamps'].pop(cache_key, None)
+    print(f"[{operation_id}] CAS update of {csv_type}: {info}")
+    return ok, info
+
 def safe_csv_load(filename, operation_id=None):
     """Safe CSV loading with file locking"""
     if not operation_id:
@@ -338,119 +408,49 @@ def safe_csv_load(filename, operation_id=None):
         return load_csv_from_drive_direct(filename)
 
 def safe_dual_file_save(results_df, responses_df, new_result, response_records):
-    """Atomically save both results and responses with retry"""
+    """
+    Append one result and its responses. Each file gets its own compare-and-swap
+    update against the freshest copy, so concurrent submits and admin edits no longer
+    overwrite each other (results_df / responses_df kept for call compatibility).
+    The result id, the responses' ids and their result_id are allocated inside the
+    appends, never below the highest id of the copy being written or the archive.
+    """
     operation_id = generate_operation_id()
-    
-    # Lock both files together
-    with get_file_lock('results'):
-        with get_file_lock('responses'):
-            print(f"[{operation_id}] Starting dual file save with retry mechanism")
-            
-            # Prepare dataframes
-            new_results_df = pd.concat([results_df, pd.DataFrame([new_result])], ignore_index=True)
-            new_responses_df = pd.concat([responses_df, pd.DataFrame(response_records)], ignore_index=True)
-            
-            # Save results with retry
-            print(f"[{operation_id}] Saving results...")
-            results_success = safe_csv_save_with_retry(new_results_df, 'results', f"{operation_id}_results")
-            
-            if results_success:
-                print(f"[{operation_id}] Results saved! Now saving responses...")
-                # Save responses with retry
-                responses_success = safe_csv_save_with_retry(new_responses_df, 'responses', f"{operation_id}_responses")
-                
-                if responses_success:
-                    print(f"[{operation_id}] Both files saved successfully!")
-                    return True, "Both results and responses saved successfully"
-                else:
-                    print(f"[{operation_id}] Responses failed even after retries!")
-                    return False, "Failed to save responses after multiple attempts"
-            else:
-                print(f"[{operation_id}] Results failed even after retries!")
-                return False, "Failed to save results after multiple attempts"
+    print(f"[{operation_id}] Starting dual file save with revision checks")
+
+    def append_result(df):
+        new_result['id'] = allocate_ids('results', 1,
+                                        floor=max(max_existing_id(df), shards.max_archived_id('results')))
+        return pd.concat([df, pd.DataFrame([new_result])], ignore_index=True)
+
+    def append_responses(df):
+        first_id = allocate_ids('responses', max(1, len(response_records)),
+                                floor=max(max_existing_id(df), shards.max_archived_id('responses')))
+        for offset, record in enumerate(response_records):
+            record['id'] = first_id + offset
+            record['result_id'] = int(new_result['id'])
+        return pd.concat([df, pd.DataFrame(response_records)], ignore_index=True)
+
+    print(f"[{operation_id}] Saving results...")
+    results_success, info = safe_csv_update('results', append_result, f"{operation_id}_results")
+    if not results_success:
+        print(f"[{operation_id}] Results failed: {info}")
+        return False, "Failed to save results after multiple attempts"
+    results_index.apply_rows([new_result])
+
+    print(f"[{operation_id}] Results saved! Now saving responses...")
+    responses_success, info = safe_csv_update('responses', append_responses, f"{operation_id}_responses")
+    if not responses_success:
+        print(f"[{operation_id}] Responses failed: {info}")
+        return False, "Failed to save responses after multiple attempts"
+    responses_index.apply_rows(response_records)
+
+    print(f"[{operation_id}] Both files saved successfully!")
+    return True, "Both results and responses saved successfully"
 
 def safe_user_register(email, full_name):
     """Safe user registration with retry mechanism"""
-    operation_id = generate_operation_id()
-    
-    with get_file_lock('users'):
-        print(f"[{operation_id}] Registering user safely: {email}")
-        
-        # Load current users
-        users_df = safe_csv_load('users.csv', operation_id)
-        
-        # Check if email exists
-        if not users_df.empty and email.lower() in users_df['email'].str.lower().values:
-            existing_user = users_df[users_df['email'].str.lower() == email.lower()].iloc[0]
-            return False, "exists", {
-                'username': existing_user['username'],
-                'password': existing_user['password'],
-                'full_name': existing_user['full_name']
-            }
-        
-        # Create new user
-        existing_usernames = users_df['username'].tolist() if not users_df.empty else []
-        username = generate_username(full_name, existing_usernames)
-        password = generate_password()
-        
-        next_id = 1
-        if not users_df.empty and 'id' in users_df.columns:
-            next_id = int(users_df['id'].fillna(0).astype(int).max()) + 1
-        
-        new_user = {
-            'id': next_id,
-            'full_name': full_name,
-            'username': username,
-            'email': email.lower(),
-            'password': password,
-            'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'role': 'user'
-        }
-        
-        # Prepare new dataframe
-        if users_df.empty:
-            new_df = pd.DataFrame([new_user])
-        else:
-            new_df = pd.concat([users_df, pd.DataFrame([new_user])], ignore_index=True)
-        
-        # Save with retry mechanism
-        if safe_csv_save_with_retry(new_df, 'users', operation_id):
-            return True, "success", {
-                'username': username,
-                'password': password,
-                'full_name': full_name
-            }
-        else:
-            return False, "save_failed", None
-
-
-def ensure_required_files():
-    """Ensure all required CSV files exist in Google Drive"""
-    global drive_service
-
-    if not drive_service:
-        print("❌ No Google Drive service for file verification")
-        return
-
-    required_files = {
-        'users.csv': DRIVE_FILE_IDS['users'],
-        'exams.csv': DRIVE_FILE_IDS['exams'],
-        'questions.csv': DRIVE_FILE_IDS['questions'],
-        'results.csv': DRIVE_FILE_IDS['results'],
-        'responses.csv': DRIVE_FILE_IDS['responses']
-    }
-
-    for filename, file_id in required_files.items():
-        if not file_id or file_id.startswith('YOUR_'):
-            print(f"⚠️ {filename}: File ID not configured properly")
-            continue
-            
-        try:
-            # Try to get file metadata to check if it exists
-            meta = drive_service.files().get(fileId=file_id, fields="id,name,size").execute()
-            print(f"✅ Verified {filename}: {meta.get('name')} ({meta.get('size', '0')} bytes)")
-        except Exception as e:
-            print(f"❌ Error verifying {filename} (ID: {file_id}): {e}")
+    return safe_user_register_enhanced(email, full_name)
 
 
 # -------------------------
@@ -494,12 +494,14 @@ def init_drive_service():
     global drive_service
     try:
         print("🔧 Initializing Google Drive service...")
-        drive_service = create_drive_service()
+        with startup_phase("drive_service"):
+            drive_service = create_drive_service()
         if drive_service:
             print("✅ Google Drive service initialized successfully!")
 
             # FIXED: Ensure all required files exist
-            ensure_required_files()
+            with startup_phase("required_files"):
+                ensure_required_files()
             return True
         else:
             print("❌ Failed to initialize Google Drive service")
@@ -509,33 +511,6 @@ def init_drive_service():
         return False
 
 
-def ensure_required_files():
-    """Ensure all required CSV files exist in Google Drive"""
-    global drive_service
-
-    if not drive_service:
-        return
-
-    required_files = {
-        'users.csv': DRIVE_FILE_IDS['users'],
-        'exams.csv': DRIVE_FILE_IDS['exams'],
-        'questions.csv': DRIVE_FILE_IDS['questions'],
-        'results.csv': DRIVE_FILE_IDS['results'],
-        'responses.csv': DRIVE_FILE_IDS['responses']
-    }
-
-    for filename, file_id in required_files.items():
-        try:
-            # Try to load the file to check if it exists
-            test_df = load_csv_from_drive(drive_service, file_id)
-            if test_df is not None:
-                print(f"✅ Verified {filename} exists")
-            else:
-                print(f"⚠️ {filename} may not exist, but ID is configured")
-        except Exception as e:
-            print(f"❌ Error verifying {filename}: {e}")
-
-
 # main.py - replace load_csv_with_cache with this
 @debug_logging("load_csv_with_cache")
 def load_csv_with_cache(filename, force_reload=False):
@@ -548,21 +523,22 @@ def load_csv_with_cache(filename, force_reload=False):
     # Force reload conditions
     force_conditions = [
         app_cache.get('force_refresh', False),
-        session.get('force_refresh', False),
-        force_reload,
-        filename == 'exam_attempts.csv'  # Keep attempts fresh
+        has_request_context() and session.get('force_refresh', False),
+        force_reload
     ]
     
     if any(force_conditions):
         print(f"Force refresh triggered for {filename}")
         app_cache['force_refresh'] = False
-        session.pop('force_refresh', None)
+        if has_request_context():
+            session.pop('force_refresh', None)
         force_reload = True
 
-    # Check cache validity
+    # Check cache validity (a save in any worker bumps the data version)
+    data_version = current_version(data_version_key(filename))
     if not force_reload and cache_key in app_cache['data']:
         cached_time = app_cache['timestamps'].get(cache_key, 0)
-        if time.time() - cached_time < cache_duration:
+        if time.time() - cached_time < cache_duration and app_cache['versions'].get(cache_key) == data_version:
             cached_df = app_cache['data'][cache_key]
             # CRITICAL: Validate cached DataFrame
             if cached_df is not None and hasattr(cached_df, 'empty'):
@@ -594,11 +570,15 @@ def load_csv_with_cache(filename, force_reload=False):
                 if col not in df.columns:
                     df[col] = pd.NA
 
+    # Typed ids / lower-case statuses once per load (no-op for frames the Drive loader already tagged)
+    df = normalize_table(df, table_for_filename(filename))
+
     # Cache the validated result
     try:
         with cache_lock:
             app_cache['data'][cache_key] = df.copy()
             app_cache['timestamps'][cache_key] = time.time()
+            app_cache['versions'][cache_key] = data_version
         print(f"Cached {len(df)} records for {filename}")
     except Exception as e:
         print(f"Error caching {filename}: {e}")
@@ -608,6 +588,18 @@ def load_csv_with_cache(filename, force_reload=False):
 
 
 
+def _load_local_snapshot(filename, file_id):
+    """Newest columnar snapshot of the table written by the data layer (any age), or None."""
+    if not file_id:
+        return None
+    df_snap, meta = read_snapshot(file_id, max_age=None)
+    if df_snap is None:
+        return None
+    age_min = int((time.time() - float(meta.get('saved_at', 0))) / 60)
+    print(f"📥 Loaded local snapshot for {filename} ({len(df_snap)} rows, {age_min} min old).")
+    return df_snap
+
+
 def load_csv_from_drive_direct(filename):
     """
     Robust loader: use safe_drive_csv_load -> fallback to app_cache -> fallback to local file.
@@ -630,6 +622,10 @@ def load_csv_from_drive_direct(filename):
                 return cached.copy()
         except Exception:
             pass
+        # try the last local snapshot of the table
+        df_snap = _load_local_snapshot(filename, file_id)
+        if df_snap is not None:
+            return df_snap
         # try local file fallback
         local_path = os.path.join(os.getcwd(), filename)
         if os.path.exists(local_path):
@@ -690,7 +686,10 @@ def load_csv_from_drive_direct(filename):
     except Exception:
         pass
 
-    # 4) Last resort: local file if present
+    # 4) Last resort: local snapshot, then local file if present
+    df_snap = _load_local_snapshot(filename, file_id)
+    if df_snap is not None:
+        return df_snap
     try:
         local_path = os.path.join(os.getcwd(), filename)
         if os.path.exists(local_path):
@@ -744,6 +743,9 @@ def process_question_image_fixed_ssl_safe(question):
     if drive_service is None:
         print(f"❌ No drive service for image: {image_path}")
         return False, None
+    if not drive_available():
+        print(f"⚡ Drive unavailable, image left unresolved: {image_path}")
+        return False, None
 
     try:
         filename = os.path.basename(image_path)  # e.g. dt-1.png
@@ -774,8 +776,9 @@ def process_question_image_fixed_ssl_safe(question):
                     error_msg = str(e).lower()
                     if 'ssl' in error_msg or 'timeout' in error_msg:
                         print(f"🔄 SSL/timeout error on attempt {attempt + 1}, retrying...")
-                        time.sleep(1 * (attempt + 1))  # Progressive delay
-                        continue
+                        if drive_backoff(attempt + 1, e):
+                            continue
+                        break
                     else:
                         print(f"❌ Non-SSL error reading subjects.csv: {e}")
                         break
@@ -801,8 +804,9 @@ def process_question_image_fixed_ssl_safe(question):
                 error_msg = str(e).lower()
                 if 'ssl' in error_msg or 'timeout' in error_msg:
                     print(f"🔄 SSL/timeout error finding file, attempt {attempt + 1}")
-                    time.sleep(1 * (attempt + 1))
-                    continue
+                    if drive_backoff(attempt + 1, e):
+                        continue
+                    break
                 else:
                     print(f"❌ Non-SSL error finding file: {e}")
                     break
@@ -820,8 +824,9 @@ def process_question_image_fixed_ssl_safe(question):
                     error_msg = str(e).lower()
                     if 'ssl' in error_msg or 'timeout' in error_msg:
                         print(f"🔄 SSL/timeout error getting URL, attempt {attempt + 1}")
-                        time.sleep(1 * (attempt + 1))
-                        continue
+                        if drive_backoff(attempt + 1, e):
+                            continue
+                        break
                     else:
                         print(f"❌ Non-SSL error getting URL: {e}")
                         break
@@ -839,13 +844,79 @@ def process_question_image_fixed_ssl_safe(question):
         print(f"❌ Error processing image {image_path}: {e}")
         return False, None
 
-@debug_logging("preload_exam_data_fixed")
-def preload_exam_data_fixed(exam_id):
+def prime_question_image_urls(questions):
     """
-    FIXED: Exam data preloading with proper error handling and validation
+    Resolve the image URLs of a whole question set up front: one batched
+    name lookup per subject folder plus one batched permissions call, instead
+    of two serial Drive requests per image. Results land in app_cache so
+    process_question_image_fixed_ssl_safe then answers from cache.
+    """
+    global drive_service, app_cache
+
+    if drive_service is None:
+        return 0
+
+    pending = {}  # image_path -> (subject, filename)
+    for question in questions:
+        image_path = question.get("image_path")
+        if image_path is None or pd.isna(image_path):
+            continue
+        image_path = str(image_path).strip()
+        if image_path in ["", "nan", "NaN", "null", "None"]:
+            continue
+        cache_key = f"image_{image_path}"
+        if cache_key in app_cache["images"] and time.time() - app_cache["timestamps"].get(cache_key, 0) < 3600:
+            continue
+        pending[image_path] = (os.path.dirname(image_path).lower().strip(), os.path.basename(image_path))
+
+    if not pending:
+        return 0
+
+    try:
+        subject_folders = {}
+        subjects_file_id = os.environ.get("SUBJECTS_FILE_ID")
+        if subjects_file_id:
+            subjects_df = load_csv_from_drive(drive_service, subjects_file_id)
+            if not subjects_df.empty and "subject_name" in subjects_df.columns:
+                for _, row in subjects_df.iterrows():
+                    subject_folders[str(row["subject_name"]).strip().lower()] = str(row.get("subject_folder_id", ""))
+
+        by_folder = {}
+        for image_path, (subject, filename) in pending.items():
+            folder_id = subject_folders.get(subject) or os.environ.get("IMAGES_FOLDER_ID")
+            if folder_id:
+                by_folder.setdefault(folder_id, []).append((image_path, filename))
+
+        file_ids = {}
+        for folder_id, items in by_folder.items():
+            found = find_files_by_names(drive_service, [filename for _, filename in items], folder_id)
+            for image_path, filename in items:
+                if found.get(filename):
+                    file_ids[image_path] = found[filename]
+
+        urls = get_public_urls(drive_service, list(file_ids.values()))
+        now = time.time()
+        for image_path, file_id in file_ids.items():
+            if urls.get(file_id):
+                app_cache["images"][f"image_{image_path}"] = urls[file_id]
+                app_cache["timestamps"][f"image_{image_path}"] = now
+
+        print(f"⚡ Primed {len(file_ids)}/{len(pending)} question image URL(s) in batch")
+        return len(file_ids)
+    except Exception as e:
+        # Per-image path below still works, just slower
+        print(f"⚠️ Batched image priming failed: {e}")
+        return 0
+
+def compile_exam_content(exam_id):
+    """
+    Build everything an exam session needs (exam row, questions with image URLs
+    and parsed answer keys). Pure data work - no session access - so the
+    warm-up thread can run it ahead of the start window.
+    Returns (True, package) or (False, message).
     """
     start_time = time.time()
-    print(f"Preloading exam data for exam_id: {exam_id}")
+    print(f"Compiling exam data for exam_id: {exam_id}")
 
     try:
         # CRITICAL: Load questions first with explicit validation
@@ -897,7 +968,7 @@ def preload_exam_data_fixed(exam_id):
             if 'exam_id' not in questions_df.columns:
                 return False, "Questions file missing exam_id column"
                 
-            exam_questions = questions_df[questions_df['exam_id'].astype(str) == exam_id_str]
+            exam_questions = questions_df[id_mask(questions_df, 'exam_id', exam_id_str)]
             print(f"Found {len(exam_questions)} questions for exam {exam_id}")
         except Exception as e:
             print(f"Error filtering questions: {e}")
@@ -917,7 +988,7 @@ def preload_exam_data_fixed(exam_id):
             if 'id' not in exams_df.columns:
                 return False, "Exams file missing id column"
                 
-            exam_info = exams_df[exams_df['id'].astype(str) == exam_id_str]
+            exam_info = exams_df[id_mask(exams_df, 'id', exam_id_str)]
             if exam_info.empty:
                 return False, f"Exam metadata not found for ID {exam_id}"
         except Exception as e:
@@ -929,6 +1000,8 @@ def preload_exam_data_fixed(exam_id):
         image_urls = {}
         failed_images = []
 
+        prime_question_image_urls(exam_questions.to_dict('records'))
+
         for _, question in exam_questions.iterrows():
             try:
                 question_dict = question.to_dict()
@@ -959,6 +1032,9 @@ def preload_exam_data_fixed(exam_id):
                     question_dict['has_image'] = False
                     question_dict['image_url'] = None
 
+                # Display HTML rendered once per compile instead of per page view
+                with_html(question_dict)
+
                 # Parse correct answers
                 try:
                     question_dict['parsed_correct_answer'] = parse_correct_answers(
@@ -978,11 +1054,66 @@ def preload_exam_data_fixed(exam_id):
         if not processed_questions:
             return False, "No questions could be processed successfully"
 
+        load_time = time.time() - start_time
+        print(f"Compiled exam {exam_id} in {load_time:.2f}s: {len(processed_questions)} questions")
+
+        return True, {
+            'exam_info': exam_info.iloc[0].to_dict(),
+            'questions': processed_questions,
+            'image_urls': image_urls,
+            'failed_images': failed_images
+        }
+
+    except Exception as e:
+        print(f"Critical error in compile_exam_content: {e}")
+        import traceback
+        traceback.print_exc()
+        return False, f"Critical system error: {str(e)}"
+
+
+def _warm_start_tables():
+    """Tables every candidate touches when an exam starts."""
+    load_csv_with_cache('users.csv')
+    load_csv_with_cache('exam_attempts.csv')
+    attempts_index.warm()
+
+
+exam_warmup.configure(
+    compiler=compile_exam_content,
+    exams_loader=lambda: load_csv_with_cache('exams.csv'),
+    version_fn=lambda: (
+        current_version(data_version_key('questions.csv')),
+        current_version(data_version_key('exams.csv'))
+    ),
+    related_warmers=[_warm_start_tables]
+)
+
+
+@debug_logging("preload_exam_data_fixed")
+def preload_exam_data_fixed(exam_id):
+    """
+    FIXED: Exam data preloading with proper error handling and validation
+    (content comes from the compiled exam cache; see exam_warmup)
+    """
+    start_time = time.time()
+    print(f"Preloading exam data for exam_id: {exam_id}")
+
+    try:
+        ok, package = compile_exam(exam_id)
+        if not ok:
+            return False, package
+
+        # Per-session copies: the compiled package is shared by every candidate
+        exam_info = dict(package['exam_info'])
+        processed_questions = [dict(q) for q in package['questions']]
+        image_urls = dict(package.get('image_urls', {}))
+        failed_images = list(package.get('failed_images', []))
+
         # Store in session with validation
         try:
             cache_key = f'exam_data_{exam_id}'
             session_data = {
-                'exam_info': exam_info.iloc[0].to_dict(),
+                'exam_info': exam_info,
                 'questions': processed_questions,
                 'image_urls': image_urls,
                 'failed_images': failed_images,
@@ -1010,7 +1141,7 @@ def preload_exam_data_fixed(exam_id):
                 # Try storing minimal data
                 try:
                     minimal_data = {
-                        'exam_info': exam_info.iloc[0].to_dict(),
+                        'exam_info': exam_info,
                         'questions': processed_questions,
                         'total_questions': len(processed_questions),
                         'exam_id': exam_id
@@ -1276,104 +1407,12 @@ def safe_drive_csv_load(drive_service, file_id, friendly_name='csv', max_retries
 # -------------------------
 
 
-print("🔧 Module loading - checking execution context...")
-print(f"📍 __name__ = {__name__}")
-print(f"🌐 RENDER environment: {os.environ.get('RENDER', 'Not set')}")
-
-def force_drive_initialization():
-    """Force Google Drive initialization for all execution contexts"""
-    global drive_service
-    
-    print("🚀 Force initializing Google Drive service...")
-    
-    # Debug environment variables first
-    json_env = os.environ.get('GOOGLE_SERVICE_ACCOUNT_JSON')
-    if json_env:
-        print(f"✅ GOOGLE_SERVICE_ACCOUNT_JSON found: {len(json_env)} characters")
-        
-        # Test JSON parsing
-        try:
-            test_json = json.loads(json_env)
-            print(f"✅ JSON is valid. Client email: {test_json.get('client_email', 'Not found')}")
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON parsing failed: {e}")
-            print(f"📄 First 100 chars: {json_env[:100]}")
-            return False
-    else:
-        print("❌ GOOGLE_SERVICE_ACCOUNT_JSON not found in environment")
-        print("📋 Available environment variables with 'GOOGLE' or 'SERVICE':")
-        for key in os.environ.keys():
-            if 'GOOGLE' in key.upper() or 'SERVICE' in key.upper():
-                print(f"   - {key}")
-        return False
-    
-    # Initialize the service
-    try:
-        success = init_drive_service()
-        if success:
-            print("✅ Force initialization successful!")
-            return True
-        else:
-            print("❌ Force initialization failed")
-            return False
-    except Exception as e:
-        print(f"❌ Exception during force initialization: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-# CALL IT IMMEDIATELY when module loads
-print("🔄 Attempting force initialization...")
-initialization_success = force_drive_initialization()
-
-if initialization_success:
-    print("🎉 Google Drive service ready!")
-else:
-    print("⚠️ Google Drive service failed to initialize")
-
-
-
 def get_active_attempt(user_id, exam_id):
     """
-    CRASH-SAFE active attempt retrieval
+    CRASH-SAFE active attempt retrieval (O(1) lookup in the attempts index)
     """
     try:
-        # Use the new safe loader
-        attempts_df = safe_csv_load_with_recovery('exam_attempts.csv')
-        
-        if attempts_df is None or attempts_df.empty:
-            return None
-
-        # SAFE: Normalize data
-        try:
-            attempts_df = attempts_df.fillna('')
-            attempts_df['student_id'] = attempts_df['student_id'].astype(str)
-            attempts_df['exam_id'] = attempts_df['exam_id'].astype(str)
-            attempts_df['status'] = attempts_df['status'].astype(str)
-        except Exception as e:
-            print(f"Error normalizing attempts data: {e}")
-            return None
-
-        # SAFE: Filter and find active attempt
-        try:
-            mask = (
-                (attempts_df['student_id'] == str(user_id)) &
-                (attempts_df['exam_id'] == str(exam_id)) &
-                (attempts_df['status'].str.lower() == 'in_progress')
-            )
-            
-            candidate = attempts_df[mask]
-            if candidate.empty:
-                return None
-            
-            # Get most recent
-            candidate_sorted = candidate.sort_values('start_time', ascending=False)
-            return candidate_sorted.iloc[0].to_dict()
-            
-        except Exception as e:
-            print(f"Error filtering active attempts: {e}")
-            return None
-            
+        return attempts_index.get_active_attempt(user_id, exam_id)
     except Exception as e:
         print(f"Critical error in get_active_attempt: {e}")
         return None
@@ -1453,6 +1492,7 @@ def persist_attempts_df(attempts_df):
         try:
             local_path = os.path.join(os.getcwd(), 'exam_attempts.csv')
             attempts_df.to_csv(local_path, index=False)
+            bump_version(data_version_key('exam_attempts.csv'))
             
             # Clear app cache
             try:
@@ -1486,7 +1526,130 @@ def persist_attempts_df(attempts_df):
         return False, f"critical_error:{str(e)}"
 
 
+def update_attempts_df(mutate):
+    """
+    Compare-and-swap update of exam_attempts; falls back to persist_attempts_df
+    (local file / in-memory backup) when Drive is unavailable or failing.
+    """
+    required_cols = ['id', 'student_id', 'exam_id', 'attempt_number', 'status', 'start_time', 'end_time']
+
+    def with_columns(df):
+        if df is None or len(df.columns) == 0:
+            df = pd.DataFrame(columns=required_cols)
+        for col in required_cols:
+            if col not in df.columns:
+                df[col] = ''
+        return mutate(df)
+
+    ok, info = safe_csv_update('exam_attempts', with_columns)
+    if ok or info == "conflict":
+        return ok, info
 
+    with get_file_lock('exam_attempts'):
+        attempts_df = safe_csv_load_with_recovery('exam_attempts.csv')
+        new_df = with_columns(attempts_df.copy() if attempts_df is not None else None)
+        if new_df is None:
+            return True, "unchanged"
+        return persist_attempts_df(new_df)
+
+
+def write_attempt_batch(new_rows):
+    """
+    Persist a batch of new in_progress attempt rows with ONE attempts write.
+    Called by the exam_admission flusher; returns one (ok, info, row) per input row.
+    """
+    operation_id = generate_operation_id()
+    results = []
+
+    def add_attempts(attempts_df):
+        # Re-run against the fresh copy on every revision conflict
+        results.clear()
+        in_progress = status_mask(attempts_df, 'status', 'in_progress')
+
+        added_rows = []
+        claimed = {}  # (student_id, exam_id) -> row created earlier in this batch
+        for row in new_rows:
+            row = dict(row)
+            pair = (str(row.get('student_id')), str(row.get('exam_id')))
+
+            # Double-clicks / retries inside the same window resume one attempt
+            if pair in claimed:
+                results.append((True, "resumed", dict(claimed[pair])))
+                continue
+
+            pair_mask = id_mask(attempts_df, 'student_id', pair[0]) & id_mask(attempts_df, 'exam_id', pair[1])
+            inprog = attempts_df[pair_mask & in_progress]
+            if not inprog.empty:
+                existing = inprog.sort_values('start_time', ascending=False).iloc[0].to_dict()
+                claimed[pair] = existing
+                results.append((True, "resumed", existing))
+                continue
+
+            attempt_number = 1
+            attempt_nums = pd.to_numeric(attempts_df.loc[pair_mask, 'attempt_number'], errors='coerce').dropna()
+            if not attempt_nums.empty:
+                attempt_number = int(attempt_nums.max()) + 1
+
+            row['attempt_number'] = attempt_number
+            claimed[pair] = row
+            added_rows.append(row)
+            results.append((True, "created", row))
+
+        if not added_rows:
+            return None
+
+        # One id block for the whole batch
+        first_id = allocate_ids('exam_attempts', len(added_rows), floor=max_existing_id(attempts_df))
+        for offset, row in enumerate(added_rows):
+            row['id'] = first_id + offset
+        return pd.concat([attempts_df, pd.DataFrame(added_rows)], ignore_index=True)
+
+    ok, info = update_attempts_df(add_attempts)
+    if not ok:
+        print(f"[{operation_id}] Batched attempts write failed: {info}")
+        if not results:
+            return [(False, info, dict(row)) for row in new_rows]
+        return [(False, info, r) if state == "created" else (saved, state, r)
+                for saved, state, r in results]
+
+    created_rows = [r for _, state, r in results if state == "created"]
+    if created_rows:
+        attempts_index.apply_rows(created_rows)
+    print(f"[{operation_id}] Persisted {len(created_rows)} new attempt(s) in one write ({info})")
+    return results
+
+
+configure_attempt_writer(write_attempt_batch)
+attempts_index.configure(
+    loader=lambda: load_csv_from_drive_direct('exam_attempts.csv'),
+    version_fn=lambda: current_version(data_version_key('exam_attempts.csv'))
+)
+question_search.configure(
+    loader=lambda: load_csv_with_cache('questions.csv'),
+    version_fn=lambda: current_version(data_version_key('questions.csv'))
+)
+question_dedupe.configure(
+    loader=lambda: load_csv_with_cache('questions.csv'),
+    version_fn=lambda: current_version(data_version_key('questions.csv'))
+)
+shards.configure(
+    file_id_fn=lambda table: DRIVE_FILE_IDS.get(table),
+    exams_loader=lambda: load_csv_with_cache('exams.csv')
+)
+results_index.configure(
+    loader=lambda: load_csv_with_cache('results.csv'),
+    exams_loader=lambda: load_csv_with_cache('exams.csv'),
+    version_fn=lambda: current_version(data_version_key('results.csv')),
+    exams_version_fn=lambda: current_version(data_version_key('exams.csv')),
+    cold_loader=lambda: shards.load_cold_table('results', strict=True),
+    cold_version_fn=shards.cold_version
+)
+responses_index.configure(
+    loader=lambda: load_csv_with_cache('responses.csv'),
+    version_fn=lambda: current_version(data_version_key('responses.csv')),
+    cold_loader=lambda: shards.load_cold_table('responses', strict=True),
+    cold_version_fn=shards.cold_version
+)
 
 
 def ensure_drive_csv_exists(csv_type, filename):
@@ -1563,35 +1726,37 @@ def update_exam_attempt_status(user_id, exam_id, status):
     CRASH-SAFE helper to update exam attempt status
     """
     try:
-        attempts_df = safe_csv_load_with_recovery('exam_attempts.csv')
-        
-        if attempts_df is None or attempts_df.empty:
-            print("No attempts data to update")
-            return False, "no_data"
-
-        # Find the in_progress attempt
-        mask = (
-            (attempts_df['student_id'].astype(str) == str(user_id)) &
-            (attempts_df['exam_id'].astype(str) == str(exam_id)) &
-            (attempts_df['status'].astype(str).str.lower() == 'in_progress')
-        )
-
-        if not mask.any():
+        if not attempts_index.get_active_attempt(user_id, exam_id):
             print("No in_progress attempt found to update")
             return False, "not_found"
 
-        # Update the most recent one
-        idx_list = attempts_df[mask].index.tolist()
-        if idx_list:
-            idx = idx_list[-1]
+        found = {}
+
+        def set_status(attempts_df):
+            found.clear()
+            # Find the in_progress attempt
+            mask = (
+                id_mask(attempts_df, 'student_id', user_id) &
+                id_mask(attempts_df, 'exam_id', exam_id) &
+                status_mask(attempts_df, 'status', 'in_progress')
+            )
+            if not mask.any():
+                return None
+
+            # Update the most recent one
+            idx = attempts_df[mask].index.tolist()[-1]
             attempts_df.at[idx, 'status'] = status
             attempts_df.at[idx, 'end_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            found['row'] = attempts_df.loc[idx].to_dict()
+            return attempts_df
 
-            # Persist the changes
-            ok, info = persist_attempts_df(attempts_df)
-            return ok, info
-        
-        return False, "update_failed"
+        ok, info = update_attempts_df(set_status)
+        if ok and not found:
+            print("No in_progress attempt found to update")
+            return False, "not_found"
+        if ok:
+            attempts_index.apply_rows([found['row']])
+        return ok, info
         
     except Exception as e:
         print(f"Error updating exam attempt status: {e}")
@@ -1623,37 +1788,38 @@ def validate_password_strength(password):
 def safe_user_register_enhanced(email, full_name, custom_password=None):
     """Enhanced user registration with optional custom password"""
     operation_id = generate_operation_id()
-    
-    with get_file_lock('users'):
-        print(f"[{operation_id}] Enhanced user registration: {email}")
-        
-        # Load current users
-        users_df = safe_csv_load('users.csv', operation_id)
-        
+    print(f"[{operation_id}] Enhanced user registration: {email}")
+
+    # Validate password if custom
+    if custom_password:
+        is_valid, message = validate_password_strength(custom_password)
+        if not is_valid:
+            return False, "invalid_password", {'message': message}
+
+    outcome = {}
+
+    def add_user(users_df):
+        # Re-run on every revision conflict, so decide from the fresh copy only
+        outcome.clear()
+
         # Check if email exists
-        if not users_df.empty and email.lower() in users_df['email'].str.lower().values:
-            existing_user = users_df[users_df['email'].str.lower() == email.lower()].iloc[0]
-            return False, "exists", {
+        if not users_df.empty and email.lower() in users_df['email'].astype(str).str.lower().values:
+            existing_user = users_df[users_df['email'].astype(str).str.lower() == email.lower()].iloc[0]
+            outcome['status'] = "exists"
+            outcome['info'] = {
                 'username': existing_user['username'],
                 'password': existing_user['password'],
                 'full_name': existing_user['full_name']
             }
-        
+            return None
+
         # Create new user
         existing_usernames = users_df['username'].tolist() if not users_df.empty else []
         username = generate_username(full_name, existing_usernames)
         password = custom_password if custom_password else generate_password()
-        
-        # Validate password if custom
-        if custom_password:
-            is_valid, message = validate_password_strength(custom_password)
-            if not is_valid:
-                return False, "invalid_password", {'message': message}
-        
-        next_id = 1
-        if not users_df.empty and 'id' in users_df.columns:
-            next_id = int(users_df['id'].fillna(0).astype(int).max()) + 1
-        
+
+        next_id = allocate_ids('users', 1, floor=max_existing_id(users_df))
+
         new_user = {
             'id': next_id,
             'full_name': full_name,
@@ -1664,22 +1830,19 @@ def safe_user_register_enhanced(email, full_name, custom_password=None):
             'updated_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'role': 'user'
         }
-        
-        # Prepare new dataframe
+        outcome['status'] = "success"
+        outcome['info'] = {'username': username, 'password': password, 'full_name': full_name}
+
         if users_df.empty:
-            new_df = pd.DataFrame([new_user])
-        else:
-            new_df = pd.concat([users_df, pd.DataFrame([new_user])], ignore_index=True)
-        
-        # Save with retry mechanism
-        if safe_csv_save_with_retry(new_df, 'users', operation_id):
-            return True, "success", {
-                'username': username,
-                'password': password,
-                'full_name': full_name
-            }
-        else:
-            return False, "save_failed", None
+            return pd.DataFrame([new_user])
+        return pd.concat([users_df, pd.DataFrame([new_user])], ignore_index=True)
+
+    ok, info = safe_csv_update('users', add_user, operation_id)
+    if ok and outcome.get('status') == "exists":
+        return False, "exists", outcome['info']
+    if ok and outcome.get('status') == "success":
+        return True, "success", outcome['info']
+    return False, "save_failed", None
 
 
 # ENHANCED CSV save function with immediate verification
@@ -1745,7 +1908,7 @@ def initialize_requests_raised_csv():
         print(f"Error initializing requests_raised.csv: {e}")
         return False
 
-# Update the ensure_required_files function to include the new CSV
+# Verify every required CSV (incl. exam_attempts / requests_raised) in one batched call
 def ensure_required_files():
     """Ensure all required CSV files exist in Google Drive"""
     global drive_service
@@ -1764,19 +1927,28 @@ def ensure_required_files():
         'requests_raised.csv': DRIVE_FILE_IDS.get('requests_raised')  # Add this line
     }
 
+    configured = {}
     for filename, file_id in required_files.items():
         if not file_id or file_id.startswith('YOUR_'):
             print(f"⚠️ {filename}: File ID not configured properly")
             continue
-            
-        try:
-            # Try to get file metadata to check if it exists
-            meta = drive_service.files().get(fileId=file_id, fields="id,name,size").execute()
+        configured[filename] = file_id
+
+    # One batched metadata request; the first CSV loads reuse it instead of probing again
+    try:
+        metas = prefetch_file_metadata(drive_service, configured.values())
+    except Exception as e:
+        print(f"❌ Error verifying required files: {e}")
+        return
+
+    for filename, file_id in configured.items():
+        meta = metas.get(file_id)
+        if meta:
             print(f"✅ Verified {filename}: {meta.get('name')} ({meta.get('size', '0')} bytes)")
-        except Exception as e:
-            print(f"❌ Error verifying {filename} (ID: {file_id}): {e}")
+        else:
+            print(f"❌ Error verifying {filename} (ID: {file_id})")
 
-# Update the force_drive_initialization function to include the new CSV
+# Drive service + required files + requests_raised.csv (runs in the background at boot)
 def force_drive_initialization():
     """Force Google Drive initialization for all execution contexts"""
     global drive_service
@@ -1807,7 +1979,8 @@ def force_drive_initialization():
             print("✅ Force initialization successful!")
             
             # Initialize the new CSV file
-            initialize_requests_raised_csv()
+            with startup_phase("requests_raised_csv"):
+                initialize_requests_raised_csv()
             
             return True
         else:
@@ -2275,6 +2448,7 @@ def api_reset_password():
                 try:
                     local_path = os.path.join(os.getcwd(), 'users.csv')
                     users_df.to_csv(local_path, index=False)
+                    bump_version(data_version_key('users.csv'))
                     save_success = True
                     print(f"[{operation_id}] Saved to local file as fallback")
                 except Exception as e:
@@ -2479,6 +2653,7 @@ def registration_success():
 
 @app.route('/dashboard')
 @require_user_role
+@cached_page(page_versions('exams.csv', 'results.csv', cold=True))
 def dashboard():
     """User dashboard route"""
     try:
@@ -2487,7 +2662,6 @@ def dashboard():
         
         # Your existing dashboard code here
         exams_df = load_csv_with_cache('exams.csv')
-        results_df = load_csv_with_cache('results.csv')
 
         upcoming_exams, ongoing_exams, completed_exams = [], [], []
 
@@ -2499,24 +2673,16 @@ def dashboard():
             ongoing_exams = exams_df[exams_df['status'] == 'ongoing'].to_dict('records')
             completed_exams = exams_df[exams_df['status'] == 'completed'].to_dict('records')
 
-            # Process results for completed exams
-            if not results_df.empty:
-                for exam in completed_exams:
-                    exam_id = int(exam.get('id', 0))
-                    r = results_df[
-                        (results_df['student_id'].astype(str) == str(session['user_id'])) &
-                        (results_df['exam_id'].astype(str) == str(exam_id))
-                        ]
-                    if not r.empty:
-                        score = r.iloc[0].get('score', 0)
-                        max_score = r.iloc[0].get('max_score', 0)
-                        grade = r.iloc[0].get('grade', 'N/A')
-                        exam['result'] = f"{score}/{max_score} ({grade})" if pd.notna(score) and pd.notna(
-                            max_score) else 'Recorded'
-                    else:
-                        exam['result'] = 'Pending'
-            else:
-                for exam in completed_exams:
+            # Latest result per completed exam (results_index lookup, no table scan)
+            for exam in completed_exams:
+                r = results_index.get_latest_result(session['user_id'], exam.get('id', 0))
+                if r:
+                    score = r.get('score', 0)
+                    max_score = r.get('max_score', 0)
+                    grade = r.get('grade', 'N/A')
+                    exam['result'] = f"{score}/{max_score} ({grade})" if pd.notna(score) and pd.notna(
+                        max_score) else 'Recorded'
+                else:
                     exam['result'] = 'Pending'
 
         return render_template('dashboard.html',
@@ -2533,80 +2699,44 @@ def dashboard():
 
 @app.route("/results_history")
 @require_user_role
+@cached_page(page_versions('results.csv', 'exams.csv', cold=True))
 def results_history():
     if "user_id" not in session:
         flash("Please login to view your results history.", "danger")
         return redirect(url_for("login"))
 
     try:
-        # Use cache-loading helper (consistent behaviour across app)
-        results_df = load_csv_with_cache('results.csv')
-        exams_df = load_csv_with_cache('exams.csv')
-
-        # Defensive: if either DataFrame is None or empty, render page with empty results list
-        if results_df is None or (hasattr(results_df, "empty") and results_df.empty):
-            # render an empty results page with informative flash
-            flash("No results found for your account yet.", "info")
-            return render_template("results_history.html", results=[])
-
-        if exams_df is None or (hasattr(exams_df, "empty") and exams_df.empty):
-            # We can still show results but won't have exam names; show message and render empty
-            flash("Exam metadata missing. Contact admin.", "warning")
-            return render_template("results_history.html", results=[])
-
-        student_id = str(session["user_id"])
-
-        # safe column checks
-        if "student_id" not in results_df.columns or "exam_id" not in results_df.columns:
-            flash("Results file is missing required columns. Contact admin.", "error")
-            return render_template("results_history.html", results=[])
-
-        # filter results for this user
-        student_results = results_df[results_df["student_id"].astype(str) == student_id]
-        if student_results.empty:
+        # Materialised per-student history (exam names already denormalised)
+        student_rows = results_index.get_student_results(session["user_id"])
+        if not student_rows:
             flash("No results found for your account yet.", "info")
             return render_template("results_history.html", results=[])
 
-        # merge with exams to get exam names (safe merge - fill missing names)
-        merged = student_results.merge(
-            exams_df.rename(columns={"id": "exam_id", "name": "exam_name"}),
-            left_on="exam_id", right_on="exam_id", how="left", suffixes=("_result", "_exam")
-        )
+        def _value(v, default):
+            return default if v is None or (isinstance(v, float) and math.isnan(v)) else v
 
         results = []
-        for _, row in merged.iterrows():
+        for row in student_rows:
             # safe extraction using .get / fallback defaults
-            completed_at = row.get("completed_at") or row.get("completed_at_result") or ""
-            exam_name = row.get("exam_name") or row.get("name") or f"Exam {row.get('exam_id')}"
-            # other numeric fields may be missing; coerce to sensible defaults
+            exam_name = row.get("exam_name") or f"Exam {row.get('exam_id')}"
             score = row.get("score") if row.get("score") is not None else 0
             max_score = row.get("max_score") if row.get("max_score") is not None else row.get("total_questions", 0)
-            percentage = float(row.get("percentage") or 0.0)
             results.append({
-                "id": int(row.get("id_result") or row.get("id") or 0),
-                "exam_id": int(row.get("exam_id") or 0),
+                "id": int(_value(row.get("id"), 0)),
+                "exam_id": int(_value(row.get("exam_id"), 0)),
                 "exam_name": exam_name,
-                "subject": row.get("name") or exam_name,
-                "completed_at": completed_at,
+                "subject": exam_name,
+                "completed_at": _value(row.get("completed_at"), "") or "",
                 "score": score,
                 "max_score": max_score,
-                "percentage": round(percentage, 2),
-                "grade": row.get("grade") or "N/A",
-                "time_taken_minutes": row.get("time_taken_minutes") or 0,
-                "correct_answers": int(row.get("correct_answers") or 0),
-                "incorrect_answers": int(row.get("incorrect_answers") or 0),
-                "unanswered_questions": int(row.get("unanswered_questions") or 0),
+                "percentage": round(float(_value(row.get("percentage"), 0.0) or 0.0), 2),
+                "grade": _value(row.get("grade"), None) or "N/A",
+                "time_taken_minutes": _value(row.get("time_taken_minutes"), 0) or 0,
+                "correct_answers": int(_value(row.get("correct_answers"), 0) or 0),
+                "incorrect_answers": int(_value(row.get("incorrect_answers"), 0) or 0),
+                "unanswered_questions": int(_value(row.get("unanswered_questions"), 0) or 0),
             })
 
-        # Sort by completed_at (safe parsing)
-        def _parse_date_safe(s):
-            try:
-                return datetime.strptime(str(s), "%Y-%m-%d %H:%M:%S")
-            except Exception:
-                return datetime.min
-
-        results.sort(key=lambda r: _parse_date_safe(r.get("completed_at", "")), reverse=True)
-
         return render_template("results_history.html", results=results)
 
     except Exception as e:
@@ -2621,13 +2751,14 @@ def results_history():
 
 @app.route('/exam-instructions/<int:exam_id>')
 @require_user_role
+@cached_page(page_versions('exams.csv', 'exam_attempts.csv'))
 def exam_instructions(exam_id):
     exams_df = load_csv_with_cache('exams.csv')
     if exams_df.empty:
         flash('No exams available.', 'error')
         return redirect(url_for('dashboard'))
 
-    exam = exams_df[exams_df['id'].astype(str) == str(exam_id)]
+    exam = exams_df[id_mask(exams_df, 'id', exam_id)]
     if exam.empty:
         flash('Exam not found!', 'error')
         return redirect(url_for('dashboard'))
@@ -2641,19 +2772,11 @@ def exam_instructions(exam_id):
         exam_data['negative_marks'] = 0
 
     user_id = session.get('user_id')
-    active_attempt = get_active_attempt(user_id, exam_id)
 
-    # compute attempts left using exam_attempts.csv (safe load)
-    attempts_df = load_csv_with_cache('exam_attempts.csv')
-    if attempts_df is None or attempts_df.empty:
-        attempts_df = pd.DataFrame(columns=['id','student_id','exam_id','attempt_number','status','start_time','end_time'])
-
-    # normalize
-    attempts_df = attempts_df.fillna('')
-    user_exam_mask = (attempts_df['student_id'].astype(str) == str(user_id)) & (attempts_df['exam_id'].astype(str) == str(exam_id))
-    completed_count = 0
-    if not attempts_df.empty and user_exam_mask.any():
-        completed_count = int(attempts_df.loc[user_exam_mask & (attempts_df['status'].astype(str).str.lower()=='completed')].shape[0])
+    # compute attempts left from the attempts index
+    attempt_summary = attempts_index.get_summary(user_id, exam_id)
+    active_attempt = attempt_summary['active_attempt']
+    completed_count = attempt_summary['completed']
 
     try:
         max_attempts = int(exam_data.get('max_attempts') or 0)
@@ -2697,12 +2820,26 @@ def exam_instructions(exam_id):
 @require_user_role
 def start_exam(exam_id):
     """
-    ENHANCED: Start exam route with pre-validation and clearer error messages
+    ENHANCED: Start exam route with pre-validation and clearer error messages.
+    Concurrent starts are bounded by exam_admission; waiters get a queue position.
     """
     user_id = session.get('user_id')
     if not user_id:
         return jsonify({"success": False, "message": "Authentication error."}), 403
 
+    admission_key = f"{user_id}:{exam_id}"
+    admitted, position = acquire_slot(admission_key, honour_pass=True)
+    if not admitted:
+        return jsonify(queued_response_payload(position)), 202
+
+    try:
+        return _start_exam_admitted(exam_id, user_id)
+    finally:
+        release_slot(admission_key)
+
+
+def _start_exam_admitted(exam_id, user_id):
+    """Body of start_exam once the request holds an admission slot"""
     try:
         # CRITICAL: Pre-validate exam data availability before creating attempt
         print(f"Pre-validating exam data for exam_id: {exam_id}")
@@ -2745,7 +2882,7 @@ def start_exam(exam_id):
             }), 500
 
         try:
-            exam_row = exams_df[exams_df['id'].astype(str) == str(exam_id)]
+            exam_row = exams_df[id_mask(exams_df, 'id', exam_id)]
             if exam_row.empty:
                 return jsonify({
                     "success": False,
@@ -2767,21 +2904,9 @@ def start_exam(exam_id):
         except (ValueError, TypeError):
             max_attempts = 0
 
-        # Load and validate exam_attempts data
-        attempts_df = None
+        # Attempt counts / in-progress attempt from the attempts index
         try:
-            attempts_df = safe_csv_load_with_recovery('exam_attempts.csv')
-            if attempts_df is None:
-                attempts_df = pd.DataFrame(columns=[
-                    'id', 'student_id', 'exam_id', 'attempt_number', 'status', 'start_time', 'end_time'
-                ])
-            
-            # Ensure required columns
-            required_cols = ['id', 'student_id', 'exam_id', 'attempt_number', 'status', 'start_time', 'end_time']
-            for col in required_cols:
-                if col not in attempts_df.columns:
-                    attempts_df[col] = ''
-
+            attempt_summary = attempts_index.get_summary(user_id, exam_id)
         except Exception as e:
             print(f"Error loading attempts data: {e}")
             return jsonify({
@@ -2790,23 +2915,7 @@ def start_exam(exam_id):
                 "error_type": "attempts_data_error"
             }), 500
 
-        # Count completed attempts
-        completed_attempts = 0
-        try:
-            if not attempts_df.empty:
-                attempts_df['student_id'] = attempts_df['student_id'].astype(str)
-                attempts_df['exam_id'] = attempts_df['exam_id'].astype(str)
-                attempts_df['status'] = attempts_df['status'].astype(str).fillna('')
-
-                completed_mask = (
-                    (attempts_df['student_id'] == str(user_id)) &
-                    (attempts_df['exam_id'] == str(exam_id)) &
-                    (attempts_df['status'].str.lower() == 'completed')
-                )
-                completed_attempts = int(completed_mask.sum())
-        except Exception as e:
-            print(f"Error counting attempts: {e}")
-            completed_attempts = 0
+        completed_attempts = attempt_summary['completed']
 
         # Check attempt limits
         if max_attempts > 0 and completed_attempts >= max_attempts:
@@ -2817,116 +2926,51 @@ def start_exam(exam_id):
             }), 403
 
         # Check for existing in-progress attempt
-        try:
-            if not attempts_df.empty:
-                inprog_mask = (
-                    (attempts_df['student_id'] == str(user_id)) &
-                    (attempts_df['exam_id'] == str(exam_id)) &
-                    (attempts_df['status'].str.lower() == 'in_progress')
-                )
-                if inprog_mask.any():
-                    # Resume existing attempt
-                    inprog_row = attempts_df[inprog_mask].sort_values('start_time', ascending=False).iloc[0]
-                    start_time = inprog_row.get('start_time')
-                    if start_time and 'exam_start_time' not in session:
-                        session['exam_start_time'] = str(start_time)
-                        session.permanent = True
-                    try:
-                        session['latest_attempt_id'] = int(inprog_row.get('id', 0))
-                    except (ValueError, TypeError):
-                        pass
-                    
-                    print(f"Resuming existing attempt {inprog_row.get('id')}")
-                    return jsonify({
-                        "success": True, 
-                        "redirect_url": url_for('exam_page', exam_id=exam_id), 
-                        "resumed": True,
-                        "message": "Resuming existing attempt"
-                    })
-        except Exception as e:
-            print(f"Error checking in-progress attempts: {e}")
-
-        # Create new attempt
-        try:
-            # Generate next ID
-            next_id = 1
-            try:
-                if not attempts_df.empty and 'id' in attempts_df.columns:
-                    numeric_ids = pd.to_numeric(attempts_df['id'], errors='coerce')
-                    valid_ids = numeric_ids.dropna()
-                    if not valid_ids.empty:
-                        next_id = int(valid_ids.max()) + 1
-            except Exception as e:
-                print(f"Error generating next ID: {e}")
-                next_id = len(attempts_df) + 1
-
-            # Generate attempt number
-            attempt_number = 1
+        inprog_row = attempt_summary['active_attempt']
+        if inprog_row:
+            # Resume existing attempt
+            start_time = inprog_row.get('start_time')
+            if start_time and 'exam_start_time' not in session:
+                session['exam_start_time'] = str(start_time)
+                session.permanent = True
             try:
-                if not attempts_df.empty:
-                    user_exam_mask = (
-                        (attempts_df['student_id'] == str(user_id)) &
-                        (attempts_df['exam_id'] == str(exam_id))
-                    )
-                    if user_exam_mask.any():
-                        attempt_nums = pd.to_numeric(attempts_df.loc[user_exam_mask, 'attempt_number'], errors='coerce')
-                        valid_nums = attempt_nums.dropna()
-                        if not valid_nums.empty:
-                            attempt_number = int(valid_nums.max()) + 1
-            except Exception as e:
-                print(f"Error generating attempt number: {e}")
+                session['latest_attempt_id'] = int(inprog_row.get('id', 0))
+            except (ValueError, TypeError):
+                pass
+            
+            print(f"Resuming existing attempt {inprog_row.get('id')}")
+            return jsonify({
+                "success": True, 
+                "redirect_url": url_for('exam_page', exam_id=exam_id), 
+                "resumed": True,
+                "message": "Resuming existing attempt"
+            })
 
+        # Create new attempt (batched with other starts into one attempts write)
+        try:
             start_iso = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
             
             new_attempt = {
-                "id": next_id,
                 "student_id": str(user_id),
                 "exam_id": str(exam_id),
-                "attempt_number": attempt_number,
                 "status": "in_progress",
                 "start_time": start_iso,
                 "end_time": ""
             }
 
-            # Create new attempts DataFrame
-            try:
-                if attempts_df.empty:
-                    new_attempts_df = pd.DataFrame([new_attempt])
-                else:
-                    new_attempts_df = pd.concat([attempts_df, pd.DataFrame([new_attempt])], ignore_index=True)
-            except Exception as e:
-                print(f"Error creating new attempts DataFrame: {e}")
-                new_attempts_df = pd.DataFrame([new_attempt])
-
-            # Persist with multiple fallbacks
-            persisted = False
-            error_details = []
-            
-            try:
-                ok, info = persist_attempts_df(new_attempts_df)
-                persisted = bool(ok)
-                if not persisted:
-                    error_details.append(f"persist_attempts_df: {info}")
-            except Exception as e:
-                error_details.append(f"persist_attempts_df exception: {str(e)}")
-
-            # Fallback to local file
-            if not persisted:
-                try:
-                    new_attempts_df.to_csv('exam_attempts.csv', index=False)
-                    persisted = True
-                    print("Saved to local exam_attempts.csv as fallback")
-                except Exception as e:
-                    error_details.append(f"local file save: {str(e)}")
-
+            persisted, info, saved_attempt = submit_attempt(new_attempt)
             if not persisted:
                 return jsonify({
                     "success": False, 
                     "message": "Unable to save attempt data. Please try again.",
                     "error_type": "attempt_save_failed",
-                    "details": error_details
+                    "details": [str(info)]
                 }), 500
 
+            next_id = saved_attempt.get('id')
+            start_iso = str(saved_attempt.get('start_time') or start_iso)
+            resumed = (info == "resumed")
+
             # Set session data
             try:
                 session['latest_attempt_id'] = int(next_id)
@@ -2941,13 +2985,13 @@ def start_exam(exam_id):
             except Exception as e:
                 print(f"Error setting exam active: {e}")
 
-            print(f"Successfully created new attempt {next_id} for user {user_id}, exam {exam_id}")
+            print(f"Successfully {'resumed' if resumed else 'created new'} attempt {next_id} for user {user_id}, exam {exam_id}")
             
             return jsonify({
                 "success": True, 
                 "redirect_url": url_for('exam_page', exam_id=exam_id), 
-                "resumed": False,
-                "message": "Exam started successfully",
+                "resumed": resumed,
+                "message": "Resuming existing attempt" if resumed else "Exam started successfully",
                 "attempt_id": next_id
             })
 
@@ -2990,7 +3034,7 @@ def api_exam_attempts_status(exam_id):
             if exams_df is None or exams_df.empty:
                 return jsonify({'error': 'exam_data_unavailable'}), 500
             
-            exam_row = exams_df[exams_df['id'].astype(str) == str(exam_id)]
+            exam_row = exams_df[id_mask(exams_df, 'id', exam_id)]
             if exam_row.empty:
                 return jsonify({'error': 'exam_not_found'}), 404
             
@@ -3001,53 +3045,11 @@ def api_exam_attempts_status(exam_id):
             print(f"Error loading exam info: {e}")
             return jsonify({'error': 'exam_info_error', 'message': str(e)}), 500
 
-        # SAFE: Load attempts with reduced retries
-        completed_attempts = 0
-        active_exists = False
-        
+        # SAFE: O(1) lookup in the attempts index
         try:
-            attempts_df = safe_csv_load_with_recovery('exam_attempts.csv', max_retries=1)
-            
-            if attempts_df is not None and hasattr(attempts_df, 'empty'):
-                if attempts_df.empty and len(attempts_df.columns) > 0:
-                    # Header-only file
-                    print("Header-only exam_attempts file - no attempts yet")
-                    completed_attempts = 0
-                    active_exists = False
-                elif not attempts_df.empty:
-                    # Has data rows
-                    try:
-                        attempts_df = attempts_df.fillna('')
-                        attempts_df['student_id'] = attempts_df['student_id'].astype(str)
-                        attempts_df['exam_id'] = attempts_df['exam_id'].astype(str)
-                        attempts_df['status'] = attempts_df['status'].astype(str)
-
-                        completed_mask = (
-                            (attempts_df['student_id'] == str(user_id)) &
-                            (attempts_df['exam_id'] == str(exam_id)) &
-                            (attempts_df['status'].str.lower() == 'completed')
-                        )
-                        completed_attempts = int(completed_mask.sum())
-
-                        inprog_mask = (
-                            (attempts_df['student_id'] == str(user_id)) &
-                            (attempts_df['exam_id'] == str(exam_id)) &
-                            (attempts_df['status'].str.lower() == 'in_progress')
-                        )
-                        active_exists = bool(inprog_mask.any())
-                        
-                    except Exception as e:
-                        print(f"Error processing attempts data: {e}")
-                        completed_attempts = 0
-                        active_exists = False
-                else:
-                    # Completely empty
-                    completed_attempts = 0
-                    active_exists = False
-            else:
-                completed_attempts = 0
-                active_exists = False
-                
+            attempt_summary = attempts_index.get_summary(user_id, exam_id)
+            completed_attempts = attempt_summary['completed']
+            active_exists = attempt_summary['active_attempt'] is not None
         except Exception as e:
             print(f"Error loading attempts: {e}")
             completed_attempts = 0
@@ -3087,45 +3089,16 @@ def mark_exam_abandoned(exam_id):
     if not user_id:
         return jsonify({"success": False, "message": "Not authenticated"}), 401
 
-    lock = get_file_lock('exam_attempts')
-    with lock:
-        try:
-            file_id = DRIVE_FILE_IDS.get('exam_attempts')
-            attempts_df = pd.DataFrame()
-            if file_id and drive_service:
-                try:
-                    attempts_df = safe_drive_csv_load(drive_service, file_id, friendly_name='exam_attempts.csv')
-                except Exception:
-                    attempts_df = pd.DataFrame()
-            if attempts_df is None or attempts_df.empty:
-                local_path = os.path.join(os.getcwd(), "exam_attempts.csv")
-                if os.path.exists(local_path):
-                    attempts_df = pd.read_csv(local_path, dtype=str)
-                else:
-                    return jsonify({"success": False, "message": "No attempts file"}), 400
-
-            # Find the latest in_progress row
-            mask = (
-                (attempts_df['student_id'].astype(str) == str(user_id)) &
-                (attempts_df['exam_id'].astype(str) == str(exam_id)) &
-                (attempts_df['status'].astype(str) == 'in_progress')
-            )
-            if not mask.any():
-                return jsonify({"success": False, "message": "No in-progress attempt found"}), 404
-
-            idxs = attempts_df[mask].index.tolist()
-            latest_idx = idxs[-1]
-            attempts_df.at[latest_idx, 'status'] = 'abandoned'
-            attempts_df.at[latest_idx, 'end_time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            ok, info = persist_attempts_df(attempts_df)
-            if ok:
-                return jsonify({"success": True, "message": "Marked as abandoned"})
-            else:
-                return jsonify({"success": False, "message": f"Save failed: {info}"}), 500
-        except Exception as e:
-            print(f"mark_exam_abandoned error: {e}")
-            return jsonify({"success": False, "message": "Server error"}), 500
+    try:
+        ok, info = update_exam_attempt_status(user_id, exam_id, 'abandoned')
+        if ok:
+            return jsonify({"success": True, "message": "Marked as abandoned"})
+        if info == "not_found":
+            return jsonify({"success": False, "message": "No in-progress attempt found"}), 404
+        return jsonify({"success": False, "message": f"Save failed: {info}"}), 500
+    except Exception as e:
+        print(f"mark_exam_abandoned error: {e}")
+        return jsonify({"success": False, "message": "Server error"}), 500
 
 
 
@@ -3146,8 +3119,19 @@ def preload_exam_route(exam_id):
                 'question_count': cached_data['total_questions']
             })
 
-        # Attempt preload with detailed error reporting
-        success, message = preload_exam_data_fixed(exam_id)
+        # Preloading is the expensive part of a start burst - bound it
+        admission_key = f"{session.get('user_id')}:{exam_id}"
+        admitted, position = acquire_slot(admission_key)
+        if not admitted:
+            return jsonify(queued_response_payload(position)), 202
+
+        success = False
+        try:
+            # Attempt preload with detailed error reporting
+            success, message = preload_exam_data_fixed(exam_id)
+        finally:
+            # A successful preload lets the follow-up /start-exam skip the queue
+            release_slot(admission_key, grant_pass=success)
         
         status_code = 200 if success else 400
         response_data = {
@@ -3190,28 +3174,6 @@ from markupsafe import Markup, escape
 from datetime import datetime
 from flask import render_template, request, session, flash, redirect, url_for
 
-def sanitize_for_display(s):
-    """
-    Escape HTML-special characters but preserve safe <br>.
-    Convert newlines to actual <br> tags so they render correctly.
-    """
-    from markupsafe import Markup, escape
-    if s is None:
-        return Markup("")
-    s = str(s)
-
-    # Normalize CRLF -> LF
-    s = s.replace("\r\n", "\n").replace("\r", "\n")
-
-    # Escape HTML to prevent injection
-    escaped = escape(s)
-
-    # ✅ Fix: Convert newlines to real <br> tags
-    with_breaks = escaped.replace("\n", Markup("<br>"))
-
-    return Markup(with_breaks)
-
-
 
 # Replace the exam_page route in your main.py
 
@@ -3332,18 +3294,7 @@ def exam_page(exam_id):
             max_attempts = 0
 
         try:
-            attempts_df = safe_csv_load_with_recovery('exam_attempts.csv')
-            if attempts_df is not None and not attempts_df.empty:
-                attempts_df['student_id'] = attempts_df['student_id'].astype(str)
-                attempts_df['exam_id'] = attempts_df['exam_id'].astype(str)
-                attempts_df['status'] = attempts_df.get('status', '').astype(str).fillna('')
-
-                completed_mask = (
-                    (attempts_df['student_id'] == str(user_id)) &
-                    (attempts_df['exam_id'] == str(exam_id)) &
-                    (attempts_df['status'].str.lower() == 'completed')
-                )
-                completed_attempts = int(completed_mask.sum())
+            completed_attempts = attempts_index.get_summary(user_id, exam_id)['completed']
         except Exception as e:
             print(f"Error calculating attempts: {e}")
             completed_attempts = 0
@@ -3415,12 +3366,8 @@ def exam_page(exam_id):
             q_index = int(request.args.get('q', 0) or 0)
             q_index = max(0, min(q_index, len(questions) - 1))
 
-            current_question = dict(questions[q_index]) if q_index < len(questions) else {}
-            
-            # Sanitize display text
-            current_question['question_text'] = sanitize_for_display(current_question.get('question_text', ''))
-            for opt in ['option_a', 'option_b', 'option_c', 'option_d']:
-                current_question[opt] = sanitize_for_display(current_question.get(opt, ''))
+            # Display text comes pre-sanitised from the compiled exam
+            current_question = display_fields(questions[q_index]) if q_index < len(questions) else {}
 
             selected_answer = session.get('exam_answers', {}).get(str(current_question.get('id')))
 
@@ -3673,43 +3620,8 @@ def submit_exam(exam_id):
         incorrect_answers = 0
         unanswered_questions = 0
 
-        # SAFE: Load existing data
-        try:
-            results_df = safe_csv_load_with_recovery('results.csv')
-            if results_df is None:
-                results_df = pd.DataFrame()
-        except Exception as e:
-            print(f"Error loading results: {e}")
-            results_df = pd.DataFrame()
-
-        try:
-            responses_df = safe_csv_load_with_recovery('responses.csv')
-            if responses_df is None:
-                responses_df = pd.DataFrame()
-        except Exception as e:
-            print(f"Error loading responses: {e}")
-            responses_df = pd.DataFrame()
-
-        # SAFE: Generate next IDs
-        try:
-            next_result_id = 1
-            if not results_df.empty and 'id' in results_df.columns:
-                numeric_ids = pd.to_numeric(results_df['id'], errors='coerce').dropna()
-                if not numeric_ids.empty:
-                    next_result_id = int(numeric_ids.max()) + 1
-        except Exception as e:
-            print(f"Error generating result ID: {e}")
-            next_result_id = int(time.time())  # Fallback to timestamp
-
-        try:
-            next_response_id = 1
-            if not responses_df.empty and 'id' in responses_df.columns:
-                numeric_ids = pd.to_numeric(responses_df['id'], errors='coerce').dropna()
-                if not numeric_ids.empty:
-                    next_response_id = int(numeric_ids.max()) + 1
-        except Exception as e:
-            print(f"Error generating response ID: {e}")
-            next_response_id = int(time.time())  # Fallback to timestamp
+        # Result / response ids are allocated by safe_dual_file_save inside each
+        # compare-and-swap append, above the ids of the copy actually written
 
         response_records = []
 
@@ -3801,8 +3713,8 @@ def submit_exam(exam_id):
                 # SAFE: Create response record
                 try:
                     response_record = {
-                        'id': int(next_response_id),
-                        'result_id': int(next_result_id),
+                        'id': None,
+                        'result_id': None,
                         'exam_id': int(exam_id),
                         'question_id': int(question.get('id', 0)),
                         'given_answer': given_answer_str,
@@ -3813,7 +3725,6 @@ def submit_exam(exam_id):
                         'is_attempted': bool(is_attempted)
                     }
                     response_records.append(response_record)
-                    next_response_id += 1
                 except Exception as e:
                     print(f"Error creating response record for question {qid}: {e}")
 
@@ -3855,7 +3766,7 @@ def submit_exam(exam_id):
         # SAFE: Create result record
         try:
             new_result = {
-                'id': int(next_result_id),
+                'id': None,
                 'student_id': int(session['user_id']),
                 'exam_id': int(exam_id),
                 'score': float(total_score),
@@ -3876,7 +3787,7 @@ def submit_exam(exam_id):
 
         # SAFE: Save results atomically
         try:
-            save_success, save_message = safe_dual_file_save(results_df, responses_df, new_result, response_records)
+            save_success, save_message = safe_dual_file_save(None, None, new_result, response_records)
             
             if not save_success:
                 print(f"Failed to save result: {save_message}")
@@ -3889,7 +3800,7 @@ def submit_exam(exam_id):
 
         # SAFE: Update session
         try:
-            session['latest_attempt_id'] = int(next_result_id)
+            session['latest_attempt_id'] = int(new_result['id'])
             set_exam_active(session.get('user_id'), session.get('token'), is_active=False)
         except Exception as e:
             print(f"Error updating session: {e}")
@@ -3926,6 +3837,19 @@ def submit_exam(exam_id):
 
 
 
+def find_user_result(user_id, exam_id, result_id=None):
+    """
+    One result row of a student for an exam (hot or archived): result_id if
+    given, otherwise the highest id. None if there is no such result.
+    """
+    rows = results_index.get_exam_results(user_id, exam_id)
+    if result_id is not None:
+        rows = [r for r in rows if str(r.get('id')) == str(int(result_id))]
+    if not rows:
+        return None
+    return max(rows, key=lambda r: int(r.get('id') or 0))
+
+
 @app.route('/result/<int:exam_id>', defaults={'result_id': None})
 @app.route('/result/<int:exam_id>/<int:result_id>')
 @require_user_role
@@ -3933,42 +3857,22 @@ def result(exam_id, result_id):
     """Result page with support for history view"""
     from_history = request.args.get("from_history", "0") == "1"
     try:
-        results_df = load_csv_with_cache('results.csv')
         exams_df = load_csv_with_cache('exams.csv')
 
-        if results_df.empty or exams_df.empty:
+        if exams_df.empty:
             flash('Result not found!', 'error')
             return redirect(url_for('dashboard'))
 
         user_id = int(session['user_id'])
 
-        if result_id:  # Specific attempt from history
-            r = results_df[
-                (results_df['id'].astype('Int64') == int(result_id)) &
-                (results_df['student_id'].astype('Int64') == user_id) &
-                (results_df['exam_id'].astype('Int64') == int(exam_id))
-            ]
-        else:  # Latest attempt
-            attempt_id = session.get('latest_attempt_id')
-            if attempt_id:
-                r = results_df[
-                    (results_df['id'].astype('Int64') == int(attempt_id)) &
-                    (results_df['student_id'].astype('Int64') == user_id) &
-                    (results_df['exam_id'].astype('Int64') == int(exam_id))
-                ]
-            else:
-                r = results_df[
-                    (results_df['student_id'].astype('Int64') == user_id) &
-                    (results_df['exam_id'].astype('Int64') == int(exam_id))
-                ].sort_values('id', ascending=False).head(1)
-
+        # Specific attempt from history, else the one just submitted, else the latest
+        result_data = find_user_result(user_id, exam_id, result_id or session.get('latest_attempt_id'))
         exam = exams_df[exams_df['id'].astype('Int64') == int(exam_id)]
 
-        if r.empty or exam.empty:
+        if result_data is None or exam.empty:
             flash('Result not found!', 'error')
             return redirect(url_for('dashboard'))
 
-        result_data = r.iloc[0].to_dict()
         exam_data = exam.iloc[0].to_dict()
 
         return render_template('result.html', result=result_data, exam=exam_data, from_history=from_history)
@@ -3987,44 +3891,23 @@ def response_page(exam_id, result_id):
     """Response analysis page with support for history view (robust against missing CSVs)"""
     from_history = request.args.get("from_history", "0") == "1"
     try:
-        results_df = load_csv_with_cache('results.csv')
-        responses_df = load_csv_with_cache('responses.csv')
         exams_df = load_csv_with_cache('exams.csv')
 
         # Defensive checks
-        if results_df is None or (hasattr(results_df, "empty") and results_df.empty):
-            flash('No results available.', 'info')
-            return redirect(url_for('dashboard'))
-        if responses_df is None or (hasattr(responses_df, "empty") and responses_df.empty):
-            flash('No responses available.', 'info')
-            return redirect(url_for('dashboard'))
         if exams_df is None or (hasattr(exams_df, "empty") and exams_df.empty):
             flash('Exam metadata missing. Contact admin.', 'warning')
             return redirect(url_for('dashboard'))
 
         user_id = int(session['user_id'])
 
-        # If specific attempt (from history)
-        if result_id:
-            user_results = results_df[
-                (results_df['id'].astype('Int64') == int(result_id)) &
-                (results_df['student_id'].astype('Int64') == user_id) &
-                (results_df['exam_id'].astype('Int64') == int(exam_id))
-            ]
-        else:
-            # Otherwise latest attempt
-            user_results = results_df[
-                (results_df['student_id'].astype('Int64') == user_id) &
-                (results_df['exam_id'].astype('Int64') == int(exam_id))
-            ].sort_values('id', ascending=False).head(1)
+        # Specific attempt (from history), otherwise latest attempt
+        result_data = find_user_result(user_id, exam_id, result_id)
 
-        if user_results.empty:
+        if result_data is None:
             flash('Response not found!', 'error')
             return redirect(url_for('dashboard'))
 
-        result_record = user_results.iloc[0]
-        result_id = int(result_record['id'])
-        result_data = result_record.to_dict()
+        result_id = int(result_data['id'])
 
         # Get exam data
         exam_record = exams_df[exams_df['id'].astype('Int64') == int(exam_id)]
@@ -4033,16 +3916,8 @@ def response_page(exam_id, result_id):
             return redirect(url_for('dashboard'))
         exam_data = exam_record.iloc[0].to_dict()
 
-        # Get responses for this result
-        if 'exam_id' in responses_df.columns:
-            user_responses = responses_df[
-                (responses_df['result_id'].astype('Int64') == result_id) &
-                (responses_df['exam_id'].astype('Int64') == int(exam_id))
-            ].sort_values('question_id')
-        else:
-            user_responses = responses_df[
-                responses_df['result_id'].astype('Int64') == result_id
-            ].sort_values('question_id')
+        # Get responses for this result (only this attempt's rows are read)
+        user_responses = responses_index.get_responses(result_id, exam_id)
 
         if user_responses.empty:
             flash('No detailed responses saved for this result.', 'info')
@@ -4081,12 +3956,9 @@ def response_page(exam_id, result_id):
             if not qdata:
                 continue
 
-            # 🔹 Sanitize question + options (same as exam_page)
-            qdata['question_text'] = sanitize_for_display(qdata.get('question_text', ''))
-            qdata['option_a'] = sanitize_for_display(qdata.get('option_a', ''))
-            qdata['option_b'] = sanitize_for_display(qdata.get('option_b', ''))
-            qdata['option_c'] = sanitize_for_display(qdata.get('option_c', ''))
-            qdata['option_d'] = sanitize_for_display(qdata.get('option_d', ''))
+            # 🔹 Pre-sanitised question + options (same as exam_page); a copy, the
+            # compiled exam's raw text must stay untouched
+            qdata = display_fields(qdata)
 
             given_answer_str = str(response.get('given_answer') or '')
             correct_answer_str = str(response.get('correct_answer') or '')
@@ -4177,23 +4049,15 @@ def response_pdf(exam_id):
         
         exam = exam_info.iloc[0]
         
-        results_df = load_csv_with_cache('results.csv')
-        user_result = results_df[
-            (results_df['student_id'] == user_id) & 
-            (results_df['exam_id'] == exam_id)
-        ].tail(1)
+        result = results_index.get_latest_result(user_id, exam_id)
         
-        if user_result.empty:
+        if result is None:
             flash('No results found.', 'error')
             return redirect(url_for('dashboard'))
         
-        result = user_result.iloc[0]
         result_id = result['id']
         
-        responses_df = load_csv_with_cache('responses.csv')
-        user_responses = responses_df[
-            responses_df['result_id'] == result_id
-        ].sort_values('question_id')
+        user_responses = responses_index.get_responses(result_id)
         
         questions_df = load_csv_with_cache('questions.csv')
         
@@ -4436,6 +4300,16 @@ def debug_service_status():
             status['drive_test'] = f"Error: {str(e)}"
     else:
         status['drive_test'] = "Service not initialized"
+
+    status['exam_admission'] = get_admission_stats()
+    status['exam_warmup'] = get_warmup_stats()
+    status['drive_gateway'] = get_gateway_stats()
+    status['startup'] = startup_report()
+    status['jobs'] = get_job_stats()
+    status['shards'] = shards.get_shard_stats()
+    status['render_cache'] = get_render_cache_stats()
+    status['compression'] = get_compression_stats()
+    status['question_search'] = question_search.get_search_stats()
     
     return jsonify(status)
 
@@ -4687,21 +4561,13 @@ def api_submit_access_request():
             pending_requests = requests_df[
                 (requests_df['username'].astype(str).str.strip().str.lower() == username.lower()) &
                 (requests_df['email'].astype(str).str.strip().str.lower() == email.lower()) &
-                (requests_df['request_status'].astype(str).str.lower() == 'pending')
+                status_mask(requests_df, 'request_status', 'pending')
             ]
 
             if not pending_requests.empty:
                 return jsonify({'success': False, 'message': 'You already have a pending request. Please wait for admin approval.'}), 400
 
-        try:
-            if requests_df.empty or 'request_id' not in requests_df.columns:
-                next_id = 1
-            else:
-                numeric_ids = pd.to_numeric(requests_df['request_id'], errors='coerce')
-                valid_ids = numeric_ids.dropna()
-                next_id = int(valid_ids.max()) + 1 if not valid_ids.empty else 1
-        except Exception:
-            next_id = 1
+        next_id = allocate_ids('requests_raised', 1, seed=lambda: max_existing_id(requests_df, 'request_id'))
 
         new_request = {
             'request_id': next_id,
@@ -4858,13 +4724,46 @@ def cleanup_app_cache():
     except Exception as e:
         print(f"Cache cleanup error: {e}")
 
-# Run cleanup every 5 minutes
-import threading
-def periodic_cleanup():
-    cleanup_app_cache()
-    threading.Timer(300, periodic_cleanup).start()
+# -------------------------
+# Maintenance jobs (scheduler.py)
+# -------------------------
+# Per-worker jobs touch this process' memory; leader jobs touch shared state
+# and run on one worker per interval.
+register_job("cache_eviction", cleanup_app_cache, interval=300, initial_delay=0)
+register_job("attempt_queue_flush", flush_pending_attempts, interval=5)
+register_job("attempts_index_refresh", attempts_index.warm, interval=120)
+register_job("results_index_refresh", results_index.warm, interval=300)
+register_job("responses_index_refresh", responses_index.warm, interval=300)
+register_job("exam_warmup", exam_warmup.run_warmup_cycle, interval=exam_warmup.WARMUP_INTERVAL, leader=True)
+register_job("snapshot_compaction", prune_snapshots, interval=6 * 3600, leader=True)
+register_job("question_dedupe_report", question_dedupe.run_dedupe_report, interval=24 * 3600, leader=True)
+register_job("shard_archival", shards.archive_closed_exams, interval=6 * 3600, leader=True)
+
+# -------------------------
+# Background Drive warm-up
+# -------------------------
+# Drive initialisation no longer blocks the worker: it runs in a thread and
+# requests that need Drive wait (bounded) for the readiness flag below.
+DRIVE_READY_WAIT = float(os.environ.get("DRIVE_READY_WAIT", "15"))
+DRIVE_READY_SKIP_PATHS = ('/static/', '/favicon.ico', '/_ping', '/debug/')
+
+
+def _drive_warmup():
+    ok = force_drive_initialization()
+    if ok:
+        with startup_phase("warm_tables"):
+            _warm_start_tables()
+    return ok
+
+
+@app.before_request
+def wait_for_drive_warmup():
+    """Hold requests arriving during boot until Drive is initialised (up to DRIVE_READY_WAIT)."""
+    if is_ready("drive") or request.path.startswith(DRIVE_READY_SKIP_PATHS):
+        return
+    if not wait_ready("drive", DRIVE_READY_WAIT):
+        print(f"⚠️ Drive still initialising after {DRIVE_READY_WAIT}s; serving {request.path} from local data")
 
-periodic_cleanup()
 
 @app.route('/_ping', methods=['POST'])
 def ping():
@@ -4873,29 +4772,61 @@ def ping():
         return '', 204  # No content, session is alive
     return jsonify({'reason': 'no_session'}), 401
 
+# -------------------------
+# gunicorn --preload: build shared read-only data in the master
+# -------------------------
+# With PORTAL_PRELOAD=1 (opt-in, it blocks boot on Drive) gunicorn.conf.py
+# imports this module in the master. Drive init, the read-mostly tables and the compiled upcoming exams
+# are loaded once there and gc.freeze()d, so forked workers share those pages
+# copy-on-write instead of each downloading its own copy. Threads don't
+# survive fork: after_fork() (the post_fork hook) starts them per worker.
+# Refresh needs no extra protocol: a save bumps the table's data version and
+# writes a new local snapshot, and each worker swaps its inherited copy for
+# the snapshot on next access instead of re-downloading from Drive.
+PRELOAD_MODE = os.environ.get("PORTAL_PRELOAD") == "1"
+PRELOAD_TABLES = ('users.csv', 'exams.csv', 'questions.csv', 'exam_attempts.csv')
+
+
+def preload_shared_data():
+    """Load the read-mostly tables and compile upcoming exams (master process)."""
+    for filename in PRELOAD_TABLES:
+        load_csv_with_cache(filename)
+    attempts_index.warm()
+    results_index.warm()
+    exam_warmup.run_warmup_cycle()
+    # Everything allocated so far lives as long as the process: keep the
+    # collector from touching (and so un-sharing) those pages in the workers
+    gc.collect()
+    gc.freeze()
+    print(f"🧊 Preloaded {len(app_cache['data'])} tables; {gc.get_freeze_count()} objects frozen for copy-on-write")
+    return True
+
+
+def after_fork():
+    """Per-worker setup after gunicorn forks from a preloaded master."""
+    global drive_service
+    # httplib2 connections must not be shared across processes
+    if drive_service is not None:
+        drive_service = get_drive_service() or drive_service
+    start_scheduler()
+    print(f"👷 Worker {os.getpid()} forked from preloaded master")
+
+
 # -------------------------
 # Run App - CRITICAL INITIALIZATION
 # -------------------------
+if PRELOAD_MODE:
+    print("🔧 Preload mode: initializing Google Drive in the master...")
+    run_init("drive", force_drive_initialization)
+    with startup_phase("preload"):
+        preload_shared_data()
+else:
+    start_scheduler()
+    checkpoint("scheduler")
+    print("🔧 Starting Google Drive initialization in the background...")
+    start_background_init("drive", _drive_warmup)
+finish_boot()
+
 if __name__ == '__main__':
     print("🚀 Starting FIXED Exam Portal...")
-    
-    # CRITICAL: Force initialization during startup
-    print("🔧 Forcing Google Drive service initialization...")
-    if init_drive_service():
-        print("✅ Google Drive integration: ACTIVE")
-    else:
-        print("❌ Google Drive integration: INACTIVE")
-        print("⚠️ App will run in limited mode")
-
     app.run(debug=True if not IS_PRODUCTION else False)
-else:
-    # CRITICAL: This runs when deployed with Gunicorn
-    print("🌐 Gunicorn detected - initializing services for production...")
-    
-    # Force immediate initialization
-    if init_drive_service():
-        print("✅ Production Google Drive integration: ACTIVE")
-    else:
-        print("❌ Production Google Drive integration: FAILED")
-
-        print("📋 Check environment variables and credentials")
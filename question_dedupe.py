@@ -0,0 +1,349 @@
+# question_dedupe.py - Exact and near-duplicate detection for the question bank
+#
+# questions_batch_add appended whatever it was sent, so the bank collected
+# many copies of the same question (re-pasted sets, whitespace / case edits,
+# shuffled options), which bloats exam compiles and storage. Every question
+# gets two fingerprints:
+#   * an exact hash of its normalised text (question_search tokens, options
+#     as a sorted set, so option order and formatting don't matter)
+#   * a MinHash signature over word shingles; LSH banding finds candidate
+#     pairs without comparing every pair, and candidates are kept when their
+#     estimated Jaccard similarity reaches NEAR_DUPLICATE_THRESHOLD
+# check_items() flags incoming items at insert time (against the bank and
+# each other); build_report() scans the whole bank and groups duplicates for
+# the dedupe report job. Like the other indexes the fingerprints are rebuilt
+# once per questions.csv data version and patched after this worker's inserts.
+
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+
+from coordination import STATE_DIR, get_process_lock
+from question_search import tokenize
+
+NUM_PERM = 128
+LSH_BANDS = 16                    # 16 bands x 8 rows: candidates from ~0.7 similarity
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SHINGLE_SIZE = 3
+NEAR_DUPLICATE_THRESHOLD = 0.8
+REPORT_PATH = os.path.join(STATE_DIR, "question_dedupe_report.json")
+
+_MERSENNE = (1 << 31) - 1
+_rng = np.random.RandomState(20240601)   # fixed: signatures must agree across workers and runs
+_PERM_A = _rng.randint(1, _MERSENNE, size=NUM_PERM, dtype=np.int64)
+_PERM_B = _rng.randint(0, _MERSENNE, size=NUM_PERM, dtype=np.int64)
+
+_lock = threading.RLock()
+_exact = {}              # exact hash -> [question id, ...]
+_bands = [dict() for _ in range(LSH_BANDS)]   # band bucket key -> {question id, ...}
+_docs = {}               # question id -> {"exact", "signature", "exam_id", "text"}
+_built_version = None    # bus version the fingerprints reflect (None = stale / never built)
+_loader = None           # () -> questions DataFrame
+_version_fn = None       # () -> current bus version for questions
+
+
+def configure(loader, version_fn):
+    """Register how to load questions and read its invalidation-bus version."""
+    global _loader, _version_fn
+    _loader = loader
+    _version_fn = version_fn
+
+
+def _norm_id(value):
+    try:
+        return str(int(float(str(value).strip())))
+    except (ValueError, TypeError):
+        return str(value).strip()
+
+
+def _id_key(qid):
+    return (0, int(qid)) if qid.isdigit() else (1, qid)
+
+
+def _current_version():
+    try:
+        return _version_fn() if _version_fn else 0
+    except Exception:
+        return None
+
+
+# -------------------------------------------------------------------
+# Fingerprints
+# -------------------------------------------------------------------
+def _content_tokens(row):
+    """Question tokens followed by the options' tokens (options in sorted order)."""
+    options = sorted(" ".join(tokenize(row.get(f))) for f in ("option_a", "option_b", "option_c", "option_d"))
+    return tokenize(row.get("question_text")), [o for o in options if o]
+
+
+def exact_hash(row):
+    text_tokens, options = _content_tokens(row)
+    payload = " ".join(text_tokens) + "\x1f" + "\x1e".join(options)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def _shingles(row):
+    text_tokens, options = _content_tokens(row)
+    tokens = text_tokens + [t for o in options for t in o.split()]
+    if len(tokens) < SHINGLE_SIZE:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+
+
+def minhash(row):
+    """MinHash signature (NUM_PERM int64 values) of the row's shingles, None if it has none."""
+    shingles = _shingles(row)
+    if not shingles:
+        return None
+    base = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=4).digest(), "little") for s in shingles),
+        dtype=np.int64, count=len(shingles),
+    )
+    # (a*x + b) mod p for every permutation x shingle, then the column-wise minimum
+    hashed = (np.outer(_PERM_A, base) + _PERM_B[:, None]) % _MERSENNE
+    return hashed.min(axis=1)
+
+
+def _band_keys(signature):
+    if signature is None:
+        return []
+    return [signature[i * LSH_ROWS:(i + 1) * LSH_ROWS].tobytes() for i in range(LSH_BANDS)]
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures (0 when either is empty)."""
+    if sig_a is None or sig_b is None:
+        return 0.0
+    return float(np.mean(sig_a == sig_b))
+
+
+def _fingerprint(row):
+    return {
+        "exact": exact_hash(row),
+        "signature": minhash(row),
+        "exam_id": _norm_id(row.get("exam_id")),
+        "text": str(row.get("question_text") or "")[:160],
+    }
+
+
+# -------------------------------------------------------------------
+# Index
+# -------------------------------------------------------------------
+def _add(qid, doc):
+    _remove(qid)
+    _docs[qid] = doc
+    _exact.setdefault(doc["exact"], []).append(qid)
+    for band, key in zip(_bands, _band_keys(doc["signature"])):
+        band.setdefault(key, set()).add(qid)
+
+
+def _remove(qid):
+    doc = _docs.pop(qid, None)
+    if doc is None:
+        return
+    ids = _exact.get(doc["exact"], [])
+    if qid in ids:
+        ids.remove(qid)
+    if not ids:
+        _exact.pop(doc["exact"], None)
+    for band, key in zip(_bands, _band_keys(doc["signature"])):
+        bucket = band.get(key)
+        if bucket is not None:
+            bucket.discard(qid)
+            if not bucket:
+                del band[key]
+
+
+def rebuild():
+    """Fingerprint the whole question bank."""
+    global _exact, _bands, _docs, _built_version
+    with _lock:
+        version = _current_version()
+        started = time.time()
+        try:
+            df = _loader() if _loader else None
+        except Exception as e:
+            print(f"⚠️ question_dedupe: load failed: {e}")
+            df = None
+
+        # a column-less frame is a failed read (Drive down / not initialised), not an empty bank
+        loaded = df is not None and "id" in df.columns
+        _exact, _bands, _docs = {}, [dict() for _ in range(LSH_BANDS)], {}
+        if loaded and not df.empty:
+            for row in df.to_dict("records"):
+                _add(_norm_id(row.get("id")), _fingerprint(row))
+        _built_version = version if loaded else None
+        print(f"🧬 question_dedupe rebuilt: {len(_docs)} questions in "
+              f"{int((time.time() - started) * 1000)} ms (version {version})")
+
+
+def _ensure_fresh():
+    if _built_version is None or _built_version != _current_version():
+        rebuild()
+
+
+def _candidates(signature):
+    found = set()  # stays empty for empty signatures (only exact matching applies)
+    for band, key in zip(_bands, _band_keys(signature)):
+        found |= band.get(key, set())
+    return found
+
+
+def _near_matches(doc, exclude=()):
+    matches = []
+    for qid in _candidates(doc["signature"]):
+        if qid in exclude:
+            continue
+        score = similarity(doc["signature"], _docs[qid]["signature"])
+        if score >= NEAR_DUPLICATE_THRESHOLD:
+            matches.append({"id": qid, "similarity": round(score, 3)})
+    matches.sort(key=lambda m: -m["similarity"])
+    return matches
+
+
+def check_items(items):
+    """
+    Duplicate flags for questions about to be inserted, one per item:
+    {"index", "exact": [bank ids], "near": [{"id", "similarity"}],
+     "duplicate_of_item": index of an earlier item in the same batch or None}.
+    Items with no match are left out.
+    """
+    flags = []
+    with _lock:
+        _ensure_fresh()
+        seen = []   # (index, fingerprint) of earlier items in this batch
+        for index, item in enumerate(items):
+            doc = _fingerprint(item)
+            exact = list(_exact.get(doc["exact"], []))
+            near = _near_matches(doc, exclude=set(exact))
+            in_batch = next(
+                (i for i, other in seen
+                 if other["exact"] == doc["exact"]
+                 or similarity(other["signature"], doc["signature"]) >= NEAR_DUPLICATE_THRESHOLD),
+                None,
+            )
+            seen.append((index, doc))
+            if exact or near or in_batch is not None:
+                flags.append({"index": index, "exact": exact, "near": near, "duplicate_of_item": in_batch})
+    return flags
+
+
+def apply_rows(rows):
+    """Patch the fingerprints after THIS worker inserted question rows."""
+    global _built_version
+    with _lock:
+        if _built_version is None:
+            return
+        current = _current_version()
+        if current is None or current != _built_version + 1:
+            _built_version = None
+            return
+        for row in rows:
+            _add(_norm_id(row.get("id")), _fingerprint(row))
+        _built_version = current
+
+
+def invalidate():
+    global _built_version
+    with _lock:
+        _built_version = None
+
+
+# -------------------------------------------------------------------
+# Bank-wide report
+# -------------------------------------------------------------------
+def build_report():
+    """Scan the whole bank and group exact and near duplicates (None if it could not be loaded)."""
+    started = time.time()
+    with _lock:
+        _ensure_fresh()
+        if _built_version is None:
+            return None
+        exact_groups = [sorted(ids, key=_id_key) for ids in _exact.values() if len(ids) > 1]
+        in_exact = {qid for group in exact_groups for qid in group[1:]}
+
+        # union-find over verified near-duplicate pairs (one representative per exact group)
+        parent = {}
+
+        def find(x):
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        pair_scores = {}
+        for qid, doc in _docs.items():
+            if qid in in_exact:
+                continue
+            for match in _near_matches(doc, exclude={qid} | in_exact):
+                pair = tuple(sorted((qid, match["id"]), key=_id_key))
+                if pair not in pair_scores and doc["exact"] != _docs[match["id"]]["exact"]:
+                    pair_scores[pair] = match["similarity"]
+                    parent[find(pair[0])] = find(pair[1])
+
+        clusters = {}
+        for qid in parent:
+            clusters.setdefault(find(qid), []).append(qid)
+        near_groups = []
+        for members in clusters.values():
+            if len(members) < 2:
+                continue
+            members.sort(key=_id_key)
+            member_set = set(members)
+            scores = [s for (a, _), s in pair_scores.items() if a in member_set]
+            near_groups.append({
+                "ids": members,
+                "min_similarity": min(scores),
+                "max_similarity": max(scores),
+                "exam_ids": sorted({_docs[m]["exam_id"] for m in members}),
+                "sample": _docs[members[0]]["text"],
+            })
+        near_groups.sort(key=lambda g: (-len(g["ids"]), -g["max_similarity"]))
+
+        report = {
+            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "questions": len(_docs),
+            "threshold": NEAR_DUPLICATE_THRESHOLD,
+            "exact_groups": [
+                {"ids": ids, "exam_ids": sorted({_docs[q]["exam_id"] for q in ids}), "sample": _docs[ids[0]]["text"]}
+                for ids in sorted(exact_groups, key=lambda g: -len(g))
+            ],
+            "near_groups": near_groups,
+            "redundant_questions": sum(len(g) - 1 for g in exact_groups) + sum(len(g["ids"]) - 1 for g in near_groups),
+            "took_ms": int((time.time() - started) * 1000),
+        }
+    return report
+
+
+def run_dedupe_report():
+    """Scheduler job: rebuild the report and store it for the admin API."""
+    report = build_report()
+    if report is None:
+        print("⚠️ Dedupe report skipped: question bank unavailable")
+        return None
+    tmp_path = f"{REPORT_PATH}.{os.getpid()}.tmp"
+    with get_process_lock("question_dedupe_report"):
+        with open(tmp_path, "w") as f:
+            json.dump(report, f)
+        os.replace(tmp_path, REPORT_PATH)
+    print(f"🧬 Dedupe report: {len(report['exact_groups'])} exact / {len(report['near_groups'])} near "
+          f"group(s), {report['redundant_questions']} redundant question(s)")
+    return report
+
+
+def load_report():
+    """Last stored report, or None."""
+    try:
+        with open(REPORT_PATH, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Unreadable dedupe report: {e}")
+        return None
@@ -0,0 +1,72 @@
+# question_html.py - Question text / options sanitised once, not per render
+#
+# exam_page, the response page and the admin question listing HTML-escaped
+# every question text and option on every view. The escaped HTML is now made
+# when the content is written (add / edit / batch add store it next to the
+# raw text in questions.csv as <field>_html) and when an exam is compiled
+# (compile_exam_content, cached per data version), so rendering only looks it
+# up. A hash of the raw texts it was made from is stored with it (html_source):
+# rows written before this change, or whose text was edited directly on Drive,
+# don't match it and are sanitised again at render time; compiling always
+# re-derives the HTML from the raw text.
+
+import hashlib
+
+from markupsafe import Markup, escape
+
+HTML_FIELDS = ("question_text", "option_a", "option_b", "option_c", "option_d")
+HTML_SUFFIX = "_html"
+HTML_SOURCE_COLUMN = "html_source"
+HTML_COLUMNS = [f"{field}{HTML_SUFFIX}" for field in HTML_FIELDS] + [HTML_SOURCE_COLUMN]
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def _raw_text(text) -> str:
+    if _is_missing(text):
+        return ""
+    return str(text).replace("\r\n", "\n").replace("\r", "\n")
+
+
+def source_hash(row: dict) -> str:
+    """Short hash of the raw HTML_FIELDS texts of row."""
+    raw = "\x1f".join(_raw_text(row.get(field)) for field in HTML_FIELDS)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def render_html(text) -> str:
+    """
+    Escape HTML-special characters and turn newlines into <br> tags
+    (CRLF / CR normalised first). Returns the HTML as a plain string.
+    """
+    return str(escape(_raw_text(text)).replace("\n", Markup("<br>")))
+
+
+def with_html(row: dict) -> dict:
+    """row plus freshly rendered <field>_html values and their html_source (for writes and compiles)."""
+    for field in HTML_FIELDS:
+        row[f"{field}{HTML_SUFFIX}"] = render_html(row.get(field, ""))
+    row[HTML_SOURCE_COLUMN] = source_hash(row)
+    return row
+
+
+def display_html(row: dict, field: str, current_hash=None) -> Markup:
+    """
+    Stored HTML of field if it was made from the row's current raw text,
+    else rendered now. current_hash: source_hash(row), if already computed.
+    """
+    stored = row.get(f"{field}{HTML_SUFFIX}")
+    if isinstance(stored, str) and row.get(HTML_SOURCE_COLUMN) == (current_hash or source_hash(row)):
+        return Markup(stored)
+    return Markup(render_html(row.get(field, "")))
+
+
+def display_fields(row: dict) -> dict:
+    """Copy of row with every HTML field replaced by its display Markup."""
+    out = dict(row)
+    current_hash = source_hash(row)
+    for field in HTML_FIELDS:
+        out[field] = display_html(row, field, current_hash)
+    return out
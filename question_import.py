@@ -0,0 +1,341 @@
+# question_import.py - Streaming bulk question import from CSV / XLSX uploads
+#
+# questions_batch_add takes a JSON list built in the browser, which is fine
+# for a few dozen rows but not for a 20k-row spreadsheet. An import here runs
+# in a background thread: the upload is read IMPORT_CHUNK_ROWS rows at a time
+# (pandas' chunked CSV reader, openpyxl's read-only worksheet for XLSX), each
+# row is validated against the questions schema and question type rules, and
+# every error is reported with its spreadsheet row number. Valid rows are
+# appended to questions.csv in ONE compare-and-swap write at the end (ids
+# allocated as one block inside it), so a failed or half-read file never
+# leaves a partial import behind. Progress lives in a small JSON file under
+# STATE_DIR/imports so whichever worker serves the polling request can read it.
+
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    from openpyxl import load_workbook
+except ImportError:  # optional: CSV imports only
+    load_workbook = None
+
+import question_dedupe
+import question_search
+from coordination import STATE_DIR
+from drive_utils import safe_csv_update
+from google_drive_service import clear_cache
+from id_allocator import allocate_ids, max_existing_id
+from question_html import with_html
+
+IMPORT_DIR = os.path.join(STATE_DIR, "imports")
+IMPORT_CHUNK_ROWS = 500
+IMPORT_MAX_ERRORS = 200          # errors kept in the progress file (all are counted)
+IMPORT_JOB_TTL = 24 * 3600       # progress files / stale uploads older than this are removed
+IMPORT_EXTENSIONS = {".csv": "csv", ".xlsx": "xlsx"}
+
+QUESTION_TYPES = ("MCQ", "MSQ", "NUMERIC")
+OPTION_LETTERS = ("A", "B", "C", "D")
+IMPORT_FIELDS = (
+    "exam_id", "question_text", "option_a", "option_b", "option_c", "option_d",
+    "correct_answer", "question_type", "image_path", "positive_marks",
+    "negative_marks", "tolerance",
+)
+
+os.makedirs(IMPORT_DIR, exist_ok=True)
+
+
+def supported_kind(filename):
+    """"csv" / "xlsx" for an importable upload name, else None."""
+    kind = IMPORT_EXTENSIONS.get(os.path.splitext(filename or "")[1].lower())
+    if kind == "xlsx" and load_workbook is None:
+        return None
+    return kind
+
+
+def _progress_path(job_id):
+    return os.path.join(IMPORT_DIR, f"{job_id}.json")
+
+
+def _write_progress(state):
+    state["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    path = _progress_path(state["job_id"])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def get_progress(job_id):
+    """Progress dict of an import job, or None if unknown."""
+    if not job_id or not all(c in "0123456789abcdef" for c in job_id):
+        return None
+    try:
+        with open(_progress_path(job_id), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Unreadable import progress {job_id}: {e}")
+        return None
+
+
+def purge_old_jobs(upload_dir=None):
+    """Drop progress files (and leftover uploads) older than IMPORT_JOB_TTL."""
+    cutoff = time.time() - IMPORT_JOB_TTL
+    for folder in filter(None, (IMPORT_DIR, upload_dir)):
+        for name in os.listdir(folder):
+            if folder != IMPORT_DIR and not name.startswith("import_"):
+                continue
+            path = os.path.join(folder, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+# -------------------------------------------------------------------
+# Reading
+# -------------------------------------------------------------------
+def _column_name(value):
+    return str(value if value is not None else "").strip().lower().replace(" ", "_")
+
+
+def _cell(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))   # Excel stores 4 as 4.0
+    return str(value).strip()
+
+
+def _is_blank(values):
+    return not any(v not in (None, "") for v in values)
+
+
+def _csv_chunks(path):
+    """([(row number, row dict)], fraction read) per chunk of a CSV file."""
+    total = os.path.getsize(path) or 1
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        # blank lines are kept (and dropped below) so row numbers stay those of the file
+        reader = pd.read_csv(f, chunksize=IMPORT_CHUNK_ROWS, dtype=str,
+                             keep_default_na=False, skip_blank_lines=False)
+        row_number = 2  # row 1 is the header
+        for chunk in reader:
+            chunk.columns = [_column_name(c) for c in chunk.columns]
+            rows = [(row_number + offset, row) for offset, row in enumerate(chunk.to_dict("records"))
+                    if not _is_blank(row.values())]
+            yield rows, min(f.tell() / total, 1.0)
+            row_number += len(chunk)
+
+
+def _xlsx_chunks(path):
+    """([(row number, row dict)], fraction read) per chunk of the first sheet."""
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        total = max((sheet.max_row or 0) - 1, 1)
+        rows_iter = sheet.iter_rows(values_only=True)
+        header = [_column_name(c) for c in next(rows_iter, ())]
+        chunk, read = [], 0
+        for values in rows_iter:
+            read += 1
+            if _is_blank(values):
+                continue
+            chunk.append((read + 1, {h: _cell(v) for h, v in zip(header, values) if h}))
+            if len(chunk) >= IMPORT_CHUNK_ROWS:
+                yield chunk, min(read / total, 1.0)
+                chunk = []
+        if chunk:
+            yield chunk, 1.0
+    finally:
+        workbook.close()
+
+
+# -------------------------------------------------------------------
+# Validation
+# -------------------------------------------------------------------
+def _number(value, field, errors, default=None):
+    if value == "":
+        if default is None:
+            errors.append(f"{field} is required")
+        return default
+    try:
+        float(value)
+        return value
+    except ValueError:
+        errors.append(f"{field} must be a number (got {value!r})")
+        return None
+
+
+def validate_row(raw, default_exam_id=None, exam_ids=None):
+    """
+    Clean question row from one uploaded row, plus a list of error messages
+    (row is None when there are any).
+    """
+    raw = {k: _cell(v) for k, v in raw.items()}
+    errors = []
+
+    text = raw.get("question_text", "")
+    if not text:
+        errors.append("question_text is required")
+
+    exam_id = raw.get("exam_id") or (str(default_exam_id) if default_exam_id not in (None, "") else "")
+    try:
+        exam_id = int(float(exam_id))
+        if exam_ids is not None and exam_id not in exam_ids:
+            errors.append(f"exam_id {exam_id} does not exist")
+    except ValueError:
+        errors.append("exam_id is required" if not exam_id else f"exam_id must be an integer (got {exam_id!r})")
+
+    qtype = (raw.get("question_type") or "MCQ").upper()
+    if qtype not in QUESTION_TYPES:
+        errors.append(f"question_type must be one of {', '.join(QUESTION_TYPES)} (got {qtype!r})")
+
+    answer = raw.get("correct_answer", "").upper()
+    if not answer:
+        errors.append("correct_answer is required")
+    elif qtype == "NUMERIC":
+        _number(answer, "correct_answer", errors)
+    elif qtype in ("MCQ", "MSQ"):
+        letters = [a.strip() for a in answer.split(",") if a.strip()]
+        if qtype == "MCQ" and len(letters) != 1:
+            errors.append(f"MCQ correct_answer must be a single option letter (got {answer!r})")
+        bad = [a for a in letters if a not in OPTION_LETTERS]
+        if bad:
+            errors.append(f"correct_answer options must be A-D (got {', '.join(bad)})")
+        else:
+            empty = [a for a in letters if not raw.get(f"option_{a.lower()}")]
+            if empty:
+                errors.append(f"correct_answer refers to empty option(s) {', '.join(empty)}")
+            answer = ",".join(sorted(set(letters)))
+
+    positive = _number(raw.get("positive_marks", ""), "positive_marks", errors, default="4")
+    negative = _number(raw.get("negative_marks", ""), "negative_marks", errors, default="1")
+    tolerance = _number(raw.get("tolerance", ""), "tolerance", errors, default="")
+
+    if errors:
+        return None, errors
+    return with_html({
+        "exam_id": exam_id,
+        "question_text": text,
+        "option_a": raw.get("option_a", ""),
+        "option_b": raw.get("option_b", ""),
+        "option_c": raw.get("option_c", ""),
+        "option_d": raw.get("option_d", ""),
+        "correct_answer": answer,
+        "question_type": qtype,
+        "image_path": raw.get("image_path", ""),
+        "positive_marks": positive,
+        "negative_marks": negative,
+        "tolerance": tolerance if qtype == "NUMERIC" else "",
+    }), []
+
+
+# -------------------------------------------------------------------
+# Jobs
+# -------------------------------------------------------------------
+def _run(state, path, kind, default_exam_id, exam_ids, skip_duplicates, prepare_df):
+    valid = []
+    try:
+        state["status"] = "validating"
+        _write_progress(state)
+        chunks = _xlsx_chunks(path) if kind == "xlsx" else _csv_chunks(path)
+        for rows, fraction in chunks:
+            if rows and "question_text" not in rows[0][1]:
+                raise ValueError("the file has no question_text column "
+                                 f"(expected columns: {', '.join(IMPORT_FIELDS)})")
+            for row_number, raw in rows:
+                row, errors = validate_row(raw, default_exam_id, exam_ids)
+                if row is not None:
+                    valid.append(row)
+                    continue
+                state["invalid"] += 1
+                if len(state["errors"]) < IMPORT_MAX_ERRORS:
+                    state["errors"].append({"row": row_number, "messages": errors})
+            state["rows_read"] += len(rows)
+            state["valid"] = len(valid)
+            state["progress"] = round(fraction, 3)
+            _write_progress(state)
+
+        if skip_duplicates and valid:
+            flagged = {d["index"] for d in question_dedupe.check_items(valid)}
+            state["skipped_duplicates"] = len(flagged)
+            valid = [row for i, row in enumerate(valid) if i not in flagged]
+
+        if not valid:
+            state["status"] = "done"
+            state["message"] = "No valid rows to import"
+            return
+
+        state["status"] = "saving"
+        _write_progress(state)
+
+        def append_rows(qdf):
+            qdf = prepare_df(qdf)
+            next_id = allocate_ids("questions", len(valid), floor=max_existing_id(qdf))
+            for offset, row in enumerate(valid):
+                row["id"] = next_id + offset
+            return pd.concat([qdf, pd.DataFrame(valid)], ignore_index=True)
+
+        ok, info = safe_csv_update("questions", append_rows)
+        if not ok:
+            raise RuntimeError(f"saving questions failed ({info})")
+
+        question_search.apply_rows(valid)
+        question_dedupe.apply_rows(valid)
+        clear_cache()
+        state["added"] = len(valid)
+        state["status"] = "done"
+        print(f"📥 Question import {state['job_id']}: {len(valid)} added, "
+              f"{state['invalid']} invalid, {state['skipped_duplicates']} duplicate(s) skipped")
+    except Exception as e:
+        print(f"❌ Question import {state['job_id']} failed: {e}")
+        state["status"] = "failed"
+        state["message"] = str(e)
+    finally:
+        state["finished_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        _write_progress(state)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def start_import(path, filename, default_exam_id=None, exam_ids=None, skip_duplicates=False, prepare_df=None):
+    """
+    Import the saved upload at path in a background thread. prepare_df(df)
+    normalises the fresh questions table before rows are appended.
+    Returns the job id to poll with get_progress().
+    """
+    job_id = uuid.uuid4().hex
+    state = {
+        "job_id": job_id,
+        "filename": filename,
+        "status": "queued",
+        "rows_read": 0,
+        "valid": 0,
+        "invalid": 0,
+        "skipped_duplicates": 0,
+        "added": 0,
+        "progress": 0.0,
+        "errors": [],
+        "message": "",
+        "started_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "finished_at": None,
+    }
+    _write_progress(state)
+    threading.Thread(
+        target=_run,
+        args=(state, path, supported_kind(filename), default_exam_id, exam_ids,
+              skip_duplicates, prepare_df or (lambda df: df)),
+        name=f"question-import-{job_id[:8]}",
+        daemon=True,
+    ).start()
+    return job_id
@@ -0,0 +1,266 @@
+# question_search.py - Inverted index over the question bank for admin search
+#
+# questions_index could only filter by exam and list every row, so with a
+# few thousand questions admins could not find existing content to reuse.
+# This keeps token -> {question id: term frequency} postings over the
+# question text and options and ranks hits with BM25; a search touches only
+# the postings of the query terms, never questions.csv. Tokenising is
+# LaTeX-aware: $ delimiters are dropped, \commands become tokens of their own
+# ("\frac{x}{y}" -> frac, x, y) and words glued to markup are split out.
+# The last query term also matches as a prefix, for search-as-you-type.
+# Like the other indexes it is rebuilt once per questions.csv data version
+# and patched in place after this worker's own add / edit / delete.
+
+import bisect
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+SEARCH_FIELDS = ("question_text", "option_a", "option_b", "option_c", "option_d")
+TEXT_WEIGHT = 2             # stem matches outrank option-only matches
+BM25_K1 = 1.2
+BM25_B = 0.75
+PREFIX_EXPANSION_LIMIT = 50  # vocabulary terms one prefix may expand to
+SNIPPET_LENGTH = 160
+
+_TOKEN_RE = re.compile(r"\\([A-Za-z]+)|([0-9]+(?:\.[0-9]+)?)|([^\W\d_]+)", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this to was were which with".split()
+)
+
+_lock = threading.RLock()
+_postings = {}           # token -> {question id: weighted tf}
+_docs = {}               # question id -> {"exam_id", "question_type", "text", "length", "tokens"}
+_total_length = 0
+_vocab = None            # sorted token list for prefix lookups (None = rebuild lazily)
+_built_version = None    # bus version the index reflects (None = stale / never built)
+_loader = None           # () -> questions DataFrame
+_version_fn = None       # () -> current bus version for questions
+
+
+def configure(loader, version_fn):
+    """Register how to load questions and read its invalidation-bus version."""
+    global _loader, _version_fn
+    _loader = loader
+    _version_fn = version_fn
+
+
+def _norm_id(value):
+    try:
+        return str(int(float(str(value).strip())))
+    except (ValueError, TypeError):
+        return str(value).strip()
+
+
+def _current_version():
+    try:
+        return _version_fn() if _version_fn else 0
+    except Exception:
+        return None
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and value != value):
+        return ""
+    return str(value)
+
+
+def tokenize(text):
+    """Lower-case terms of text: words, numbers and LaTeX command names."""
+    tokens = []
+    for command, number, word in _TOKEN_RE.findall(_text(text)):
+        token = (command or number or word).lower()
+        if token and token not in _STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def _doc_terms(row):
+    terms = Counter()
+    for field in SEARCH_FIELDS:
+        weight = TEXT_WEIGHT if field == "question_text" else 1
+        for token in tokenize(row.get(field)):
+            terms[token] += weight
+    return terms
+
+
+def _add(row):
+    global _total_length, _vocab
+    qid = _norm_id(row.get("id"))
+    if not qid:
+        return
+    _remove(qid)
+    terms = _doc_terms(row)
+    length = sum(terms.values())
+    _docs[qid] = {
+        "exam_id": _norm_id(row.get("exam_id")),
+        "question_type": _text(row.get("question_type")),
+        "text": _text(row.get("question_text")),
+        "length": length,
+        "tokens": list(terms),
+    }
+    _total_length += length
+    for token, tf in terms.items():
+        if token not in _postings:
+            _vocab = None
+        _postings.setdefault(token, {})[qid] = tf
+
+
+def _remove(qid):
+    global _total_length, _vocab
+    doc = _docs.pop(qid, None)
+    if doc is None:
+        return
+    _total_length -= doc["length"]
+    for token in doc["tokens"]:
+        posting = _postings.get(token)
+        if posting is not None:
+            posting.pop(qid, None)
+            if not posting:
+                del _postings[token]
+                _vocab = None
+
+
+def rebuild():
+    """Rebuild the whole index from the questions table."""
+    global _postings, _docs, _total_length, _vocab, _built_version
+    with _lock:
+        version = _current_version()
+        started = time.time()
+        try:
+            df = _loader() if _loader else None
+        except Exception as e:
+            print(f"⚠️ question_search: load failed: {e}")
+            df = None
+
+        # a column-less frame is a failed read (Drive down / not initialised), not an empty bank
+        loaded = df is not None and "id" in df.columns
+        _postings, _docs, _total_length, _vocab = {}, {}, 0, None
+        if loaded and not df.empty:
+            for row in df.to_dict("records"):
+                _add(row)
+        _built_version = version if loaded else None
+        print(f"🔎 question_search rebuilt: {len(_docs)} questions, {len(_postings)} terms "
+              f"in {int((time.time() - started) * 1000)} ms (version {version})")
+
+
+def _ensure_fresh():
+    if _built_version is None or _built_version != _current_version():
+        rebuild()
+
+
+def _expand(term, is_last):
+    """Vocabulary terms a query term matches (exact, plus prefixes for the last term)."""
+    global _vocab
+    if not is_last:
+        return [term] if term in _postings else []
+    if _vocab is None:
+        _vocab = sorted(_postings)
+    matches = []
+    i = bisect.bisect_left(_vocab, term)
+    while i < len(_vocab) and _vocab[i].startswith(term) and len(matches) < PREFIX_EXPANSION_LIMIT:
+        matches.append(_vocab[i])
+        i += 1
+    return matches
+
+
+def search(query, exam_id=None, page=1, per_page=20):
+    """
+    Ranked questions matching query (every term must match; the last one as a
+    prefix). Returns {"results": [...], "total", "page", "per_page", "took_ms"}.
+    """
+    started = time.time()
+    page, per_page = max(1, int(page)), max(1, min(100, int(per_page)))
+    terms = list(dict.fromkeys(tokenize(query)))
+    exam_key = _norm_id(exam_id) if exam_id not in (None, "") else None
+
+    with _lock:
+        _ensure_fresh()
+        n_docs = len(_docs)
+        avg_length = (_total_length / n_docs) if n_docs else 0
+        scores = None
+        for i, term in enumerate(terms):
+            term_scores = {}
+            for token in _expand(term, i == len(terms) - 1):
+                posting = _postings[token]
+                idf = math.log(1 + (n_docs - len(posting) + 0.5) / (len(posting) + 0.5))
+                for qid, tf in posting.items():
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * _docs[qid]["length"] / (avg_length or 1))
+                    s = idf * tf * (BM25_K1 + 1) / (tf + norm)
+                    if s > term_scores.get(qid, 0):
+                        term_scores[qid] = s
+            # AND semantics: keep only questions that matched every term so far
+            scores = term_scores if scores is None else {
+                qid: scores[qid] + s for qid, s in term_scores.items() if qid in scores
+            }
+            if not scores:
+                break
+        scores = scores or {}
+        if exam_key is not None:
+            scores = {qid: s for qid, s in scores.items() if _docs[qid]["exam_id"] == exam_key}
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], int(item[0]) if item[0].isdigit() else 0))
+        start = (page - 1) * per_page
+        results = []
+        for qid, score in ranked[start:start + per_page]:
+            doc = _docs[qid]
+            text = doc["text"]
+            results.append({
+                "id": int(qid) if qid.isdigit() else qid,
+                "exam_id": int(doc["exam_id"]) if doc["exam_id"].isdigit() else doc["exam_id"],
+                "question_type": doc["question_type"],
+                "score": round(score, 4),
+                "snippet": text if len(text) <= SNIPPET_LENGTH else text[:SNIPPET_LENGTH].rstrip() + "…",
+            })
+
+    return {
+        "results": results,
+        "total": len(ranked),
+        "page": page,
+        "per_page": per_page,
+        "took_ms": round((time.time() - started) * 1000, 2),
+    }
+
+
+def _patch(apply):
+    """Run apply() on the index if it is exactly one write behind, else mark it stale."""
+    global _built_version
+    with _lock:
+        if _built_version is None:
+            return
+        current = _current_version()
+        if current is None or current != _built_version + 1:
+            _built_version = None
+            return
+        apply()
+        _built_version = current
+
+
+def apply_rows(rows):
+    """Patch the index after THIS worker added or edited question rows."""
+    _patch(lambda: [_add(dict(row)) for row in rows])
+
+
+def remove_ids(ids):
+    """Patch the index after THIS worker deleted questions."""
+    _patch(lambda: [_remove(_norm_id(qid)) for qid in ids])
+
+
+def warm():
+    """Build the index now (if stale) so the first search doesn't pay for it."""
+    with _lock:
+        _ensure_fresh()
+
+
+def invalidate():
+    global _built_version
+    with _lock:
+        _built_version = None
+
+
+def get_search_stats():
+    """Snapshot for debug endpoints"""
+    with _lock:
+        return {"questions": len(_docs), "terms": len(_postings), "version": _built_version}
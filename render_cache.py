@@ -0,0 +1,151 @@
+# render_cache.py - Rendered page cache with ETag / 304 revalidation
+#
+# The dashboard, results history, exam instructions and the admin listing
+# pages were rebuilt and re-rendered on every hit even when none of the data
+# behind them had changed, which is most of the navigation during an exam.
+# cached_page() wraps such a view: the rendered HTML is kept per worker keyed
+# by the page (path + query), the viewer (ids / names the layout prints) and
+# the bus versions of the tables the page reads. A repeat visit is served
+# from memory; a browser that already holds the same HTML gets a 304 without
+# the body. Any save bumps a version, so stale pages are never served.
+# Pages that carry flashed messages are neither served from nor stored in
+# the cache (the flash would be replayed or lost).
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import g, make_response, message_flashed, request, session
+
+RENDER_CACHE_TTL = 300                  # safety net on top of version keys
+RENDER_CACHE_MAX_ENTRIES = 2000
+RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+VIEWER_KEYS = ("user_id", "admin_id", "full_name", "admin_name", "username")
+
+_lock = threading.Lock()
+_entries = OrderedDict()                # key -> (etag, html, stored_at)
+_bytes = 0
+_stats = {"hits": 0, "misses": 0, "not_modified": 0, "bypassed": 0, "evicted": 0}
+
+
+def _note_flash(sender, message, category, **extra):
+    g._render_cache_flashed = True
+
+
+message_flashed.connect(_note_flash)
+
+
+def _count(key):
+    with _lock:
+        _stats[key] += 1
+
+
+def _viewer():
+    return tuple(str(session.get(k, "")) for k in VIEWER_KEYS)
+
+
+def _cache_key(versions):
+    return (request.path, request.query_string, _viewer(), tuple(versions))
+
+
+def _etag(html):
+    return hashlib.sha1(html.encode("utf-8")).hexdigest()
+
+
+def _lookup(key):
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None:
+            return None
+        if time.time() - entry[2] > RENDER_CACHE_TTL:
+            _drop(key)
+            return None
+        _entries.move_to_end(key)
+        return entry
+
+
+def _drop(key):
+    global _bytes
+    entry = _entries.pop(key, None)
+    if entry is not None:
+        _bytes -= len(entry[1])
+
+
+def _store(key, etag, html):
+    global _bytes
+    with _lock:
+        _drop(key)
+        _entries[key] = (etag, html, time.time())
+        _bytes += len(html)
+        while _entries and (len(_entries) > RENDER_CACHE_MAX_ENTRIES or _bytes > RENDER_CACHE_MAX_BYTES):
+            _drop(next(iter(_entries)))
+            _stats["evicted"] += 1
+
+
+def _respond(etag, html):
+    # weak match: compression.py marks the ETag of compressed bodies weak
+    if request.if_none_match.contains_weak(etag):
+        _count("not_modified")
+        response = make_response("", 304)
+    else:
+        response = make_response(html)
+    response.set_etag(etag)
+    # private: per-user HTML; no-cache: browsers must revalidate (cheap 304s)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
+
+
+def cached_page(versions):
+    """
+    Decorator for GET views that return render_template() output.
+    versions() -> tuple of bus versions of everything the page reads; it is
+    called on every hit, so it must be cheap (coordination.current_version).
+    Redirects and other non-HTML returns pass through untouched.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != "GET" or session.get("_flashes"):
+                _count("bypassed")
+                return view(*args, **kwargs)
+
+            try:
+                key = _cache_key(versions())
+            except Exception as e:
+                print(f"⚠️ render_cache: version lookup failed: {e}")
+                _count("bypassed")
+                return view(*args, **kwargs)
+
+            entry = _lookup(key)
+            if entry is not None:
+                _count("hits")
+                return _respond(entry[0], entry[1])
+
+            _count("misses")
+            result = view(*args, **kwargs)
+            if not isinstance(result, str) or g.get("_render_cache_flashed"):
+                return result
+            etag = _etag(result)
+            _store(key, etag, result)
+            return _respond(etag, result)
+        return wrapper
+    return decorator
+
+
+def clear_render_cache():
+    global _bytes
+    with _lock:
+        _entries.clear()
+        _bytes = 0
+
+
+def get_render_cache_stats():
+    """Snapshot for debug endpoints"""
+    with _lock:
+        stats = dict(_stats)
+        stats.update({"entries": len(_entries), "bytes": _bytes})
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else None
+    return stats
@@ -0,0 +1,179 @@
+# responses_index.py - responses.csv partitioned by result_id
+#
+# responses.csv grows by one row per question per submission and is the
+# largest table, yet the response page, the PDF / TXT exports and the admin
+# view-responses pages each show a single attempt - and each of them masked
+# the whole table (often through astype('Int64') copies) to find its rows.
+# The index keeps the table with a result_id -> row positions map, built with
+# one groupby per data version, and hands out only the requested attempt's
+# rows. Rows saved by this worker are kept in a small side table until the
+# next rebuild instead of re-reading the whole file. Responses of archived
+# exams (see shards.py) get their own partition, rebuilt only when the shard
+# manifest changes, so hot rebuilds stay proportional to the hot file.
+
+import threading
+
+import pandas as pd
+
+_lock = threading.RLock()
+_frame = None            # responses DataFrame the positions refer to
+_positions = {}          # result_id -> row positions in _frame
+_extra = {}              # result_id -> DataFrame of rows saved by this worker since the build
+_built_version = None    # bus version the index reflects (None = stale / never built)
+_loader = None           # () -> responses DataFrame
+_version_fn = None       # () -> current bus version for responses
+_cold_frame = None       # archived responses DataFrame
+_cold_positions = {}     # result_id -> row positions in _cold_frame
+_cold_built = None       # cold version the cold partition reflects
+_cold_loader = None      # () -> archived responses DataFrame
+_cold_version_fn = None  # () -> version of the archived set
+
+
+def configure(loader, version_fn, cold_loader=None, cold_version_fn=None):
+    """Register how to load responses and read its invalidation-bus version."""
+    global _loader, _version_fn, _cold_loader, _cold_version_fn
+    _loader = loader
+    _version_fn = version_fn
+    _cold_loader = cold_loader
+    _cold_version_fn = cold_version_fn
+
+
+def _norm_id(value):
+    """'5', 5, 5.0 and ' 5 ' all index the same result."""
+    try:
+        return str(int(float(str(value).strip())))
+    except (ValueError, TypeError):
+        return str(value).strip()
+
+
+def _current_version(fn=None):
+    fn = fn or _version_fn
+    try:
+        return fn() if fn else 0
+    except Exception:
+        return None
+
+
+def _partition(df):
+    """(frame, result_id -> row positions) for a responses DataFrame."""
+    positions = {}
+    if df is not None and not df.empty and 'result_id' in df.columns:
+        df = df.reset_index(drop=True)
+        for key, rows in df.groupby('result_id', sort=False, dropna=True).indices.items():
+            norm = _norm_id(key)
+            positions[norm] = rows if norm not in positions else sorted([*positions[norm], *rows])
+    return df, positions
+
+
+def _loaded(df, cold=False):
+    """
+    Whether df is a real read of the responses table: Drive down / not
+    initialised comes back as an empty frame without columns, which must not
+    be cached as "no responses". (An empty archive is legitimately column-less.)
+    """
+    if df is None:
+        return False
+    if cold and not len(df.columns):
+        return True
+    return 'result_id' in df.columns
+
+
+def rebuild():
+    """Rebuild the partition map from the responses table."""
+    global _frame, _positions, _extra, _built_version
+    with _lock:
+        version = _current_version()
+        try:
+            df = _loader() if _loader else None
+        except Exception as e:
+            print(f"⚠️ responses_index: load failed: {e}")
+            df = None
+
+        _frame, _positions = _partition(df)
+        _extra = {}
+        _built_version = version if _loaded(df) else None
+        print(f"🔧 responses_index rebuilt: {len(_positions)} results (version {version})")
+
+
+def rebuild_cold():
+    """Rebuild the archived partition (only needed when the shard manifest changed)."""
+    global _cold_frame, _cold_positions, _cold_built
+    with _lock:
+        version = _current_version(_cold_version_fn)
+        try:
+            df = _cold_loader() if _cold_loader else None
+        except Exception as e:
+            print(f"⚠️ responses_index: cold load failed: {e}")
+            df = None
+        _cold_frame, _cold_positions = _partition(df)
+        _cold_built = version if _loaded(df, cold=True) else None
+        print(f"🧊 responses_index cold partition: {len(_cold_positions)} results (version {version})")
+
+
+def _ensure_fresh():
+    if _cold_loader is not None and (_cold_built is None or _cold_built != _current_version(_cold_version_fn)):
+        rebuild_cold()
+    if _built_version is None or _built_version != _current_version():
+        rebuild()
+
+
+def get_responses(result_id, exam_id=None):
+    """
+    Response rows of one result as a DataFrame (same columns as responses.csv,
+    sorted by question_id), optionally restricted to exam_id. Empty if none.
+    """
+    key = _norm_id(result_id)
+    with _lock:
+        _ensure_fresh()
+        frame = _frame
+        parts = []
+        if frame is not None and key in _positions:
+            parts.append(frame.iloc[_positions[key]])
+        if key in _extra:
+            parts.append(_extra[key])
+        if not parts and _cold_frame is not None and key in _cold_positions:
+            # an attempt lives entirely in one place: hot until its exam is archived
+            parts.append(_cold_frame.iloc[_cold_positions[key]])
+    if not parts:
+        return pd.DataFrame(columns=frame.columns if frame is not None else None)
+    rows = parts[0].copy() if len(parts) == 1 else pd.concat(parts, ignore_index=True)
+    if exam_id is not None and 'exam_id' in rows.columns:
+        rows = rows[rows['exam_id'].map(_norm_id) == _norm_id(exam_id)]
+    if 'question_id' in rows.columns:
+        rows = rows.sort_values('question_id', kind='stable')
+    return rows
+
+
+def apply_rows(rows):
+    """
+    Patch the index after THIS worker saved response rows.
+    If anything else was written since the index was built, mark it stale instead.
+    """
+    global _built_version
+    with _lock:
+        if _built_version is None:
+            return
+        current = _current_version()
+        if current is None or current != _built_version + 1:
+            _built_version = None
+            return
+        new_rows = pd.DataFrame(list(rows))
+        if not new_rows.empty and 'result_id' in new_rows.columns:
+            for key, part in new_rows.groupby(new_rows['result_id'].map(_norm_id), sort=False):
+                previous = _extra.get(key)
+                part = part.reset_index(drop=True)
+                _extra[key] = part if previous is None else pd.concat([previous, part], ignore_index=True)
+        _built_version = current
+
+
+def warm():
+    """Build the index now (if stale) so the first lookup doesn't pay for it."""
+    with _lock:
+        _ensure_fresh()
+
+
+def invalidate():
+    global _built_version, _cold_built
+    with _lock:
+        _built_version = None
+        _cold_built = None
@@ -0,0 +1,243 @@
+# results_index.py - Per-student result history keyed by (student_id, exam_id)
+#
+# dashboard() re-filtered the whole results table once per completed exam and
+# results_history merged a student's results with all of exams.csv and
+# iterrows'd through them, so both pages got slower as platform history grew.
+# The index groups results by student then exam (oldest -> newest), with the
+# exam name denormalised into every entry. Like attempts_index it is rebuilt
+# once per data version and patched in place after this worker's own submit,
+# so both pages are dictionary reads over one student's results.
+# Results of archived exams (see shards.py) live in a separate cold partition
+# that is only rebuilt when the shard manifest changes; lookups merge the two.
+
+import threading
+from datetime import datetime
+
+_lock = threading.RLock()
+_by_student = {}         # student_id -> {exam_id: [result row, ...] oldest first}
+_cold_by_student = {}    # same, for archived results
+_exam_names = {}         # exam_id -> name
+_built_version = None    # bus version of results the index reflects (None = stale)
+_names_version = None    # bus version of exams the denormalised names reflect
+_next_seq = 0            # insertion order, breaks completed_at ties
+_loader = None           # () -> results DataFrame
+_exams_loader = None     # () -> exams DataFrame
+_version_fn = None       # () -> current bus version for results
+_exams_version_fn = None  # () -> current bus version for exams
+_cold_built = None       # cold version the cold partition reflects
+_cold_loader = None      # () -> archived results DataFrame
+_cold_version_fn = None  # () -> version of the archived set
+
+
+def configure(loader, exams_loader, version_fn, exams_version_fn, cold_loader=None, cold_version_fn=None):
+    """Register how to load results / exams and read their invalidation-bus versions."""
+    global _loader, _exams_loader, _version_fn, _exams_version_fn, _cold_loader, _cold_version_fn
+    _loader = loader
+    _exams_loader = exams_loader
+    _version_fn = version_fn
+    _exams_version_fn = exams_version_fn
+    _cold_loader = cold_loader
+    _cold_version_fn = cold_version_fn
+
+
+def _norm_id(value):
+    """'5', 5, 5.0 and ' 5 ' all index the same student / exam."""
+    try:
+        return str(int(float(str(value).strip())))
+    except (ValueError, TypeError):
+        return str(value).strip()
+
+
+def _version(fn):
+    try:
+        return fn() if fn else 0
+    except Exception:
+        return None
+
+
+def _parse_completed(value):
+    try:
+        return datetime.strptime(str(value), "%Y-%m-%d %H:%M:%S")
+    except Exception:
+        return datetime.min
+
+
+def _sort_key(row):
+    return (_parse_completed(row.get("completed_at", "")), row.get("_seq", 0))
+
+
+def _exam_name(exam_id):
+    return _exam_names.get(exam_id) or f"Exam {exam_id}"
+
+
+def _refresh_exam_names():
+    """Reload exam names and re-stamp them on every entry (only when exams.csv changed)."""
+    global _exam_names, _names_version
+    version = _version(_exams_version_fn)
+    if _names_version is not None and version == _names_version:
+        return
+    try:
+        exams_df = _exams_loader() if _exams_loader else None
+    except Exception as e:
+        print(f"⚠️ results_index: exams load failed: {e}")
+        exams_df = None
+    names = {}
+    if exams_df is not None and not exams_df.empty and "id" in exams_df.columns and "name" in exams_df.columns:
+        for exam_id, name in zip(exams_df["id"].tolist(), exams_df["name"].tolist()):
+            if isinstance(name, str) and name:
+                names[_norm_id(exam_id)] = name
+    _exam_names = names
+    _names_version = version if exams_df is not None else None
+    for index in (_by_student, _cold_by_student):
+        for exams in index.values():
+            for exam_id, rows in exams.items():
+                for row in rows:
+                    row["exam_name"] = _exam_name(exam_id)
+
+
+def _add_row(index, row):
+    """Append row to its (student, exam) list; returns that list (caller sorts)."""
+    global _next_seq
+    row = dict(row)
+    row["_seq"] = _next_seq
+    _next_seq += 1
+    sid, eid = _norm_id(row.get("student_id")), _norm_id(row.get("exam_id"))
+    row["exam_name"] = _exam_name(eid)
+    rows = index.setdefault(sid, {}).setdefault(eid, [])
+    rows.append(row)
+    return rows
+
+
+def _loaded(df, cold=False):
+    """
+    Whether df is a real read of the results table: Drive down / not initialised
+    comes back as an empty frame without columns, which must not be cached as
+    "no results". (An archive with nothing in it is legitimately column-less.)
+    """
+    if df is None:
+        return False
+    if cold and not len(df.columns):
+        return True
+    return "student_id" in df.columns and "exam_id" in df.columns
+
+
+def _build(df):
+    index = {}
+    if _loaded(df) and not df.empty:
+        for row in df.to_dict("records"):
+            _add_row(index, row)
+        for exams in index.values():
+            for rows in exams.values():
+                rows.sort(key=_sort_key)
+    return index
+
+
+def rebuild():
+    """Rebuild the whole index from the results table."""
+    global _by_student, _built_version
+    with _lock:
+        version = _version(_version_fn)
+        try:
+            df = _loader() if _loader else None
+        except Exception as e:
+            print(f"⚠️ results_index: load failed: {e}")
+            df = None
+
+        _refresh_exam_names()
+        _by_student = _build(df)
+        _built_version = version if _loaded(df) else None
+        print(f"🔧 results_index rebuilt: {len(_by_student)} students (version {version})")
+
+
+def rebuild_cold():
+    """Rebuild the archived partition (only needed when the shard manifest changed)."""
+    global _cold_by_student, _cold_built
+    with _lock:
+        version = _version(_cold_version_fn)
+        try:
+            df = _cold_loader() if _cold_loader else None
+        except Exception as e:
+            print(f"⚠️ results_index: cold load failed: {e}")
+            df = None
+        _refresh_exam_names()
+        _cold_by_student = _build(df)
+        _cold_built = version if _loaded(df, cold=True) else None
+        print(f"🧊 results_index cold partition: {len(_cold_by_student)} students (version {version})")
+
+
+def _ensure_fresh():
+    if _cold_loader is not None and (_cold_built is None or _cold_built != _version(_cold_version_fn)):
+        rebuild_cold()
+    if _built_version is None or _built_version != _version(_version_fn):
+        rebuild()
+    else:
+        _refresh_exam_names()
+
+
+def _exam_rows(sid, eid):
+    """Hot + archived rows of one (student, exam), oldest first; hot wins on the same id."""
+    hot = _by_student.get(sid, {}).get(eid, [])
+    cold = _cold_by_student.get(sid, {}).get(eid)
+    if not cold:
+        return hot
+    hot_ids = {_norm_id(r.get("id")) for r in hot}
+    rows = [r for r in cold if _norm_id(r.get("id")) not in hot_ids] + hot
+    rows.sort(key=_sort_key)
+    return rows
+
+
+def get_latest_result(student_id, exam_id):
+    """Newest result row of one student for one exam, or None."""
+    with _lock:
+        _ensure_fresh()
+        rows = _exam_rows(_norm_id(student_id), _norm_id(exam_id))
+        return dict(rows[-1]) if rows else None
+
+
+def get_exam_results(student_id, exam_id):
+    """All result rows of one student for one exam, oldest first."""
+    with _lock:
+        _ensure_fresh()
+        return [dict(r) for r in _exam_rows(_norm_id(student_id), _norm_id(exam_id))]
+
+
+def get_student_results(student_id):
+    """Every result row of one student, newest first (exam_name included)."""
+    with _lock:
+        _ensure_fresh()
+        sid = _norm_id(student_id)
+        exam_ids = set(_by_student.get(sid, {})) | set(_cold_by_student.get(sid, {}))
+        rows = [dict(r) for eid in exam_ids for r in _exam_rows(sid, eid)]
+    rows.sort(key=_sort_key, reverse=True)
+    return rows
+
+
+def apply_rows(rows):
+    """
+    Patch the index after THIS worker saved new result rows.
+    If anything else was written since the index was built, mark it stale instead.
+    """
+    global _built_version
+    with _lock:
+        if _built_version is None:
+            return
+        current = _version(_version_fn)
+        if current is None or current != _built_version + 1:
+            _built_version = None
+            return
+        for row in rows:
+            _add_row(_by_student, row).sort(key=_sort_key)
+        _built_version = current
+
+
+def warm():
+    """Build the index now (if stale) so the first lookup doesn't pay for it."""
+    with _lock:
+        _ensure_fresh()
+
+
+def invalidate():
+    global _built_version, _cold_built
+    with _lock:
+        _built_version = None
+        _cold_built = None
@@ -0,0 +1,202 @@
+# scheduler.py - One background scheduler for all periodic maintenance jobs
+#
+# Replaces the self re-arming threading.Timer chains (one new thread per tick,
+# no coordination between gunicorn workers, no visibility). Jobs are
+# registered by name with an interval and run from a single daemon thread:
+#   * jitter spreads the workers' ticks so they don't all fire together
+#   * leader jobs (shared state: sessions.json, snapshots, warm-up) run on one
+#     worker per interval host-wide - a non-blocking cross-process lock plus a
+#     last-run stamp in the shared state dir; per-worker jobs (in-memory caches)
+#     run everywhere
+#   * every job keeps run/failure/skip counts and duration metrics
+
+import heapq
+import json
+import os
+import random
+import threading
+import time
+
+from coordination import STATE_DIR, _safe_name, get_process_lock
+
+JOBS_DIR = os.path.join(STATE_DIR, "jobs")
+DEFAULT_JITTER = 0.1  # +/- 10% of the interval
+
+try:
+    os.makedirs(JOBS_DIR, exist_ok=True)
+except Exception as e:
+    print(f"⚠️ Could not create jobs dir {JOBS_DIR}: {e}")
+
+_lock = threading.RLock()
+_wakeup = threading.Condition(_lock)
+_jobs = {}        # name -> job dict
+_queue = []       # heap of (next_run, seq, name)
+_seq = 0
+_thread = None
+_thread_pid = None
+
+
+def register_job(name, func, interval, leader=False, jitter=DEFAULT_JITTER, initial_delay=None):
+    """
+    Schedule func() every `interval` seconds under `name` (re-registering replaces it).
+    leader=True: run on only one worker per interval across the host.
+    initial_delay: seconds before the first run (default: one jittered interval).
+    """
+    global _seq
+    with _lock:
+        _jobs[name] = {
+            "name": name,
+            "func": func,
+            "interval": float(interval),
+            "leader": bool(leader),
+            "jitter": float(jitter),
+            "running": False,
+            "metrics": {
+                "runs": 0,
+                "failures": 0,
+                "skipped": 0,
+                "last_started": None,
+                "last_success": None,
+                "last_duration_ms": None,
+                "avg_duration_ms": None,
+                "max_duration_ms": None,
+                "last_error": None,
+            },
+        }
+        delay = _jittered(interval, jitter) if initial_delay is None else float(initial_delay)
+        _seq += 1
+        _jobs[name]["token"] = _seq  # older heap entries for this name are dropped
+        heapq.heappush(_queue, (time.time() + delay, _seq, name))
+        _wakeup.notify()
+
+
+def _jittered(interval, jitter):
+    return max(1.0, interval * (1 + random.uniform(-jitter, jitter)))
+
+
+def _stamp_path(name):
+    return os.path.join(JOBS_DIR, f"{_safe_name(name)}.json")
+
+
+def _read_stamp(name):
+    try:
+        with open(_stamp_path(name), "r") as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+
+def _write_stamp(name, data):
+    path = _stamp_path(name)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _record(job, started, error=None):
+    duration_ms = round((time.time() - started) * 1000, 1)
+    m = job["metrics"]
+    m["runs"] += 1
+    m["last_duration_ms"] = duration_ms
+    m["avg_duration_ms"] = duration_ms if m["avg_duration_ms"] is None else round(m["avg_duration_ms"] * 0.8 + duration_ms * 0.2, 1)
+    m["max_duration_ms"] = duration_ms if m["max_duration_ms"] is None else max(m["max_duration_ms"], duration_ms)
+    if error is None:
+        m["last_success"] = time.time()
+    else:
+        m["failures"] += 1
+        m["last_error"] = f"{type(error).__name__}: {error}"
+
+
+def run_job(name):
+    """Run one job now (respecting leader election). Returns True if it ran."""
+    with _lock:
+        job = _jobs.get(name)
+        if job is None or job["running"]:
+            if job is not None:
+                job["metrics"]["skipped"] += 1
+            return False
+        job["running"] = True
+
+    lock = None
+    try:
+        if job["leader"]:
+            lock = get_process_lock(f"job_{name}")
+            if not lock.acquire(blocking=False):
+                job["metrics"]["skipped"] += 1
+                lock = None
+                return False
+            # Another worker already ran it this interval
+            last = float(_read_stamp(name).get("last_run", 0))
+            if time.time() - last < job["interval"] * 0.5:
+                job["metrics"]["skipped"] += 1
+                return False
+
+        started = time.time()
+        job["metrics"]["last_started"] = started
+        try:
+            job["func"]()
+            _record(job, started)
+        except Exception as e:
+            _record(job, started, e)
+            print(f"❌ Job '{name}' failed: {e}")
+
+        if job["leader"]:
+            try:
+                _write_stamp(name, {"last_run": started, "pid": os.getpid()})
+            except Exception as e:
+                print(f"⚠️ Could not stamp job '{name}': {e}")
+        return True
+    finally:
+        if lock is not None:
+            lock.release()
+        with _lock:
+            job["running"] = False
+
+
+def _loop():
+    global _seq
+    while True:
+        with _lock:
+            while not _queue or _queue[0][0] > time.time():
+                timeout = (_queue[0][0] - time.time()) if _queue else None
+                _wakeup.wait(timeout)
+            _, token, name = heapq.heappop(_queue)
+            job = _jobs.get(name)
+            if job is None or job["token"] != token:
+                continue
+            _seq += 1
+            job["token"] = _seq
+            heapq.heappush(_queue, (time.time() + _jittered(job["interval"], job["jitter"]), _seq, name))
+
+        # Each run gets its own thread so a slow job never delays the others
+        threading.Thread(target=run_job, args=(name,), name=f"job-{name}", daemon=True).start()
+
+
+def start_scheduler():
+    """Start the scheduler thread (again, if this process was forked after it started)."""
+    global _thread, _thread_pid
+    with _lock:
+        if _thread is not None and _thread.is_alive() and _thread_pid == os.getpid():
+            return
+        _thread = threading.Thread(target=_loop, name="maintenance-scheduler", daemon=True)
+        _thread_pid = os.getpid()
+        _thread.start()
+        print(f"🔧 Maintenance scheduler started with {len(_jobs)} job(s): {sorted(_jobs)}")
+
+
+def get_job_stats():
+    """Per-job metrics for debug endpoints"""
+    with _lock:
+        next_runs = {}
+        for when, token, name in _queue:
+            if name in _jobs and _jobs[name]["token"] == token:
+                next_runs[name] = when
+        return {
+            name: dict(job["metrics"],
+                       interval=job["interval"],
+                       leader=job["leader"],
+                       running=job["running"],
+                       next_run_in=round(next_runs[name] - time.time(), 1) if name in next_runs else None)
+            for name, job in _jobs.items()
+        }
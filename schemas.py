@@ -0,0 +1,201 @@
+# schemas.py - Typed table schemas shared by the Drive loader and the routes
+#
+# Every table is normalised ONCE when it is parsed (ids -> int64, statuses ->
+# stripped lower-case text) and tagged in df.attrs, so the routes can compare
+# native values (df['student_id'] == 5, df['status'] == 'completed') instead of
+# allocating df[col].astype(str) / .str.lower() copies on every request.
+# Frames that already carry the tag (cached copies, slices) skip the work.
+
+import os
+
+import numpy as np
+import pandas as pd
+
+SCHEMA_VERSION = 1
+
+# file id env var per table, so every caller of load_csv_from_drive gets typed frames
+TABLE_FILE_ENV = {
+    "users": "USERS_FILE_ID",
+    "exams": "EXAMS_FILE_ID",
+    "questions": "QUESTIONS_FILE_ID",
+    "results": "RESULTS_FILE_ID",
+    "responses": "RESPONSES_FILE_ID",
+    "exam_attempts": "EXAM_ATTEMPTS_FILE_ID",
+    "requests_raised": "REQUESTS_RAISED_FILE_ID",
+    "subjects": "SUBJECTS_FILE_ID",
+}
+
+# column -> "int" | "float" | "status" | "category" | "str"
+#   int/float: numeric after parsing when no value would be lost (ints without gaps -> int64)
+#   status:    stripped lower-case text; plain object dtype because routes assign new values in place
+#   category:  low-cardinality columns that are only read or appended to
+#   str:       free text / answers / timestamps, never inferred as numbers or dates
+TABLE_SCHEMAS = {
+    "users": {
+        "id": "int", "username": "str", "email": "str", "full_name": "str",
+        "password": "str", "role": "str", "created_at": "str", "updated_at": "str",
+    },
+    "exams": {
+        "id": "int", "name": "str", "date": "str", "start_time": "str",
+        "duration": "int", "total_questions": "int", "status": "str",
+        "instructions": "str", "max_attempts": "int",
+    },
+    "questions": {
+        "id": "int", "exam_id": "int", "question_text": "str",
+        "option_a": "str", "option_b": "str", "option_c": "str", "option_d": "str",
+        "correct_answer": "str", "question_type": "str", "image_path": "str",
+        "question_text_html": "str", "option_a_html": "str", "option_b_html": "str",
+        "option_c_html": "str", "option_d_html": "str", "html_source": "str",
+    },
+    "results": {
+        "id": "int", "student_id": "int", "exam_id": "int",
+        "score": "float", "total_questions": "int", "correct_answers": "int",
+        "incorrect_answers": "int", "unanswered_questions": "int",
+        "max_score": "float", "percentage": "float", "grade": "category",
+        "time_taken_minutes": "float", "completed_at": "str",
+    },
+    "responses": {
+        "id": "int", "result_id": "int", "exam_id": "int", "question_id": "int",
+        "given_answer": "str", "correct_answer": "str",
+        "marks_obtained": "float", "question_type": "category",
+    },
+    "exam_attempts": {
+        "id": "int", "student_id": "int", "exam_id": "int", "attempt_number": "int",
+        "status": "status", "start_time": "str", "end_time": "str",
+    },
+    "requests_raised": {
+        "request_id": "int", "username": "str", "email": "str",
+        "current_access": "str", "requested_access": "str", "request_date": "str",
+        "request_status": "status", "reason": "str", "processed_by": "str",
+        "processed_date": "str",
+    },
+    "subjects": {
+        "id": "int", "subject_name": "str", "subject_folder_id": "str",
+        "subject_folder_created_at": "str",
+    },
+}
+
+# dtypes the parser can apply directly; the rest are handled by normalize()
+PARSE_DTYPES = {"str": str, "status": str, "category": "category"}
+
+
+def table_for_file_id(file_id: str) -> str | None:
+    """Table name configured for a Drive file id (None for ad-hoc files)."""
+    if not file_id:
+        return None
+    for table, env_name in TABLE_FILE_ENV.items():
+        if os.environ.get(env_name) == file_id:
+            return table
+    return None
+
+
+def table_for_filename(filename: str) -> str | None:
+    """'exam_attempts.csv' -> 'exam_attempts' (None if the table has no schema)."""
+    table = os.path.splitext(os.path.basename(str(filename or "")))[0]
+    return table if table in TABLE_SCHEMAS else None
+
+
+def parse_dtypes(table: str | None) -> dict:
+    """dtype= mapping for pd.read_csv / pyarrow column types of a table."""
+    schema = TABLE_SCHEMAS.get(table, {})
+    return {col: PARSE_DTYPES[kind] for col, kind in schema.items() if kind in PARSE_DTYPES}
+
+
+def _coerce_numeric(series: pd.Series, kind: str) -> pd.Series:
+    """int/float conversion that keeps the column as-is if any value would turn into NaN."""
+    if pd.api.types.is_bool_dtype(series):
+        return series
+    if not pd.api.types.is_numeric_dtype(series):
+        stripped = series.str.strip() if series.dtype == object else series
+        converted = pd.to_numeric(stripped.replace("", np.nan), errors="coerce")
+        if converted.isna().sum() != series.replace("", np.nan).isna().sum():
+            return series
+        series = converted
+    if kind == "float":
+        return series
+    # int columns with gaps stay float64 (same as pandas' own inference)
+    if pd.api.types.is_float_dtype(series) and not series.isna().any() and (series % 1 == 0).all():
+        return series.astype("int64")
+    return series
+
+
+def _normalize_status(series: pd.Series) -> pd.Series:
+    if pd.api.types.is_numeric_dtype(series):
+        return series
+    mask = series.notna()
+    out = series.astype(object)
+    out[mask] = out[mask].astype(str).str.strip().str.lower()
+    return out
+
+
+def is_normalized(df, table: str) -> bool:
+    try:
+        return df.attrs.get("schema") == (table, SCHEMA_VERSION)
+    except AttributeError:
+        return False
+
+
+def normalize(df: pd.DataFrame, table: str | None) -> pd.DataFrame:
+    """
+    Apply the table schema in place (ids numeric, statuses lower-case) and tag
+    the frame. Already-tagged frames are returned untouched.
+    """
+    if df is None or table not in TABLE_SCHEMAS or is_normalized(df, table):
+        return df
+    if not df.empty:
+        for col, kind in TABLE_SCHEMAS[table].items():
+            if col not in df.columns:
+                continue
+            try:
+                if kind in ("int", "float"):
+                    df[col] = _coerce_numeric(df[col], kind)
+                elif kind == "status":
+                    df[col] = _normalize_status(df[col])
+            except Exception as e:
+                print(f"⚠️ schema {table}.{col} ({kind}) not applied: {e}")
+    df.attrs["schema"] = (table, SCHEMA_VERSION)
+    return df
+
+
+# -------------------------------------------------------------------
+# Native comparisons for the hot paths
+# -------------------------------------------------------------------
+def _as_number(value):
+    try:
+        number = float(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else number
+
+
+def id_mask(df: pd.DataFrame, column: str, value) -> pd.Series:
+    """
+    Boolean mask of rows whose id column equals value ('5', 5 and 5.0 all match).
+    Numeric columns compare natively; anything else falls back to string compare.
+    """
+    series = df[column]
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        number = _as_number(value)
+        if number is None:
+            return pd.Series(False, index=df.index)
+        return series == number
+    return series.astype(str).str.strip() == str(value).strip()
+
+
+def id_in_mask(df: pd.DataFrame, column: str, values) -> pd.Series:
+    """Boolean mask of rows whose id column is any of values."""
+    series = df[column]
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        numbers = [n for n in (_as_number(v) for v in values) if n is not None]
+        return series.isin(numbers)
+    return series.astype(str).str.strip().isin([str(v).strip() for v in values])
+
+
+def status_mask(df: pd.DataFrame, column: str, value) -> pd.Series:
+    """Case-insensitive status match; a plain compare on normalised frames."""
+    wanted = str(value).strip().lower()
+    series = df[column]
+    tagged = df.attrs.get("schema")
+    if tagged and TABLE_SCHEMAS.get(tagged[0], {}).get(column) == "status":
+        return series == wanted
+    return series.astype(str).str.strip().str.lower() == wanted
@@ -6,8 +6,11 @@ import threading
 from datetime import datetime, timedelta
 from functools import wraps
 from flask import session, redirect, url_for, flash
+from coordination import get_process_lock
+from scheduler import register_job
 
-_lock = threading.RLock()
+# sessions.json is shared by every gunicorn worker -> lock across processes
+_lock = get_process_lock("sessions_json")
 SESSIONS_FILE = os.path.join(os.getcwd(), 'sessions.json')
 
 def _is_token_expired(last_seen_str, hours=3):
@@ -196,16 +199,15 @@ def require_admin_role(f):
     return wrapped
 
 # Optional: Force cleanup every hour (lightweight since we auto-clean on load)
-import threading
 def periodic_maintenance():
     """Light maintenance - just touch the file to trigger auto-cleanup"""
     try:
         _load_active_sessions()  # This will auto-clean expired tokens
     except:
         pass
-    threading.Timer(3600, periodic_maintenance).start()  # 1 hour
 
-periodic_maintenance()
+# sessions.json is shared by all workers: one of them expires tokens each hour
+register_job("session_expiry", periodic_maintenance, interval=3600, leader=True, initial_delay=60)
 
 
 
@@ -0,0 +1,383 @@
+# shards.py - Per-exam cold shards for results.csv / responses.csv
+#
+# results.csv and responses.csv only ever grow, and every submit rewrote the
+# whole of both files while every read parsed all of platform history. Once
+# an exam is closed its rows never change again, so a leader job moves them
+# out of the hot files into one gzip'd CSV per (table, exam) on Drive and
+# records it in a small JSON manifest. Submits and student pages then only
+# touch the hot files (open exams and recent history); analytics and the
+# result indexes read hot + cold through load_full_table() / load_cold_table().
+# Cold shards are immutable once written, so each is downloaded once per host
+# and kept as a local snapshot validated against its Drive revision.
+
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import pandas as pd
+
+from coordination import bump_version, current_version, get_process_lock
+from google_drive_service import (
+    download_file_bytes, find_file_by_name, get_drive_service, load_csv_from_drive,
+    parse_csv_buffer, update_csv_on_drive, upload_file_bytes,
+)
+from id_allocator import max_existing_id
+from schemas import id_mask, normalize
+from snapshots import read_snapshot, write_snapshot
+
+SHARDED_TABLES = ("results", "responses")
+SHARD_FOLDER_ID = os.environ.get("SHARD_FOLDER_ID") or os.environ.get("ROOT_FOLDER_ID")
+MANIFEST_NAME = "shards_manifest.json"
+MANIFEST_TTL = 600                  # other hosts pick up new shards within this
+ARCHIVE_AFTER_DAYS = int(os.environ.get("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_MAX_EXAMS = 5               # per run, keeps one run's Drive traffic bounded
+
+_lock = threading.RLock()
+_manifest = None                    # {"generation": int, "shards": [entry, ...]}
+_manifest_file_id = None
+_manifest_loaded = (None, 0.0)      # (bus version, time) the cached manifest was read at
+_manifest_confirmed = False         # last read came from Drive (file read, or confirmed absent)
+_manifest_real = False              # the manifest being served came from Drive at some point
+_cold = {}                          # table -> (generation, DataFrame)
+_file_id_fn = None                  # table -> Drive file id of the hot CSV
+_exams_loader = None                # () -> exams DataFrame
+_stats = {"archived_exams": 0, "archived_rows": 0, "last_run": None, "last_error": None}
+
+
+def configure(file_id_fn, exams_loader):
+    """Register where the hot tables live and how to read exams.csv."""
+    global _file_id_fn, _exams_loader
+    _file_id_fn = file_id_fn
+    _exams_loader = exams_loader
+
+
+def _norm_id(value):
+    try:
+        return str(int(float(str(value).strip())))
+    except (ValueError, TypeError):
+        return str(value).strip()
+
+
+def _shard_name(table, exam_id):
+    return f"{table}_exam_{exam_id}.csv.gz"
+
+
+# -------------------------------------------------------------------
+# Manifest
+# -------------------------------------------------------------------
+def _empty_manifest():
+    return {"version": 1, "generation": 0, "shards": []}
+
+
+def _read_manifest(service):
+    """(manifest, file id) from Drive; manifest is None when the read failed, empty when there is no file."""
+    if service is None:
+        return None, None
+    try:
+        file_id = _manifest_file_id or find_file_by_name(service, MANIFEST_NAME, SHARD_FOLDER_ID, raise_errors=True)
+    except Exception as e:
+        print(f"⚠️ Shard manifest lookup failed: {e}")
+        return None, None
+    if not file_id:
+        return _empty_manifest(), None
+    raw = download_file_bytes(service, file_id)
+    if raw is None:
+        return None, file_id
+    try:
+        return json.loads(raw.decode("utf-8")), file_id
+    except Exception as e:
+        print(f"⚠️ Unreadable shard manifest: {e}")
+        return None, file_id
+
+
+def get_manifest(force=False):
+    """Shard manifest (cached per bus version, re-read from Drive after MANIFEST_TTL)."""
+    global _manifest, _manifest_file_id, _manifest_loaded, _manifest_confirmed, _manifest_real
+    with _lock:
+        version = current_version("shards_manifest")
+        loaded_version, loaded_at = _manifest_loaded
+        if not force and _manifest is not None and loaded_version == version and time.time() - loaded_at < MANIFEST_TTL:
+            return _manifest
+
+        manifest, file_id = _read_manifest(get_drive_service())
+        if file_id:
+            _manifest_file_id = file_id
+        _manifest_confirmed = manifest is not None
+        if manifest is None:
+            # Drive unreachable: keep serving the manifest we have, retry after the TTL
+            manifest = _manifest if _manifest is not None else _empty_manifest()
+        else:
+            _manifest_real = True
+        manifest.setdefault("shards", [])
+        manifest.setdefault("generation", 0)
+        _manifest = manifest
+        _manifest_loaded = (version, time.time())
+        return manifest
+
+
+def _save_manifest(service, manifest):
+    global _manifest, _manifest_file_id, _manifest_loaded
+    manifest["generation"] = int(manifest.get("generation", 0)) + 1
+    data = json.dumps(manifest, indent=1).encode("utf-8")
+    file_id, _ = upload_file_bytes(service, MANIFEST_NAME, data, "application/json",
+                                   parent_folder_id=SHARD_FOLDER_ID, file_id=_manifest_file_id)
+    if not file_id:
+        return False
+    _manifest_file_id = file_id
+    _manifest = manifest
+    _manifest_loaded = (bump_version("shards_manifest"), time.time())
+    return True
+
+
+def cold_version():
+    """Changes whenever the set of cold shards changes (for index invalidation)."""
+    return int(get_manifest().get("generation", 0))
+
+
+def _shards_for(manifest, table):
+    return [s for s in manifest.get("shards", []) if s.get("table") == table]
+
+
+def max_archived_id(table):
+    """
+    Highest id moved out of the hot file (id sequences must never reuse it).
+    Raises if the manifest has never been read from Drive: 0 would let a
+    fresh sequence hand out archived ids again.
+    """
+    manifest = get_manifest()
+    if not _manifest_real:
+        raise RuntimeError("shard manifest unavailable")
+    return max((int(s.get("max_id") or 0) for s in _shards_for(manifest, table)), default=0)
+
+
+# -------------------------------------------------------------------
+# Reading cold data
+# -------------------------------------------------------------------
+def _parse_shard(raw, table):
+    return parse_csv_buffer(BytesIO(gzip.decompress(raw)), table)
+
+
+def _load_shard(service, entry):
+    """One shard as a DataFrame: local snapshot if it matches the revision, else Drive."""
+    key = f"shard_{entry['file_id']}"
+    df, meta = read_snapshot(key, max_age=None)
+    if df is not None and meta and meta.get("revision") == entry.get("revision"):
+        return normalize(df, entry["table"])
+    if service is None:
+        return df
+    raw = download_file_bytes(service, entry["file_id"])
+    if raw is None:
+        return df
+    df = _parse_shard(raw, entry["table"])
+    write_snapshot(key, df, revision=entry.get("revision"), table=f"{entry['table']} shard exam {entry['exam_id']}")
+    return df
+
+
+def load_cold_table(table, strict=False):
+    """
+    All archived rows of table (empty frame when nothing is archived). With
+    strict, None when the manifest or any shard could not be read, so indexes
+    don't cache a partial cold partition as complete.
+    """
+    manifest = get_manifest()
+    if strict and not _manifest_real:
+        return None
+    generation = manifest.get("generation", 0)
+    with _lock:
+        cached = _cold.get(table)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+
+        entries = _shards_for(manifest, table)
+        service = get_drive_service() if entries else None
+        parts, missing = [], 0
+        for entry in entries:
+            try:
+                df = _load_shard(service, entry)
+            except Exception as e:
+                print(f"⚠️ Cold shard {entry.get('name')} unavailable: {e}")
+                df = None
+            if df is None:
+                missing += 1
+            elif not df.empty:
+                parts.append(df)
+        frame = normalize(pd.concat(parts, ignore_index=True), table) if parts else pd.DataFrame()
+        if not missing:
+            # a partial load is served but retried on the next call
+            _cold[table] = (generation, frame)
+        print(f"🧊 Cold {table}: {len(frame)} rows from {len(parts)} shard(s)")
+        return None if strict and missing else frame
+
+
+def table_partitions(service, table):
+    """
+    (cold, hot) frames of a sharded table, NOT concatenated, for readers that
+    stream rows; cold rows whose id is also in hot are superseded by hot.
+    """
+    file_id = _file_id_fn(table) if _file_id_fn else None
+    hot = load_csv_from_drive(service, file_id) if file_id else pd.DataFrame()
+    return load_cold_table(table), (hot if hot is not None else pd.DataFrame())
+
+
+def load_full_table(service, table):
+    """Hot + cold rows of a sharded table (hot copy wins when a row is in both)."""
+    file_id = _file_id_fn(table) if _file_id_fn else None
+    hot = load_csv_from_drive(service, file_id) if file_id else pd.DataFrame()
+    cold = load_cold_table(table)
+    if cold.empty:
+        return hot
+    if hot.empty and not len(hot.columns):
+        return cold.copy()
+    full = pd.concat([cold, hot], ignore_index=True)
+    if "id" in full.columns:
+        full = full.drop_duplicates("id", keep="last")
+    return normalize(full.reset_index(drop=True), table)
+
+
+# -------------------------------------------------------------------
+# Archival
+# -------------------------------------------------------------------
+def _archive_table(service, manifest, table, exam_id, rows):
+    """Merge rows into the (table, exam) shard on Drive and update its manifest entry."""
+    entry = next((s for s in _shards_for(manifest, table) if s.get("exam_id") == exam_id), None)
+    if entry is not None:
+        existing = _load_shard(service, entry)
+        if existing is None:
+            return False
+        rows = pd.concat([existing, rows], ignore_index=True)
+        if "id" in rows.columns:
+            rows = rows.drop_duplicates("id", keep="last")
+
+    data = gzip.compress(rows.to_csv(index=False).encode("utf-8"))
+    file_id, revision = upload_file_bytes(service, _shard_name(table, exam_id), data, "application/gzip",
+                                          parent_folder_id=SHARD_FOLDER_ID,
+                                          file_id=entry.get("file_id") if entry else None)
+    if not file_id:
+        return False
+
+    if entry is None:
+        entry = {"table": table, "exam_id": exam_id}
+        manifest["shards"].append(entry)
+    entry.update({
+        "file_id": file_id,
+        "name": _shard_name(table, exam_id),
+        "rows": int(len(rows)),
+        "max_id": max_existing_id(rows),
+        "bytes": len(data),
+        "revision": revision,
+        "archived_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    write_snapshot(f"shard_{file_id}", rows, revision=revision, table=f"{table} shard exam {exam_id}")
+    return True
+
+
+def archive_exam(exam_id):
+    """
+    Move every hot results/responses row of exam_id into its cold shards.
+    The hot rows are only removed after the shard and manifest are saved.
+    Returns (ok, info).
+    """
+    exam_id = _norm_id(exam_id)
+    service = get_drive_service()
+    if service is None or _file_id_fn is None:
+        return False, "no_service"
+
+    with get_process_lock("shards_archive"):
+        manifest = get_manifest(force=True)
+        if not _manifest_confirmed:
+            # Saving a manifest we could not read would drop every earlier shard from it
+            return False, "manifest_unavailable"
+        hot_ids = {}
+        for table in SHARDED_TABLES:
+            file_id = _file_id_fn(table)
+            if not file_id:
+                return False, f"no_file_{table}"
+            hot = load_csv_from_drive(service, file_id, use_cache=False)
+            if hot.empty or "exam_id" not in hot.columns:
+                continue
+            rows = hot[id_mask(hot, "exam_id", exam_id)]
+            if rows.empty:
+                continue
+            if not _archive_table(service, manifest, table, exam_id, rows):
+                return False, f"upload_failed_{table}"
+            hot_ids[table] = set(rows["id"].map(_norm_id))
+
+        if not hot_ids:
+            return True, "nothing_to_archive"
+        if not _save_manifest(service, manifest):
+            return False, "manifest_failed"
+
+        moved = 0
+        for table, ids in hot_ids.items():
+            def drop_archived(df, ids=ids):
+                keep = ~df["id"].map(_norm_id).isin(ids)
+                return None if keep.all() else df[keep]
+
+            ok, info = update_csv_on_drive(service, _file_id_fn(table), drop_archived)
+            if not ok:
+                # Rows are in both places until the next run; readers prefer the hot copy
+                print(f"⚠️ Archived exam {exam_id} but could not trim hot {table}: {info}")
+                return False, f"trim_failed_{table}"
+            moved += len(ids)
+
+    _stats["archived_exams"] += 1
+    _stats["archived_rows"] += moved
+    print(f"🧊 Archived exam {exam_id}: {moved} rows moved to cold shards")
+    return True, "archived"
+
+
+def _closed_before(exam, cutoff):
+    if str(exam.get("status", "")).strip().lower() != "completed":
+        return False
+    when = pd.to_datetime(f"{exam.get('date', '')} {exam.get('start_time', '')}".strip(), errors="coerce")
+    return not pd.isna(when) and when.to_pydatetime() < cutoff
+
+
+def archive_closed_exams():
+    """Scheduler job: archive completed exams older than ARCHIVE_AFTER_DAYS that still have hot rows."""
+    _stats["last_run"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    service = get_drive_service()
+    if service is None or _exams_loader is None or _file_id_fn is None:
+        return 0
+    try:
+        exams_df = _exams_loader()
+        results_id = _file_id_fn("results")
+        results = load_csv_from_drive(service, results_id) if results_id else pd.DataFrame()
+        if exams_df is None or exams_df.empty or results.empty or "exam_id" not in results.columns:
+            return 0
+
+        cutoff = datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)
+        hot_exams = set(results["exam_id"].map(_norm_id))
+        candidates = [
+            _norm_id(exam["id"]) for exam in exams_df.to_dict("records")
+            if _norm_id(exam.get("id")) in hot_exams and _closed_before(exam, cutoff)
+        ][:ARCHIVE_MAX_EXAMS]
+
+        archived = 0
+        for exam_id in candidates:
+            ok, info = archive_exam(exam_id)
+            if not ok:
+                _stats["last_error"] = f"exam {exam_id}: {info}"
+                break
+            archived += info == "archived"
+        return archived
+    except Exception as e:
+        _stats["last_error"] = str(e)[:300]
+        print(f"❌ Shard archival failed: {e}")
+        return 0
+
+
+def get_shard_stats():
+    """Snapshot for debug endpoints"""
+    manifest = _manifest or _empty_manifest()
+    per_table = {}
+    for entry in manifest.get("shards", []):
+        t = per_table.setdefault(entry.get("table"), {"shards": 0, "rows": 0, "bytes": 0})
+        t["shards"] += 1
+        t["rows"] += int(entry.get("rows", 0))
+        t["bytes"] += int(entry.get("bytes", 0))
+    return {"generation": manifest.get("generation", 0), "tables": per_table, **_stats}
@@ -0,0 +1,199 @@
+# snapshots.py - Local columnar snapshots of the Drive tables for warm restarts
+#
+# After every successful load or save of a table the data layer drops a copy
+# of the DataFrame next to the other shared state (Feather when pyarrow is
+# installed - memory-mapped on read - plain CSV otherwise; never pickle, which
+# would run code from whoever can write the state dir). A freshly started or
+# restarted worker can then serve the table in milliseconds and reconcile with
+# Drive in the background instead of re-downloading and re-parsing every CSV
+# while an exam is running. Each snapshot records the Drive revision and the
+# coordination version it was taken at, so callers can tell whether it is current.
+
+import json
+import os
+import time
+
+import pandas as pd
+
+from coordination import STATE_DIR, _safe_name, get_process_lock
+from schemas import parse_dtypes
+
+try:
+    import pyarrow.feather as pa_feather
+except ImportError:  # optional: CSV snapshots, re-typed by the table schema on read
+    pa_feather = None
+
+SNAPSHOT_DIR = os.path.join(STATE_DIR, "snapshots")
+SNAPSHOT_MAX_AGE = int(os.environ.get("SNAPSHOT_MAX_AGE", str(24 * 3600)))  # older ones are only used as a last resort
+SNAPSHOT_RETENTION = int(os.environ.get("SNAPSHOT_RETENTION", str(7 * 24 * 3600)))  # pruned after this
+
+try:
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+except Exception as e:
+    print(f"⚠️ Could not create snapshot dir {SNAPSHOT_DIR}: {e}")
+
+
+def _paths(key):
+    base = os.path.join(SNAPSHOT_DIR, _safe_name(key))
+    # .pkl: left by older versions, only ever deleted
+    return {"meta": f"{base}.json", "feather": f"{base}.feather", "csv": f"{base}.csv", "pickle": f"{base}.pkl"}
+
+
+def _replace_atomic(path, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_snapshot(key, df, revision=None, version=None, table=None):
+    """Persist df as the snapshot for key (a Drive file id). Returns True on success."""
+    if df is None or not hasattr(df, "columns"):
+        return False
+    started = time.time()
+    paths = _paths(key)
+    frame = df.reset_index(drop=True)
+    try:
+        with get_process_lock(f"snapshot_{key}"):
+            fmt = None
+            if pa_feather is not None and len(frame.columns):
+                try:
+                    frame.columns = [str(c) for c in frame.columns]
+                    _replace_atomic(paths["feather"], lambda p: frame.to_feather(p))
+                    fmt = "feather"
+                except Exception as e:
+                    # mixed-type object columns etc. - CSV handles anything
+                    print(f"⚠️ Feather snapshot of {key} failed, using CSV: {e}")
+            if fmt is None:
+                _replace_atomic(paths["csv"], lambda p: frame.to_csv(p, index=False))
+                fmt = "csv"
+
+            meta = {
+                "key": key,
+                "table": table,
+                "format": fmt,
+                "revision": revision,
+                "version": version,
+                "rows": int(len(frame)),
+                "saved_at": time.time(),
+            }
+            _replace_atomic(paths["meta"], lambda p: _write_json(p, meta))
+
+            for stale in ("feather", "csv", "pickle"):
+                if stale != fmt and os.path.exists(paths[stale]):
+                    os.remove(paths[stale])
+        print(f"💾 Snapshot {table or key}: {len(frame)} rows ({fmt}, {int((time.time() - started) * 1000)} ms)")
+        return True
+    except Exception as e:
+        print(f"⚠️ write_snapshot({key}) failed: {e}")
+        return False
+
+
+def _write_json(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+def read_snapshot_meta(key):
+    """Metadata of the snapshot for key, or None."""
+    try:
+        with open(_paths(key)["meta"], "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"⚠️ Unreadable snapshot metadata for {key}: {e}")
+        return None
+
+
+def read_snapshot(key, max_age=SNAPSHOT_MAX_AGE):
+    """
+    Load the snapshot for key. Returns (df, meta), or (None, None) if there is
+    none or it is older than max_age seconds (max_age=None accepts any age).
+    """
+    paths = _paths(key)
+    try:
+        with get_process_lock(f"snapshot_{key}"):
+            meta = read_snapshot_meta(key)
+            if not meta:
+                return None, None
+            if max_age is not None and time.time() - float(meta.get("saved_at", 0)) > max_age:
+                return None, None
+            if meta.get("format") == "feather" and pa_feather is not None:
+                df = pa_feather.read_table(paths["feather"], memory_map=True).to_pandas()
+            elif meta.get("format") == "csv":
+                df = _read_csv(paths["csv"], meta.get("table"))
+            else:
+                return None, None  # pickle from an older version: never loaded
+        return df, meta
+    except Exception as e:
+        print(f"⚠️ read_snapshot({key}) failed: {e}")
+        return None, None
+
+
+def _read_csv(path, table):
+    try:
+        return pd.read_csv(path, dtype=parse_dtypes(table) or None)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+    except (ValueError, TypeError):
+        return pd.read_csv(path)
+
+
+def remove_snapshot(key):
+    with get_process_lock(f"snapshot_{key}"):
+        for path in _paths(key).values():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def list_snapshots():
+    """Metadata of every snapshot on this host (for debug endpoints)."""
+    out = []
+    try:
+        names = sorted(os.listdir(SNAPSHOT_DIR))
+    except Exception:
+        return out
+    for name in names:
+        if name.endswith(".json"):
+            meta = read_snapshot_meta(name[:-5])
+            if meta:
+                out.append(meta)
+    return out
+
+
+def prune_snapshots(max_age=SNAPSHOT_RETENTION):
+    """
+    Compact the snapshot dir: drop snapshots not refreshed for max_age seconds
+    (tables that are no longer configured) and temp files left by crashed writers.
+    Returns the number of files removed.
+    """
+    removed = 0
+    now = time.time()
+    try:
+        names = os.listdir(SNAPSHOT_DIR)
+    except Exception:
+        return 0
+    for name in names:
+        path = os.path.join(SNAPSHOT_DIR, name)
+        try:
+            if name.endswith(".tmp") and now - os.path.getmtime(path) > 3600:
+                os.remove(path)
+                removed += 1
+            elif name.endswith(".json"):
+                meta = read_snapshot_meta(name[:-5])
+                if meta and now - float(meta.get("saved_at", 0)) > max_age:
+                    remove_snapshot(name[:-5])
+                    removed += 1
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            print(f"⚠️ prune_snapshots: {name}: {e}")
+    if removed:
+        print(f"🧹 Pruned {removed} snapshot file(s)")
+    return removed
@@ -0,0 +1,113 @@
+# startup.py - Boot phase timing and background service readiness
+#
+# A worker used to block at import on Google Drive (client build, a probe
+# call, a pass over every required CSV) before gunicorn could give it a
+# request, so every restart during an exam left candidates waiting. Slow
+# service initialisation now runs in a background thread and flips a
+# readiness flag when done; requests that need the service wait on the flag
+# for a bounded time. Each boot phase is timed so a slow start shows up in
+# the logs and on the debug status endpoint.
+
+import threading
+import time
+from contextlib import contextmanager
+
+BOOT_STARTED = time.time()
+
+_lock = threading.Lock()
+_phases = {}        # name -> seconds (boot checkpoints and background phases)
+_order = []
+_last_checkpoint = BOOT_STARTED
+_ready = {}         # name -> threading.Event (set once the service finished initialising)
+_ready_ok = {}      # name -> bool (did it succeed)
+_boot_seconds = None
+
+
+def _record(name, seconds):
+    with _lock:
+        if name not in _phases:
+            _order.append(name)
+        _phases[name] = round(seconds, 3)
+
+
+def checkpoint(name):
+    """Record the time since the previous checkpoint (module-level boot steps)."""
+    global _last_checkpoint
+    now = time.time()
+    _record(name, now - _last_checkpoint)
+    _last_checkpoint = now
+
+
+@contextmanager
+def startup_phase(name):
+    """Time a block of initialisation work under name."""
+    started = time.time()
+    try:
+        yield
+    finally:
+        _record(name, time.time() - started)
+
+
+def _event(name):
+    with _lock:
+        return _ready.setdefault(name, threading.Event())
+
+
+def mark_ready(name, ok=True):
+    _ready_ok[name] = bool(ok)
+    _event(name).set()
+
+
+def is_ready(name):
+    return _event(name).is_set()
+
+
+def wait_ready(name, timeout):
+    """Block until name finished initialising (or timeout); returns whether it is done."""
+    return _event(name).wait(timeout)
+
+
+def run_init(name, func):
+    """
+    Run func() (returns truthy on success) now, timed as phase name; readiness
+    of name is set when it returns, whatever the outcome. Returns the outcome.
+    """
+    ok = False
+    try:
+        with startup_phase(name):
+            ok = bool(func())
+    except Exception as e:
+        print(f"❌ Init '{name}' failed: {e}")
+    finally:
+        mark_ready(name, ok)
+        status = "ready" if ok else "FAILED"
+        print(f"🏁 {name} {status} {time.time() - BOOT_STARTED:.2f}s after boot ({format_phases()})")
+    return ok
+
+
+def start_background_init(name, func):
+    """run_init() in a daemon thread; requests can wait_ready(name) meanwhile."""
+    _event(name)
+    thread = threading.Thread(target=run_init, args=(name, func), name=f"init-{name}", daemon=True)
+    thread.start()
+    return thread
+
+
+def finish_boot():
+    """Call once the module-level boot is done: logs the per-phase timings."""
+    global _boot_seconds
+    _boot_seconds = round(time.time() - BOOT_STARTED, 3)
+    print(f"🚀 Worker booted in {_boot_seconds:.2f}s ({format_phases()})")
+
+
+def format_phases():
+    with _lock:
+        return ", ".join(f"{name} {_phases[name]:.2f}s" for name in _order)
+
+
+def startup_report():
+    """Per-phase timings and readiness flags for debug endpoints"""
+    with _lock:
+        phases = {name: _phases[name] for name in _order}
+        ready = {name: {"ready": event.is_set(), "ok": _ready_ok.get(name)} for name, event in _ready.items()}
+    return {"boot_seconds": _boot_seconds, "phases": phases, "ready": ready}
@@ -0,0 +1,71 @@
+# static_assets.py - Content-fingerprinted static URLs with immutable caching
+#
+# static/ was served with Flask's defaults (revalidate every time), so each
+# page view cost a round trip per asset. At boot every file under static/ is
+# hashed; url_for('static', filename='x.png') then emits x.<hash>.png, and
+# those names are served with a one-year immutable Cache-Control. Changing a
+# file changes its hash and therefore its URL, so browsers never keep a stale
+# copy. Unknown / un-fingerprinted names are still served as before.
+
+import hashlib
+import os
+
+from flask import send_from_directory
+
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+FINGERPRINT_LENGTH = 10
+
+_by_original = {}       # "css/app.css" -> "css/app.<hash>.css"
+_by_fingerprint = {}    # "css/app.<hash>.css" -> "css/app.css"
+
+
+def _fingerprinted_name(rel_path, digest):
+    root, ext = os.path.splitext(rel_path)
+    return f"{root}.{digest[:FINGERPRINT_LENGTH]}{ext}"
+
+
+def build_manifest(static_folder):
+    """Hash every file under static_folder; returns the number of files."""
+    by_original, by_fingerprint = {}, {}
+    for dirpath, _, filenames in os.walk(static_folder):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            rel_path = os.path.relpath(path, static_folder).replace(os.sep, "/")
+            try:
+                with open(path, "rb") as f:
+                    digest = hashlib.md5(f.read()).hexdigest()
+            except OSError as e:
+                print(f"⚠️ Could not fingerprint static/{rel_path}: {e}")
+                continue
+            fingerprinted = _fingerprinted_name(rel_path, digest)
+            by_original[rel_path] = fingerprinted
+            by_fingerprint[fingerprinted] = rel_path
+    _by_original.clear()
+    _by_original.update(by_original)
+    _by_fingerprint.clear()
+    _by_fingerprint.update(by_fingerprint)
+    return len(by_original)
+
+
+def init_static_assets(app):
+    """Fingerprint app.static_folder and route url_for('static') through it."""
+    if not app.static_folder or not os.path.isdir(app.static_folder):
+        return
+    count = build_manifest(app.static_folder)
+    print(f"🔖 Fingerprinted {count} static file(s)")
+
+    @app.url_defaults
+    def _fingerprint_static_url(endpoint, values):
+        if endpoint == "static" and "filename" in values:
+            values["filename"] = _by_original.get(values["filename"], values["filename"])
+
+    def serve_static(filename):
+        original = _by_fingerprint.get(filename)
+        if original is None:
+            return app.send_static_file(filename)
+        response = send_from_directory(app.static_folder, original, max_age=STATIC_IMMUTABLE_MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
+
+    app.view_functions["static"] = serve_static